@@ -0,0 +1,35 @@
+""" Gunicorn settings. The app is imported and warmed up once in the master (preload_app)
+and forked into workers, so its code pages and caches are shared copy-on-write.
+
+Workers are threaded (gthread): while one request waits on Nutritionix or the
+database, the worker's other threads keep serving, so a worker overlaps up to
+`threads` waits instead of one. The app's shared state (catalog cache, quota
+store, indexes, the Nutritionix connection pool) is built for that. Each
+thread may hold a database connection: keep workers x threads within what the
+database allows. `flask bench-concurrency` compares worker classes. """
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:' + os.environ.get('PORT', '8000'))
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = True
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8)) # Within SQLAlchemy's default pool (5 + 10 overflow) per worker
+
+
+def when_ready(server):
+    # In the master, after the app is loaded and before the first worker is forked.
+    if not server.cfg.preload_app: return
+    from app import app
+    from tracker.warmup import warm_up
+    warm_up(app, before_fork=True)
+
+
+def post_fork(server, worker):
+    # Pooled connections opened in the master must not be shared with workers.
+    from app import app
+    from tracker.extensions import dispose_engines
+    from tracker import scheduler
+    from tracker.warmup import ensure_started
+    dispose_engines(app)
+    ensure_started(app) # Already warm when inherited from the master; otherwise warms up in the background
+    if app.config['SCHEDULER']: scheduler.start(app) # Threads do not survive fork: each worker starts its own
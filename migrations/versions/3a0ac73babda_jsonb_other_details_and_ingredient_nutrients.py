@@ -0,0 +1,63 @@
+"""JSONB other_details with GIN index (PostgreSQL), ingredient_nutrients side table
+
+Revision ID: 3a0ac73babda
+Revises: ed54dfbe9a13
+Create Date: 2026-10-19 09:12:44.310552
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a0ac73babda'
+down_revision = 'ed54dfbe9a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ingredient_nutrients',
+    sa.Column('ingredient_id', sa.Integer(), nullable=False),
+    sa.Column('nutrient', sa.String(length=64), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['ingredient_id'], ['ingredients.id'], name=op.f('fk_ingredient_nutrients_ingredient_id_ingredients'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('ingredient_id', 'nutrient', name=op.f('pk_ingredient_nutrients'))
+    )
+    with op.batch_alter_table('ingredient_nutrients', schema=None) as batch_op:
+        batch_op.create_index('ix_ingredient_nutrients_nutrient_amount', ['nutrient', 'amount', 'ingredient_id'], unique=False)
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        from sqlalchemy.dialects import postgresql
+        op.alter_column('ingredients', 'other_details', type_=postgresql.JSONB(), existing_type=sa.JSON(),
+                        existing_nullable=True, postgresql_using='other_details::jsonb')
+        op.create_index('ix_ingredients_other_details', 'ingredients', ['other_details'], unique=False, postgresql_using='gin')
+        return
+
+    # Backfill the side table from existing JSON (amounts per 100 g, gram-based ingredients only)
+    ingredients = sa.table('ingredients', sa.column('id'), sa.column('typical_unit'), sa.column('unit_quantity'), sa.column('other_details', sa.JSON()))
+    nutrients = sa.table('ingredient_nutrients', sa.column('ingredient_id'), sa.column('nutrient'), sa.column('amount'))
+    rows = []
+    for ing_id, unit, unit_qty, details in bind.execute(sa.select(ingredients.c.id, ingredients.c.typical_unit, ingredients.c.unit_quantity, ingredients.c.other_details)):
+        if isinstance(details, str): details = json.loads(details)
+        if not details or unit != 'g' or not unit_qty: continue
+        for key, value in details.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                rows.append({'ingredient_id': ing_id, 'nutrient': key, 'amount': float(value) * 100.0 / unit_qty})
+    if rows: op.bulk_insert(nutrients, rows)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects import postgresql
+        op.drop_index('ix_ingredients_other_details', table_name='ingredients', postgresql_using='gin')
+        op.alter_column('ingredients', 'other_details', type_=sa.JSON(), existing_type=postgresql.JSONB(),
+                        existing_nullable=True, postgresql_using='other_details::json')
+
+    with op.batch_alter_table('ingredient_nutrients', schema=None) as batch_op:
+        batch_op.drop_index('ix_ingredient_nutrients_nutrient_amount')
+
+    op.drop_table('ingredient_nutrients')
@@ -0,0 +1,81 @@
+"""partition meal_logs by month (PostgreSQL), AUTOINCREMENT ids (SQLite)
+
+Revision ID: 5e1a7c3d9b42
+Revises: cdb7e5959b20
+Create Date: 2026-10-19 14:02:11.408530
+
+On PostgreSQL meal_logs is rebuilt as `PARTITION BY RANGE (log_date)` with one
+partition per month that has data, the next three months, and a DEFAULT
+partition. The primary key becomes (id, log_date) because a partitioned table's
+unique constraints must include the partition key; ids still come from the
+original sequence. Other databases keep the plain table; on SQLite it is rebuilt
+with AUTOINCREMENT so ids of archived (deleted) rows are never handed out again.
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1a7c3d9b42'
+down_revision = 'cdb7e5959b20'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+
+def _next_month(d): return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def _create_constraints_and_indexes(primary_key):
+    op.execute(f'ALTER TABLE meal_logs ADD CONSTRAINT pk_meal_logs PRIMARY KEY ({primary_key})')
+    op.execute('ALTER TABLE meal_logs ADD CONSTRAINT fk_meal_logs_food_id_foods FOREIGN KEY (food_id) REFERENCES foods (id)')
+    op.execute('ALTER TABLE meal_logs ADD CONSTRAINT fk_meal_logs_recipe_id_recipes FOREIGN KEY (recipe_id) REFERENCES recipes (id)')
+    op.execute('ALTER TABLE meal_logs ADD CONSTRAINT fk_meal_logs_user_id_users FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE')
+    op.create_index('ix_meal_logs_log_date', 'meal_logs', ['log_date'])
+    op.create_index('ix_meal_logs_food_id', 'meal_logs', ['food_id'])
+    op.create_index('ix_meal_logs_recipe_id', 'meal_logs', ['recipe_id'])
+    op.create_index('ix_meal_logs_user_date_meal', 'meal_logs', ['user_id', 'log_date', 'meal_type'])
+
+
+def _swap_out(partition_clause):
+    """ Renames meal_logs to meal_logs_old and creates an empty copy with `partition_clause`. """
+    op.execute('ALTER TABLE meal_logs RENAME TO meal_logs_old')
+    op.execute('ALTER SEQUENCE meal_logs_id_seq OWNED BY NONE') # Otherwise dropping meal_logs_old drops the sequence
+    op.execute(f'CREATE TABLE meal_logs (LIKE meal_logs_old INCLUDING DEFAULTS INCLUDING CONSTRAINTS) {partition_clause}')
+
+
+def _copy_back(primary_key):
+    """ Moves the rows over, drops meal_logs_old and recreates the keys and indexes on the new table. """
+    op.execute('INSERT INTO meal_logs SELECT * FROM meal_logs_old')
+    op.execute('DROP TABLE meal_logs_old')
+    op.execute('ALTER SEQUENCE meal_logs_id_seq OWNED BY meal_logs.id')
+    _create_constraints_and_indexes(primary_key)
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('meal_logs', recreate='always', table_kwargs={'sqlite_autoincrement': True}): pass
+    if op.get_bind().dialect.name != 'postgresql': return
+    _swap_out('PARTITION BY RANGE (log_date)')
+    first, last = op.get_bind().execute(sa.text('SELECT min(log_date), max(log_date) FROM meal_logs_old')).one()
+    today = date.today()
+    month = date((first or today).year, (first or today).month, 1)
+    end = max(last or today, today)
+    for _ in range(MONTHS_AHEAD): end = _next_month(end)
+    while month <= end:
+        op.execute(f"CREATE TABLE meal_logs_p{month.year:04d}_{month.month:02d} PARTITION OF meal_logs "
+                   f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')")
+        month = _next_month(month)
+    op.execute('CREATE TABLE meal_logs_default PARTITION OF meal_logs DEFAULT')
+    _copy_back('id, log_date')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('meal_logs', recreate='always'): pass
+    if op.get_bind().dialect.name != 'postgresql': return
+    _swap_out('')
+    _copy_back('id') # Dropping the partitioned meal_logs_old drops its partitions with it
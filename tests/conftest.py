@@ -0,0 +1,15 @@
+""" Shared fixtures: an app on a throwaway SQLite database. """
+import pytest
+
+from tracker import create_app
+from tracker.extensions import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.db'), 'TESTING': True, 'WTF_CSRF_ENABLED': False,
+                      'QUOTA_PATH': str(tmp_path / 'quota.db'), 'SCHEDULER': False})
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove(); db.engine.dispose()
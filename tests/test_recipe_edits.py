@@ -0,0 +1,9 @@
+""" Concurrent recipe edits (tracker.recipe_graph.edit_with_retry) must leave exact totals. """
+from tracker import benchmarks
+
+
+def test_concurrent_edits_keep_totals_exact(app):
+    outcomes, problems = benchmarks.recipe_edit_stress(app, threads=6, operations=25, ingredients=5)
+    assert problems == []
+    assert outcomes['committed'] == 6 * 25
+    assert not [outcome for outcome in outcomes if outcome.startswith('failed')]
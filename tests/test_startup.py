@@ -0,0 +1,8 @@
+""" The startup budgets (STARTUP_IMPORT_BUDGET_MS, STARTUP_COLD_START_BUDGET_MS) that `flask check-startup` reports. """
+from tracker.cli import measure_startup, startup_failures
+
+
+def test_startup_within_budget(app, monkeypatch, tmp_path):
+    monkeypatch.setenv('DATABASE_URL', 'sqlite:///' + str(tmp_path / 'probe.db')) # The probe builds the app from the environment
+    sample = measure_startup(runs=3)
+    assert startup_failures(sample, app.config) == [], sample
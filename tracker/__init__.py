@@ -0,0 +1,41 @@
+""" Calorie tracker application package. Use create_app() to build an app instance. """
+import os
+
+from flask import Flask
+
+from .config import basedir, default_config
+
+
+def create_app(config=None):
+    """ Application factory. `config` overrides the environment-derived defaults. """
+    from dotenv import load_dotenv
+    load_dotenv() # Loads .env file variables FIRST
+
+    app = Flask(__name__, template_folder=os.path.join(basedir, 'templates'))
+    app.config.from_mapping(default_config())
+    if config: app.config.from_mapping(config)
+    from . import quota
+    quota.check_config(app.config) # Fail at startup, not on the first lookup
+
+    from .extensions import db
+    db.init_app(app)
+    from . import telemetry # Logging first, so everything after it logs through the queue
+    telemetry.init_app(app)
+    from . import nutrient_index # Also registers the ingredient_nutrients sync listeners
+    nutrient_index.init_app(app)
+    from . import name_index # Registers the name_buckets sync listeners (no setup needed)
+    from . import adherence # Registers the daily_adherence sync listeners (no setup needed)
+    from . import sync # Registers the sync_changes listeners (no setup needed)
+    from . import accounts
+    accounts.init_app(app)
+
+    from .blueprints import register_blueprints
+    register_blueprints(app)
+
+    from . import compression
+    compression.init_app(app)
+
+    from .cli import register_cli
+    register_cli(app)
+
+    return app
@@ -0,0 +1,67 @@
+""" Session login and per-user scoping.
+
+The logged-in user is loaded into `g.user` before every request; everything
+except the auth pages, static files and PUBLIC_ENDPOINTS requires one. Views
+never query MealLog, Food or Recipe unscoped: logs go through `user_logs()`,
+catalog rows through `visible()` (shared rows plus the user's own) and
+`get_visible_or_404` / `get_editable_or_404`, which answer 404 for other
+users' private rows so their existence is not revealed.
+"""
+from flask import abort, g, jsonify, redirect, request, session, url_for
+
+from .extensions import db
+from .models import MealLog, User
+
+PUBLIC_ENDPOINTS = {'static', 'api.health', 'api.ready'}
+
+
+def init_app(app):
+    app.before_request(_load_user)
+    app.context_processor(lambda: {'current_user': g.get('user'), 'can_edit': can_edit})
+
+
+def _load_user():
+    user_id = session.get('user_id')
+    g.user = db.session.get(User, user_id) if user_id is not None else None
+    if g.user is not None or request.endpoint is None or request.endpoint in PUBLIC_ENDPOINTS or request.blueprint == 'auth': return None
+    if request.blueprint == 'api': return jsonify(error='login required'), 401
+    return redirect(url_for('auth.login', next=request.full_path if request.query_string else request.path))
+
+
+def login_user(user): session.clear(); session['user_id'] = user.id
+
+
+def logout_user(): session.clear()
+
+
+def user_logs():
+    """ The current user's MealLog query (served by ix_meal_logs_user_date_meal). """
+    return MealLog.query.filter(MealLog.user_id == g.user.id)
+
+
+def visible(model):
+    """ Filter for catalog rows the current user can see: shared (owner_id IS NULL) or their own. """
+    return db.or_(model.owner_id.is_(None), model.owner_id == g.user.id)
+
+
+def can_edit(obj):
+    """ Owners edit their private rows; only admins edit the shared catalog (which every ingredient belongs to). """
+    owner_id = getattr(obj, 'owner_id', None) # Ingredient has no owner column
+    return owner_id == g.user.id if owner_id is not None else g.user.is_admin
+
+
+def get_visible_or_404(model, ident, *options):
+    obj = model.query.options(*options).filter(model.id == ident, visible(model)).first()
+    if obj is None: abort(404)
+    return obj
+
+
+def get_editable_or_404(model, ident, *options):
+    obj = get_visible_or_404(model, ident, *options)
+    if not can_edit(obj): abort(403)
+    return obj
+
+
+def new_owner_id(shared):
+    """ owner_id for a row the current user is creating; only admins may add to the shared catalog. """
+    return None if shared and g.user.is_admin else g.user.id
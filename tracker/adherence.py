@@ -0,0 +1,180 @@
+""" Goal adherence: per-day target flags and running streaks, kept up to date as entries change.
+
+daily_adherence holds one row per user and day with entries: the day's
+calories and protein, whether calories came within ADHERENCE_CALORIE_TOLERANCE
+of target_calories and protein reached target_protein, and for each goal the
+number of consecutive met days ending on that day (a day without entries
+breaks a run). The daily log reads at most ADHERENCE_WINDOW_DAYS rows to show
+"n days in a row" and "protein target hit k of the last 7 days", however long
+the history.
+
+Rows follow the entries in the same transaction. After every flush that added,
+changed or deleted MealLog rows, the touched days are re-summed (one grouped
+query over just those days). Their streaks are then recomputed forward, and
+the walk stops at the first later day whose streaks were already right, which
+is at most the length of the run it joined or split. Bulk writes that bypass
+the ORM send meal_logs_changed with their `days` and are refreshed after their
+commit. New targets re-flag every row from the stored totals and recompute the
+streaks, without reading meal_logs. Moving rows to the log archive changes no
+totals and touches nothing here. `flask rebuild-adherence` recomputes users
+from scratch (to repair; the migration creating the table fills it the same way).
+"""
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+from itertools import chain
+
+from flask import current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, inspect
+
+from .extensions import db
+from .log_archive import any_archived, archived_daily_totals, archived_months
+from .models import DailyAdherence, MealLog, User
+from .partitions import next_month
+from .signals import meal_logs_changed
+
+logger = logging.getLogger(__name__)
+
+WALK_BATCH = 500 # Rows read per step of the forward streak walk
+TARGET_COLUMNS = ('target_calories', 'target_protein')
+_table = DailyAdherence.__table__
+
+
+def _targets(connection, user_id):
+    return tuple(connection.execute(db.select(User.target_calories, User.target_protein).where(User.id == user_id)).one_or_none() or (None, None))
+
+
+def _flag_values(targets):
+    """ calories_ok / protein_ok as SQL over the stored totals; NULL where the target is not set. """
+    target_calories, target_protein = targets
+    tolerance = current_app.config['ADHERENCE_CALORIE_TOLERANCE']
+    return {'calories_ok': db.func.abs(_table.c.calories - target_calories) <= tolerance * target_calories if target_calories else None,
+            'protein_ok': _table.c.protein >= target_protein if target_protein else None}
+
+
+def _totals(connection, user_id, start, end, dates=None):
+    """ {date: [calories, protein]} of the days in [start, end] (only `dates`, if given) with entries, live and archived. """
+    query = (db.select(MealLog.log_date, db.func.sum(MealLog.calculated_calories), db.func.sum(MealLog.calculated_protein))
+             .where(MealLog.user_id == user_id, MealLog.log_date.between(start, end)).group_by(MealLog.log_date))
+    if dates is not None: query = query.where(MealLog.log_date.in_(dates))
+    totals = {day: [calories or 0.0, protein or 0.0] for day, calories, protein in connection.execute(query)}
+    if any_archived(start, end):
+        hot = {i for (i,) in connection.execute(db.select(MealLog.id).where(MealLog.user_id == user_id, MealLog.log_date.between(start, end)))}
+        for day, vector in archived_daily_totals(user_id, start, end, exclude_ids=hot).items():
+            if dates is not None and day not in dates: continue
+            day_totals = totals.setdefault(day, [0.0, 0.0])
+            day_totals[0] += vector['calories']; day_totals[1] += vector['protein']
+    return totals
+
+
+def _insert(connection, user_id, totals):
+    if totals:
+        connection.execute(_table.insert(), [{'user_id': user_id, 'log_date': day, 'calories': calories, 'protein': protein,
+                                              'calories_streak': 0, 'protein_streak': 0} for day, (calories, protein) in totals.items()])
+
+
+def _restreak(connection, user_id, start, through):
+    """ Recomputes the streaks from `start` on. Past `through` (the last changed day) the walk stops at the first day whose
+    streaks were already right, since every later day follows from it. Returns the number of rows updated. """
+    c = _table.c
+    previous = connection.execute(db.select(c.log_date, c.calories_streak, c.protein_streak)
+                                  .where(c.user_id == user_id, c.log_date < start).order_by(c.log_date.desc()).limit(1)).first()
+    last_day, calories_run, protein_run = previous or (None, 0, 0)
+    after, updated = start - timedelta(days=1), 0
+    while True:
+        rows = connection.execute(db.select(c.log_date, c.calories_ok, c.protein_ok, c.calories_streak, c.protein_streak)
+                                  .where(c.user_id == user_id, c.log_date > after).order_by(c.log_date).limit(WALK_BATCH)).all()
+        if not rows: return updated
+        for day, calories_ok, protein_ok, calories_streak, protein_streak in rows:
+            consecutive = last_day is not None and (day - last_day).days == 1
+            calories_run = (calories_run + 1 if consecutive else 1) if calories_ok else 0
+            protein_run = (protein_run + 1 if consecutive else 1) if protein_ok else 0
+            if (calories_run, protein_run) != (calories_streak, protein_streak):
+                connection.execute(_table.update().where(c.user_id == user_id, c.log_date == day)
+                                   .values(calories_streak=calories_run, protein_streak=protein_run))
+                updated += 1
+            elif day > through: return updated
+            last_day = day
+        after = rows[-1][0]
+
+
+def refresh(connection, days):
+    """ Brings the rows of `days`, (user_id, date) pairs whose entries changed, and the streaks after them up to date. """
+    by_user = defaultdict(set)
+    for user_id, day in days:
+        if user_id is not None and day is not None: by_user[user_id].add(day)
+    for user_id, dates in by_user.items():
+        first, last = min(dates), max(dates)
+        totals = _totals(connection, user_id, first, last, dates)
+        connection.execute(_table.delete().where(_table.c.user_id == user_id, _table.c.log_date.in_(dates)))
+        _insert(connection, user_id, totals)
+        if totals:
+            connection.execute(_table.update().where(_table.c.user_id == user_id, _table.c.log_date.in_(list(totals)))
+                               .values(_flag_values(_targets(connection, user_id))))
+        _restreak(connection, user_id, first, last)
+
+
+def retarget(connection, user_id):
+    """ Re-flags every day of the user against their current targets and recomputes all the streaks. """
+    connection.execute(_table.update().where(_table.c.user_id == user_id).values(_flag_values(_targets(connection, user_id))))
+    first = connection.execute(db.select(db.func.min(_table.c.log_date)).where(_table.c.user_id == user_id)).scalar()
+    if first is not None: _restreak(connection, user_id, first, date.max)
+
+
+def rebuild(connection, user_id):
+    """ Recomputes the user's rows from all of their entries. Returns the number of days. """
+    first, last = connection.execute(db.select(db.func.min(MealLog.log_date), db.func.max(MealLog.log_date)).where(MealLog.user_id == user_id)).one()
+    months = archived_months()
+    if months:
+        first = min(filter(None, (first, date.fromisoformat(months[0] + '-01'))))
+        last = max(filter(None, (last, next_month(date.fromisoformat(months[-1] + '-01')) - timedelta(days=1))))
+    connection.execute(_table.delete().where(_table.c.user_id == user_id))
+    if first is None: return 0
+    totals = _totals(connection, user_id, first, last)
+    _insert(connection, user_id, totals)
+    retarget(connection, user_id)
+    return len(totals)
+
+
+def status(user, day):
+    """ What the daily log shows for `day`: the calorie and protein streaks running through it and the protein target hits
+    over the ADHERENCE_WINDOW_DAYS ending on it. Reads at most that many rows. """
+    config, c = current_app.config, _table.c
+    window = config['ADHERENCE_WINDOW_DAYS']
+    rows = db.session.execute(db.select(c.log_date, c.calories_ok, c.protein_ok, c.calories_streak, c.protein_streak)
+                              .where(c.user_id == user.id, c.log_date.between(day - timedelta(days=window - 1), day)).order_by(c.log_date.desc())).all()
+    latest = rows[0] if rows else None
+    if latest is not None and latest.log_date != day and not (day >= date.today() and (day - latest.log_date).days == 1):
+        latest = None # Only today's streak lives on through yesterday while nothing is logged yet
+    return {'calories_streak': latest.calories_streak if latest else 0, 'protein_streak': latest.protein_streak if latest else 0,
+            'protein_hits': sum(1 for row in rows if row.protein_ok), 'days_logged': len(rows), 'window': window,
+            'tolerance': config['ADHERENCE_CALORIE_TOLERANCE'], 'target_calories': user.target_calories, 'target_protein': user.target_protein}
+
+
+# --- Incremental maintenance -----------------------------------------------------------
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_flushed(session, flush_context):
+    days, retargeted = set(), set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, MealLog):
+            days.add((obj.user_id, obj.log_date))
+            days.update((obj.user_id, moved_from) for moved_from in inspect(obj).attrs.log_date.history.deleted or ())
+    for obj in session.dirty:
+        if isinstance(obj, User) and any(inspect(obj).attrs[name].history.has_changes() for name in TARGET_COLUMNS): retargeted.add(obj.id)
+    if not days and not retargeted: return
+    connection = session.connection()
+    if days: refresh(connection, days)
+    for user_id in retargeted: retarget(connection, user_id)
+
+
+def _refresh_bulk(sender, days=None, **kwargs):
+    """ meal_logs_changed: entries written in bulk (already committed) for (user_id, date) `days`. """
+    if not days: return
+    try: refresh(db.session.connection(), days); db.session.commit()
+    except Exception:
+        db.session.rollback(); logger.exception('Adherence refresh failed; `flask rebuild-adherence` repairs it', extra={'days': len(days)})
+
+
+meal_logs_changed.connect(_refresh_bulk, weak=False)
@@ -0,0 +1,304 @@
+""" Micro-benchmarks behind the `flask bench-*` commands, and the `flask stress-recipe-edits`
+concurrency check. `concurrency` (bench-concurrency) load-tests gunicorn worker classes end to end. `run` (bench-nutrition) times the per-entry cost of the nutrition hot
+paths through NutrientVector against the dict-based code they replaced (reproduced below
+as `_legacy_*`), on transient model instances; no database is touched. """
+import math
+import random
+import threading
+import time
+import timeit
+from collections import Counter
+
+from .models import Food, Ingredient, MealLog, Recipe, RecipeIngredient
+from .nutrients import NUTRIENT_KEYS, NutrientVector, column_names
+
+
+def _legacy_food_entry(food, quantity_consumed):
+    results = {'calories':0.0, 'protein':0.0, 'carbs':0.0, 'fat':0.0, 'fiber':0.0, 'sugar':0.0, 'calcium':0.0, 'iron':0.0, 'potassium':0.0, 'sodium':0.0, 'vit_d':0.0}
+    multiplier = float(quantity_consumed) / float(food.base_quantity)
+    def safe_calc(v, m):
+         if v is None: return 0.0
+         try: r = float(v)*m; return r if math.isfinite(r) else 0.0
+         except: return 0.0
+    for key in NUTRIENT_KEYS: results[key] = safe_calc(getattr(food, key), multiplier)
+    return {f'calculated_{k}': v for k, v in results.items()}
+
+
+def _legacy_recipe_entry(recipe, quantity):
+    return {f"calculated_{key.replace('total_','')}": (getattr(recipe, key) or 0.0) * quantity for key in recipe.__table__.columns.keys() if key.startswith('total_')}
+
+
+def _legacy_recipe_totals(lines):
+    totals = {'calories':0.0, 'protein':0.0, 'carbs':0.0, 'fat':0.0, 'fiber':0.0, 'sugar':0.0, 'calcium':0.0, 'iron':0.0, 'potassium':0.0, 'sodium':0.0, 'vit_d':0.0}
+    for ingredient, qty_used in lines:
+        multiplier = float(qty_used) / float(ingredient.unit_quantity)
+        def safe_get(v): return float(v) if v is not None else 0.0
+        for key in NUTRIENT_KEYS: totals[key] += safe_get(getattr(ingredient, key)) * multiplier
+    return totals
+
+
+def _legacy_day_summary(logs):
+    summary = {'calories':0, 'protein':0, 'carbs':0, 'fat':0, 'fiber':0, 'sugar':0, 'calcium':0, 'iron':0, 'potassium':0, 'sodium':0, 'vit_d':0}
+    for log in logs:
+        for key in NUTRIENT_KEYS: summary[key] += getattr(log, f'calculated_{key}') or 0
+    return summary
+
+
+def _nutrients(rng): return {key: (None if rng.random() < 0.2 else rng.uniform(0, 500)) for key in NUTRIENT_KEYS}
+
+
+def run(entries=1000, repeat=5, seed=0):
+    """ Returns [(case, legacy µs/entry, vector µs/entry)]. """
+    rng = random.Random(seed)
+    foods = [Food(name=f'f{i}', base_unit='g', base_quantity=100.0, **_nutrients(rng)) for i in range(entries)]
+    recipes = [Recipe(name=f'r{i}', **{f'total_{k}': v for k, v in _nutrients(rng).items()}) for i in range(entries)]
+    ingredients = [Ingredient(name=f'i{i}', typical_unit='g', unit_quantity=100.0, **_nutrients(rng)) for i in range(entries)]
+    lines = [(ing, rng.uniform(10, 300)) for ing in ingredients]
+    logs = [MealLog(**NutrientVector.from_columns(food, 0.5).as_columns(MealLog)) for food in foods]
+    # What the SQL paths hand over: column-only rows instead of ORM objects
+    line_rows = [tuple(getattr(ing, key) for key in NUTRIENT_KEYS) for ing, _ in lines]
+    line_factors = [qty / ing.unit_quantity for ing, qty in lines]
+    log_rows = [tuple(getattr(log, name) for name in column_names(MealLog)) for log in logs]
+
+    cases = [
+        ('food log entry', lambda: [_legacy_food_entry(f, 50) for f in foods],
+                           lambda: [NutrientVector.from_columns(f, 50 / f.base_quantity).as_columns(MealLog) for f in foods]),
+        ('recipe log entry', lambda: [_legacy_recipe_entry(r, 1.5) for r in recipes],
+                             lambda: [NutrientVector.from_columns(r, 1.5).as_columns(MealLog) for r in recipes]),
+        ('recipe ingredient line', lambda: _legacy_recipe_totals(lines), lambda: NutrientVector.sum_rows(line_rows, line_factors)),
+        ('day summary log', lambda: _legacy_day_summary(logs), lambda: NutrientVector.sum_rows(log_rows)),
+    ]
+    per_entry = lambda fn: min(timeit.repeat(fn, number=1, repeat=repeat)) / entries * 1e6
+    return [(name, per_entry(legacy), per_entry(vector)) for name, legacy, vector in cases]
+
+
+def compression(app, user_id, paths, gzip_level=6, brotli_level=4, repeat=5):
+    """ Per route: [(path, raw bytes, render ms, [(coding, level, compressed bytes, compress ms)])]. Renders each
+    page uncompressed through the test client as `user_id`, then times one-shot compression of the body. """
+    from .compression import _brotli, compress
+    client = app.test_client()
+    with client.session_transaction() as session: session['user_id'] = user_id
+    codings = [('gzip', gzip_level)] + ([('br', brotli_level)] if _brotli() else [])
+    results = []
+    for path in paths:
+        body = client.get(path, headers={'Accept-Encoding': 'identity'}).get_data()
+        render_ms = min(timeit.repeat(lambda: client.get(path, headers={'Accept-Encoding': 'identity'}), number=1, repeat=repeat)) * 1000
+        rows = [(coding, level, len(compress(body, coding, level)), min(timeit.repeat(lambda: compress(body, coding, level), number=1, repeat=repeat)) * 1000)
+                for coding, level in codings]
+        results.append((path, len(body), render_ms, rows))
+    return results
+
+
+def _synthetic_catalog(items, seed):
+    """ Index rows (see tracker.similarity) scattered around a few dozen nutrient profiles, as a real catalog is. """
+    import numpy as np
+    from .recommender import KINDS
+    from .similarity import ANY_MEAL
+    rng = np.random.default_rng(seed)
+    prototypes = rng.lognormal(0.0, 1.5, (40, len(NUTRIENT_KEYS))) * (rng.random((40, len(NUTRIENT_KEYS))) < 0.7)
+    prototypes[:, NUTRIENT_KEYS.index('calories')] = rng.uniform(20, 600, 40)
+    nutrients = prototypes[rng.integers(0, 40, items)] * rng.lognormal(0.0, 0.3, (items, len(NUTRIENT_KEYS)))
+    kinds, owners, meals = rng.integers(0, len(KINDS), items), rng.integers(1, 50, items), rng.integers(1, ANY_MEAL + 1, items)
+    return [(KINDS[kinds[i]], i + 1, f'item {i}', ('g', 100.0), int(owners[i]) if owners[i] < 5 else None, nutrients[i].tolist(), int(meals[i]))
+            for i in range(items)]
+
+
+def similarity(items=100000, queries=200, k=10, seed=0):
+    """ [(case, p50 ms, p95 ms)] for tracker.similarity over a synthetic catalog of `items`: tree build, an incremental
+    update, and top-k queries through the KD-tree against a full scan. Raises AssertionError if the two disagree. """
+    import numpy as np
+    from .recommender import KINDS
+    from .similarity import SimilaritySnapshot, meal_bits
+    rows = _synthetic_catalog(items, seed)
+    rng = np.random.default_rng(seed + 1)
+    elapsed_ms = lambda start: (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    snap = SimilaritySnapshot(rows)
+    build_ms = elapsed_ms(start)
+    changed = [(*row[:5], [row[5][0]] + [v * 1.1 for v in row[5][1:]], row[6]) for row in (rows[i] for i in rng.choice(items, 100, replace=False))]
+    start = time.perf_counter()
+    snap = snap.updated({(row[0], row[1]) for row in changed}, changed)
+    update_ms = elapsed_ms(start)
+
+    def brute(vector, tree_mask, tail_mask):
+        d = np.concatenate([np.square(snap.tree.vectors - vector).sum(axis=1), np.square(snap.tail.vectors - vector).sum(axis=1)])
+        d[~np.concatenate([tree_mask, tail_mask])] = np.inf
+        top = np.argpartition(d, k - 1)[:k]
+        return sorted(d[top][np.isfinite(d[top])].tolist())
+
+    cases = {f'query k={k}, all kinds': {}, f'query k={k}, recipes for lunch': {'kinds': ('recipe',), 'meal_bit': meal_bits('Lunch')}}
+    results = [('build tree', build_ms, build_ms), ('apply 100 changed rows', update_ms, update_ms)]
+    for name, filters in cases.items():
+        tree_ms, brute_ms = [], []
+        for i in rng.choice(len(snap.tree), queries, replace=False):
+            vector, exclude = snap.tree.vectors[i], {(KINDS[snap.tree.kinds[i]], int(snap.tree.ids[i]))}
+            start = time.perf_counter()
+            found = snap.nearest(vector, k, *snap.masks(exclude=exclude, user_id=1, **filters))
+            tree_ms.append(elapsed_ms(start))
+            start = time.perf_counter()
+            expected = brute(vector, *snap.masks(exclude=exclude, user_id=1, **filters))
+            brute_ms.append(elapsed_ms(start))
+            assert np.allclose([d for d, _, _ in found], expected), 'KD-tree and full scan disagree'
+        results += [(f'{name}, KD-tree', np.percentile(tree_ms, 50), np.percentile(tree_ms, 95)),
+                    (f'{name}, full scan', np.percentile(brute_ms, 50), np.percentile(brute_ms, 95))]
+    return results
+
+
+def recipe_edit_stress(app, threads=8, operations=50, ingredients=10, seed=0, database_url=None):
+    """ Hammers one scratch recipe from `threads` threads at once. Each runs `operations` edits through
+    edit_with_retry, each removing a random ingredient's line if the recipe has it and adding it otherwise,
+    so threads often race for the same line. Afterwards the stored totals must equal the sum of the lines
+    that are left, with at most one line per ingredient. Runs against `database_url` (its tables are created
+    if missing and the scratch rows deleted through the ORM afterwards), by default a temporary SQLite file,
+    never the app's own database. Returns (Counter of outcomes, [problem descriptions]). """
+    import os
+    import shutil
+    import tempfile
+    from . import create_app
+    from .extensions import db
+    from .recipe_graph import add_ingredient, edit_with_retry, remove_ingredient
+    scratch = None if database_url else tempfile.mkdtemp(prefix='stress-recipe-edits-')
+    stress_app = create_app({'SQLALCHEMY_DATABASE_URI': database_url or 'sqlite:///' + os.path.join(scratch, 'stress.db'),
+                             'SECRET_KEY': app.config['SECRET_KEY'], 'RECALC_LOGS_ON_EDIT': False})
+    tag = f'stress-{random.Random().getrandbits(32):08x}'
+    try:
+        with stress_app.app_context():
+            db.create_all()
+            items = [Ingredient(name=f'{tag} {i}', typical_unit='g', unit_quantity=100.0, **{key: float(i + j + 1) for j, key in enumerate(NUTRIENT_KEYS)})
+                     for i in range(ingredients)]
+            recipe = Recipe(name=tag, owner_id=None)
+            db.session.add_all([recipe, *items]); db.session.commit()
+            recipe_id, ingredient_ids = recipe.id, [item.id for item in items]
+        outcomes, lock, start = Counter(), threading.Lock(), threading.Barrier(threads)
+
+        def worker(n):
+            rng = random.Random(seed + n)
+            with stress_app.app_context():
+                start.wait()
+                for _ in range(operations):
+                    ingredient_id, runs = rng.choice(ingredient_ids), []
+                    def toggle():
+                        runs.append(1)
+                        line = RecipeIngredient.query.filter_by(recipe_id=recipe_id, ingredient_id=ingredient_id).first()
+                        return remove_ingredient(line.id) if line else add_ingredient(recipe_id, ingredient_id, rng.choice((25.0, 50.0, 150.0)))
+                    try: edit_with_retry(toggle); outcome = 'committed'
+                    except Exception as e: outcome = f'failed ({type(e).__name__})'
+                    with lock: outcomes[outcome] += 1; outcomes['retries'] += len(runs) - 1
+
+        pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for thread in pool: thread.start()
+        for thread in pool: thread.join()
+
+        problems = []
+        with stress_app.app_context():
+            recipe = db.session.get(Recipe, recipe_id)
+            lines = RecipeIngredient.query.filter_by(recipe_id=recipe_id).all()
+            per_ingredient = Counter(line.ingredient_id for line in lines)
+            problems += [f'ingredient {i} has {n} lines' for i, n in per_ingredient.items() if n > 1]
+            expected = NutrientVector.sum_rows([[getattr(line.ingredient, key) for key in NUTRIENT_KEYS] for line in lines], [line.quantity / 100.0 for line in lines])
+            stored = NutrientVector.from_columns(recipe)
+            problems += [f'total_{key} is {stored[key]}, lines add up to {expected[key]}' for key in NUTRIENT_KEYS if abs(stored[key] - expected[key]) > 1e-6 * max(1.0, abs(expected[key]))]
+            outcomes['lines left'], outcomes['recipe version'] = len(lines), recipe.version
+            db.session.delete(recipe); db.session.flush()
+            for item in Ingredient.query.filter(Ingredient.id.in_(ingredient_ids)): db.session.delete(item) # ORM delete: sync, name and nutrient indexes follow
+            db.session.commit()
+        return outcomes, problems
+    finally:
+        if scratch:
+            with stress_app.app_context(): db.engine.dispose()
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+def _stub_nutritionix(latency_s):
+    """ A local stand-in for the Nutritionix API answering every query after `latency_s`, with keep-alive.
+    Returns (server, url, set of client addresses seen): one address per connection the app opened. """
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    body = json.dumps({'foods': [{'food_name': 'stub food', 'serving_qty': 100, 'serving_unit': 'g', 'serving_weight_grams': 100,
+                                  'nf_calories': 120, 'nf_protein': 6, 'nf_total_carbohydrate': 15, 'nf_total_fat': 4}]}).encode()
+    clients = set()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        def do_POST(self):
+            clients.add(self.client_address)
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            time.sleep(latency_s)
+            self.send_response(200); self.send_header('Content-Type', 'application/json'); self.send_header('Content-Length', str(len(body)))
+            self.end_headers(); self.wfile.write(body)
+        def log_message(self, *args): pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler); server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='nutritionix-stub', daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}/v2/natural/nutrients', clients
+
+
+def _free_port():
+    import socket
+    with socket.socket() as s: s.bind(('127.0.0.1', 0)); return s.getsockname()[1]
+
+
+def concurrency(app, worker_classes=('sync', 'gthread'), workers=2, threads=8, concurrency=64, requests_per_run=400,
+                latency_ms=200, path='/api/lookup?q=bench food {i}'):
+    """ Serves the app with gunicorn once per worker class, against a scratch database and a Nutritionix stub
+    that adds `latency_ms`, and sends `requests_per_run` GETs of `path` ({i} is the request number) from
+    `concurrency` client threads. Returns [(worker class, Counter of statuses, seconds, requests/s, p50 ms,
+    p95 ms, upstream connections)]. """
+    import os
+    import subprocess
+    import sys
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    import numpy as np
+    import requests
+    from . import create_app
+    from .config import basedir
+    from .extensions import db
+    from .models import User
+    scratch = tempfile.mkdtemp(prefix='bench-concurrency-')
+    database_url = 'sqlite:///' + os.path.join(scratch, 'bench.db')
+    bench_app = create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'SECRET_KEY': app.config['SECRET_KEY']})
+    with bench_app.app_context():
+        db.create_all()
+        user = User(username='bench'); user.set_password(os.urandom(8).hex()); db.session.add(user); db.session.commit()
+        cookie = {bench_app.config['SESSION_COOKIE_NAME']: bench_app.session_interface.get_signing_serializer(bench_app).dumps({'user_id': user.id})}
+    results = []
+    for worker_class in worker_classes:
+        stub, stub_url, upstream = _stub_nutritionix(latency_ms / 1000.0)
+        port = _free_port()
+        env = dict(os.environ, DATABASE_URL=database_url, SECRET_KEY=app.config['SECRET_KEY'], GUNICORN_BIND=f'127.0.0.1:{port}',
+                   WEB_CONCURRENCY=str(workers), GUNICORN_WORKER_CLASS=worker_class, GUNICORN_THREADS=str(threads if worker_class != 'sync' else 1),
+                   SCHEDULER='false', NUTRITIONIX_API_URL=stub_url, NUTRITIONIX_APP_ID='bench', NUTRITIONIX_API_KEY='bench',
+                   NUTRITIONIX_PER_MINUTE='1000000', NUTRITIONIX_PER_DAY='1000000000', QUOTA_CACHE_TTL_S='0',
+                   QUOTA_PATH=os.path.join(scratch, f'quota-{worker_class}.db'), LOG_LEVEL='WARNING')
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(basedir, 'gunicorn.conf.py'), 'app:app'], cwd=basedir, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base = f'http://127.0.0.1:{port}'
+        try:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    if requests.get(base + '/api/ready', timeout=2).status_code == 200: break
+                except requests.RequestException: pass
+                if time.monotonic() > deadline or server.poll() is not None: raise RuntimeError(f'gunicorn ({worker_class}) did not become ready')
+                time.sleep(0.2)
+            upstream.clear()
+            local = threading.local()
+
+            def fetch(i):
+                session = getattr(local, 'session', None)
+                if session is None: session = local.session = requests.Session(); session.cookies.update(cookie)
+                t0 = time.perf_counter()
+                try: status = session.get(base + path.format(i=i), timeout=120).status_code
+                except requests.RequestException as e: status = type(e).__name__
+                return status, (time.perf_counter() - t0) * 1000
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as pool: timings = list(pool.map(fetch, range(requests_per_run)))
+            elapsed = time.perf_counter() - started
+            ms = [t for _, t in timings]
+            results.append((worker_class, Counter(status for status, _ in timings), elapsed, requests_per_run / elapsed,
+                            float(np.percentile(ms, 50)), float(np.percentile(ms, 95)), len(upstream)))
+        finally:
+            server.terminate(); server.wait(30); stub.shutdown(); stub.server_close()
+    return results
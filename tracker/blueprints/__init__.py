@@ -0,0 +1,13 @@
+""" Route blueprints. View modules import their forms inside the view function,
+so WTForms is only loaded once a page with a form is actually rendered. """
+
+
+def register_blueprints(app):
+    from . import auth, log, catalog, recipes, planner, digests, api
+    app.register_blueprint(auth.bp)
+    app.register_blueprint(log.bp)
+    app.register_blueprint(catalog.bp)
+    app.register_blueprint(recipes.bp)
+    app.register_blueprint(planner.bp)
+    app.register_blueprint(digests.bp)
+    app.register_blueprint(api.bp, url_prefix='/api')
@@ -0,0 +1,179 @@
+""" JSON API endpoints. """
+import math
+from datetime import date
+from flask import Blueprint, Response, current_app, g, get_flashed_messages, jsonify, abort, request
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..extensions import db
+
+from ..nutrition import get_day_summary
+from ..nutrient_index import ingredients_by_nutrient
+
+bp = Blueprint('api', __name__)
+
+@bp.route('/health', methods=['GET'])
+def health():
+    """ Liveness probe; touches neither the database nor templates. """
+    return jsonify(status='ok')
+
+@bp.route('/ready', methods=['GET'])
+def ready():
+    """ Readiness probe: 503 until warm-up has finished in this worker (see tracker.warmup), then 200 while the database answers. """
+    from ..warmup import ensure_started
+    state = ensure_started(current_app._get_current_object())
+    if state['status'] != 'ready': return jsonify(status=state['status']), 503
+    try: db.session.execute(db.text('SELECT 1'))
+    except SQLAlchemyError: return jsonify(status='database unavailable'), 503
+    return jsonify(status='ready', warmup_ms=state['ms'], steps=state['steps'])
+
+@bp.route('/quota', methods=['GET'])
+def quota_status():
+    """ The shared Nutritionix budget: limits, tokens left per bucket, and granted/waited/rejected/cache counters. """
+    from ..quota import status
+    return jsonify(status())
+
+@bp.route('/summary/<log_date>', methods=['GET'])
+def day_summary(log_date):
+    try: log_date_obj = date.fromisoformat(log_date)
+    except ValueError: abort(400)
+    return jsonify(date=log_date_obj.isoformat(), summary=get_day_summary(log_date_obj, g.user.id))
+
+def _day_log_response(dates):
+    from .. import day_log
+    try:
+        keys, entry_fields = day_log.parse_fields(request.args.get('fields'))
+        include = day_log.parse_include(request.args.get('include'))
+    except ValueError as e: return jsonify(error=str(e)), 400
+    documents = day_log.days(g.user.id, dates, keys, entry_fields, include)
+    return Response(day_log.dumps(documents[0] if len(dates) == 1 and 'dates' not in request.args else {'days': documents}), mimetype='application/json')
+
+@bp.route('/log/<log_date>', methods=['GET'])
+def day_log_view(log_date):
+    """ One day's entries by meal plus its summary. ?fields=calories,protein,quantity (sparse fieldset) &include=food,recipe (embed names). """
+    try: log_date_obj = date.fromisoformat(log_date)
+    except ValueError: abort(400)
+    return _day_log_response([log_date_obj])
+
+@bp.route('/log', methods=['GET'])
+def day_logs_view():
+    """ Several days in one request: ?dates=2024-05-01,2024-05-03 or a range ?dates=2024-05-01..2024-05-30 (at most 92 days),
+    with the same fields= and include= as /api/log/<date>. """
+    from ..day_log import parse_dates
+    try: dates = parse_dates(request.args.get('dates'))
+    except ValueError as e: return jsonify(error=str(e)), 400
+    return _day_log_response(dates)
+
+@bp.route('/sync', methods=['GET'])
+def sync_feed():
+    """ Delta sync for offline clients: ?since=<cursor from the last page>&limit=n. Foods, ingredients, recipes and recent meal
+    logs changed since the cursor, deletions as tombstones, oldest first; repeat with the returned cursor while `more`.
+    No cursor starts from the beginning. 410 when the cursor is not from this database (sync again from the start). """
+    from .. import sync
+    from ..day_log import dumps
+    config = current_app.config
+    try: since = sync.parse_cursor(request.args.get('since'))
+    except ValueError: return jsonify(error='Bad cursor'), 400
+    limit = max(1, min(request.args.get('limit', config['SYNC_PAGE_SIZE'], type=int), config['SYNC_PAGE_MAX']))
+    if since > sync.last_seq(): return jsonify(error='Unknown cursor; sync again without one'), 410
+    return Response(dumps(sync.changes(g.user.id, since, limit)), mimetype='application/json')
+
+@bp.route('/history', methods=['GET'])
+def history_totals():
+    """ Per-day totals for ?start=YYYY-MM-DD&end=YYYY-MM-DD (inclusive, at most 366 days), archived months included. """
+    from ..history import daily_totals
+    try: start, end = date.fromisoformat(request.args['start']), date.fromisoformat(request.args.get('end') or date.today().isoformat())
+    except (KeyError, ValueError): abort(400)
+    if start > end or (end - start).days > 365: abort(400)
+    return jsonify(start=start.isoformat(), end=end.isoformat(),
+                   days=[{'date': day.isoformat(), 'summary': totals.as_dict()} for day, totals in daily_totals(g.user.id, start, end).items()])
+
+@bp.route('/digests/<week>', methods=['GET'])
+def weekly_digest(week):
+    """ The stored digest of the week containing `week` (YYYY-MM-DD) as JSON; 404 until it has been generated. """
+    from .. import digests
+    try: start = digests.week_start(date.fromisoformat(week))
+    except ValueError: abort(400)
+    digest = digests.get(g.user.id, start)
+    if digest is None: abort(404)
+    return jsonify(generated_at=digest.generated_at.isoformat(), **digest.data)
+
+@bp.route('/lookup', methods=['GET'])
+def ingredient_lookup():
+    """ ?q=<ingredient>: its nutrition (per 100 g where possible), from the offline reference dataset or else Nutritionix,
+    as the ingredient form fills it in. What the form would flash comes back in `messages`; 404 when nothing was found. """
+    from ..nutritionix import get_nutritionix_ingredient_data
+    from ..reference_foods import lookup as lookup_reference_food
+    name = (request.args.get('q') or '').strip()
+    if not name: abort(400)
+    data = lookup_reference_food(name) or get_nutritionix_ingredient_data(name)
+    messages = [{'category': category, 'message': message} for category, message in get_flashed_messages(with_categories=True)]
+    return jsonify(query=name, result=data, messages=messages), 200 if data else 404
+
+@bp.route('/ingredients/by-nutrient/<nutrient>', methods=['GET'])
+def ingredients_by_nutrient_view(nutrient):
+    """ e.g. /api/ingredients/by-nutrient/magnesium?min=50&limit=20&order=desc (amounts per 100 g). """
+    min_amount = request.args.get('min', type=float)
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500)) # .limit(-1) would mean no limit on SQLite
+    descending = request.args.get('order', 'desc') != 'asc'
+    return jsonify(nutrient=nutrient, min=min_amount, results=ingredients_by_nutrient(nutrient, min_amount, limit, descending))
+
+def _parse_targets(raw):
+    """ 'calories:2100,protein:100' -> {'calories': 2100.0, 'protein': 100.0} """
+    targets = {}
+    for part in (raw or '').split(','):
+        key, _, value = part.partition(':')
+        if key.strip() and value.strip(): targets[key.strip()] = float(value)
+    return targets
+
+def _numeric_mapping(value, name):
+    """ `value` if it is an object of nutrient key -> finite number (or null); raises ValueError otherwise. """
+    if not isinstance(value, dict): raise ValueError(f'{name} must be an object')
+    for key, number in value.items():
+        if number is not None and (isinstance(number, bool) or not isinstance(number, (int, float)) or not math.isfinite(number)):
+            raise ValueError(f'{name}.{key} must be a finite number')
+    return value
+
+@bp.route('/recommendations', methods=['GET', 'POST'])
+def recommendations():
+    """ Top-k foods/ingredients/recipes to close the remaining targets (default: the user's saved targets).
+    GET:  ?date=YYYY-MM-DD&targets=calories:2100,protein:100,fiber:30&k=10&kinds=food,recipe
+    POST: {"summary": {...get_day_summary result...} | "date": ..., "targets": {...}, "k": 10, "kinds": [...]} """
+    from ..recommender import recommend, KINDS # Lazy: NumPy is only loaded once recommendations are requested
+    payload = (request.get_json(silent=True) or {}) if request.method == "POST" else {}
+    try:
+        if not isinstance(payload, dict): raise ValueError('Body must be a JSON object')
+        targets = _numeric_mapping(payload.get('targets') or _parse_targets(request.args.get('targets')) or g.user.targets(), 'targets')
+        k = int(payload.get('k') or request.args.get('k', 10))
+        kinds = payload.get('kinds') or [kind for kind in request.args.get('kinds', ','.join(KINDS)).split(',') if kind]
+        if not isinstance(kinds, list) or not all(isinstance(kind, str) for kind in kinds): raise ValueError('kinds must be a list of names')
+        summary = payload.get('summary')
+        if summary is None:
+            log_date = payload.get('date') or request.args.get('date') or date.today().isoformat()
+            summary = get_day_summary(date.fromisoformat(log_date), g.user.id)
+        summary = _numeric_mapping(summary, 'summary')
+    except (TypeError, ValueError) as e: return jsonify(error=str(e) or 'Bad request'), 400
+    if not targets: return jsonify(error='No targets given or saved'), 400
+    return jsonify(consumed=summary, targets=targets, results=recommend(summary, targets, k=min(k, 100), kinds=kinds, user_id=g.user.id))
+
+def _parse_keys(raw, default_kind):
+    """ 'recipe:4,food:9,12' -> {('recipe', 4), ('food', 9), (default_kind, 12)} """
+    keys = set()
+    for part in (raw or '').split(','):
+        kind, _, item_id = part.strip().rpartition(':')
+        if item_id: keys.add((kind or default_kind, int(item_id)))
+    return keys
+
+@bp.route('/similar/<kind>/<int:item_id>', methods=['GET'])
+def similar_items(kind, item_id):
+    """ Substitutes with the nutrient profile nearest one food/ingredient/recipe, each in the portion matching its calories.
+    ?k=10&kinds=recipe,food&meal_type=Lunch&exclude=recipe:4,food:9 (bare ids in `exclude` are of `kind`) """
+    from ..similarity import similar, KINDS # Lazy: NumPy is only loaded once substitutes are requested
+    if kind not in KINDS: abort(404)
+    try:
+        k = request.args.get('k', 10, type=int)
+        kinds = [name for name in request.args.get('kinds', ','.join(KINDS)).split(',') if name]
+        results = similar(kind, item_id, k=min(k, 100), kinds=kinds, meal_type=request.args.get('meal_type'),
+                          exclude=_parse_keys(request.args.get('exclude'), kind), user_id=g.user.id)
+    except ValueError: abort(400)
+    if results is None: abort(404)
+    return jsonify(kind=kind, id=item_id, results=results)
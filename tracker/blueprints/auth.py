@@ -0,0 +1,62 @@
+""" Account views: log in/out, registration and per-user daily targets. """
+from urllib.parse import urlsplit
+
+from flask import Blueprint, current_app, g, render_template, request, redirect, url_for, flash
+
+from ..accounts import login_user, logout_user
+from ..extensions import db
+from ..models import User
+from ..nutrients import column_names
+
+bp = Blueprint('auth', __name__)
+
+def _safe_next(target):
+    """ Only follow local paths after login. Browsers read '\\' as '/' and drop tabs and newlines, so '/\\evil.com'
+    would lead off-site: such targets are refused along with anything that has a scheme or host. """
+    if not target or not target.startswith('/') or '\\' in target or any(ord(ch) < 32 for ch in target): return url_for('log.index')
+    parts = urlsplit(target)
+    return target if not parts.scheme and not parts.netloc else url_for('log.index')
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    from ..forms import LoginForm
+    form = LoginForm()
+    if form.validate_on_submit():
+        user = User.query.filter(db.func.lower(User.username) == form.username.data.strip().lower()).first()
+        if user and user.check_password(form.password.data):
+            login_user(user); return redirect(_safe_next(request.args.get('next')))
+        flash('Invalid username or password.', 'danger')
+    return render_template('login.html', form=form, allow_registration=current_app.config['ALLOW_REGISTRATION'])
+
+@bp.route('/logout', methods=['POST'])
+def logout():
+    logout_user(); flash('Logged out.', 'info')
+    return redirect(url_for('.login'))
+
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    from ..forms import RegisterForm
+    if not current_app.config['ALLOW_REGISTRATION']: flash('Registration is closed.', 'warning'); return redirect(url_for('.login'))
+    form = RegisterForm()
+    if form.validate_on_submit():
+        username = form.username.data.strip()
+        if User.query.filter(db.func.lower(User.username) == username.lower()).first(): flash('Username taken.', 'danger')
+        else:
+            try:
+                user = User(username=username); user.set_password(form.password.data)
+                db.session.add(user); db.session.commit()
+                login_user(user); flash(f'Welcome, {user.username}!', 'success'); return redirect(url_for('.settings'))
+            except Exception as e: db.session.rollback(); flash(f'Error: {e}', 'danger')
+    return render_template('register.html', form=form)
+
+@bp.route('/settings', methods=['GET', 'POST'])
+def settings():
+    from ..forms import TargetsForm
+    if g.user is None: return redirect(url_for('.login', next=request.path))
+    form = TargetsForm(obj=g.user)
+    if form.validate_on_submit():
+        try:
+            for name in column_names(User): setattr(g.user, name, form[name].data)
+            db.session.commit(); flash('Targets saved.', 'success'); return redirect(url_for('.settings'))
+        except Exception as e: db.session.rollback(); flash(f'Error: {e}', 'danger')
+    return render_template('settings.html', form=form)
@@ -0,0 +1,179 @@
+""" Catalog views: the manual food database and the ingredient list. """
+import json
+import logging
+from datetime import datetime
+from flask import Blueprint, abort, g, render_template, request, redirect, url_for, flash
+
+from ..accounts import can_edit, get_editable_or_404, new_owner_id, visible
+from ..extensions import db
+from ..models import Food, Ingredient, RecipeIngredient
+from ..name_index import describe_similar, exact_duplicate, find_similar
+from ..nutrients import column_names
+from ..nutritionix import get_nutritionix_ingredient_data
+from ..reference_foods import lookup as lookup_reference_food
+from ..recalc import recalc_after_edit
+from ..recipe_graph import recompute_with_ancestors
+
+bp = Blueprint('catalog', __name__)
+logger = logging.getLogger(__name__)
+
+def _parse_other_details(raw):
+    """ Decodes the hidden other_details JSON field; anything but a JSON object is dropped. """
+    if not raw: return None
+    try: value = json.loads(raw)
+    except ValueError: return None
+    return value if isinstance(value, dict) and value else None
+
+# --- Food Database Routes (Manual) ---
+@bp.route('/database')
+def database_view():
+    foods = Food.query.filter(visible(Food)).order_by(Food.name).all()
+    return render_template('database_view.html', foods=foods)
+
+@bp.route('/database/add', methods=['GET', 'POST'])
+def add_food():
+    from ..forms import FoodForm
+    form = FoodForm()
+    if form.validate_on_submit():
+        similar = find_similar(Food, form.name.data, visible(Food)) # Indexed: exact and near-duplicate names
+        if exact_duplicate(similar, form.name.data): flash('Name exists.', 'danger')
+        else:
+            try:
+                new_food = Food( # Ensure all fields (incl. new micros) are assigned
+                     name=form.name.data.strip(), owner_id=new_owner_id(form.shared.data), base_unit=form.base_unit.data.strip(), base_quantity=form.base_quantity.data,
+                     calories=form.calories.data, protein=form.protein.data, carbs=form.carbs.data, fat=form.fat.data,
+                     fiber=form.fiber.data, sugar=form.sugar.data, calcium=form.calcium.data, iron=form.iron.data,
+                     potassium=form.potassium.data, sodium=form.sodium.data, vit_d=form.vit_d.data, notes=form.notes.data
+                )
+                db.session.add(new_food); db.session.commit(); flash(f'"{new_food.name}" added.', 'success')
+                if similar: flash(f'Possible duplicates: {describe_similar(similar)}.', 'warning')
+                return redirect(url_for('.database_view'))
+            except Exception as e: db.session.rollback(); flash(f'Error: {e}', 'danger')
+    return render_template('add_edit_food.html', form=form, title='Add Food', action_url=url_for('.add_food'), allow_share=g.user.is_admin)
+
+@bp.route('/database/edit/<int:food_id>', methods=['GET', 'POST'])
+def edit_food(food_id):
+    from ..forms import FoodForm
+    food = get_editable_or_404(Food, food_id)
+    form = FoodForm(obj=food)
+    if form.validate_on_submit():
+         similar = find_similar(Food, form.name.data, visible(Food), exclude_id=food_id) if form.name.data.strip() != food.name else []
+         if exact_duplicate(similar, form.name.data): flash('Name exists.', 'danger')
+         else:
+            try: # Assign ALL fields from form
+                 food.name=form.name.data.strip(); food.base_unit=form.base_unit.data.strip(); food.base_quantity=form.base_quantity.data
+                 food.calories=form.calories.data; food.protein=form.protein.data; food.carbs=form.carbs.data; food.fat=form.fat.data
+                 food.fiber=form.fiber.data; food.sugar=form.sugar.data; food.calcium=form.calcium.data; food.iron=form.iron.data
+                 food.potassium=form.potassium.data; food.sodium=form.sodium.data; food.vit_d=form.vit_d.data; food.notes=form.notes.data
+                 food.updated_at = datetime.utcnow()
+                 state = db.inspect(food); nutrients_changed = any(state.attrs[k].history.has_changes() for k in ('base_quantity',) + column_names(Food))
+                 db.session.commit()
+                 if nutrients_changed: recalc_after_edit(food_ids=[food.id]) # Past logs of this food follow the fix
+                 flash(f'"{food.name}" updated.', 'success')
+                 if similar: flash(f'Possible duplicates: {describe_similar(similar)}.', 'warning')
+                 return redirect(url_for('.database_view'))
+            except Exception as e: db.session.rollback(); flash(f'Error: {e}', 'danger')
+    return render_template('add_edit_food.html', form=form, title=f'Edit: {food.name}', action_url=url_for('.edit_food', food_id=food_id))
+
+@bp.route('/database/delete/<int:food_id>', methods=['POST'])
+def delete_food(food_id):
+    # ... (Keep existing code) ...
+    food = get_editable_or_404(Food, food_id)
+    try: db.session.delete(food); db.session.commit(); flash(f'"{food.name}" deleted.', 'success')
+    except Exception as e: db.session.rollback(); flash(f'Error: {e}', 'danger')
+    return redirect(url_for('.database_view'))
+
+# --- Ingredient Routes ---
+@bp.route('/ingredients')
+def ingredients_list():
+    ingredients = Ingredient.query.order_by(Ingredient.category, Ingredient.name).all()
+    return render_template('ingredients_list.html', ingredients=ingredients)
+
+@bp.route('/ingredients/add', methods=['GET', 'POST'])
+def add_ingredient():
+    from ..forms import IngredientForm
+    form = IngredientForm()
+    lookup_name = request.args.get('lookup_name')
+
+    if request.method == 'GET' and lookup_name:
+        api_data = lookup_reference_food(lookup_name) or get_nutritionix_ingredient_data(lookup_name) # Offline dataset first, API on a miss
+        if api_data:
+            form = IngredientForm(data=api_data) # Pre-populate directly if keys match form field names
+            form.name.data = lookup_name # Use original search name
+            form.notes.data = api_data.get('api_info_str','') # Use API info for notes
+            form.data_source_flag.data = api_data['source'] # Set flag: 'usda_fdc' or 'nutritionix'
+            form.other_details_json.data = json.dumps(api_data['other_details']) if api_data.get('other_details') else ''
+            flash(f"Review data found for '{lookup_name}' ({api_data.get('name_from_api') or api_data['source']}).", 'info')
+        else:
+            form.name.data = lookup_name; flash(f"No data found for '{lookup_name}'. Enter manually.", 'warning')
+
+    if form.validate_on_submit(): # POST logic
+        similar = find_similar(Ingredient, form.name.data)
+        if exact_duplicate(similar, form.name.data):
+            flash('Ingredient name exists.', 'danger')
+        else:
+            try:
+                data_source = form.data_source_flag.data or 'manual'
+                from_lookup = data_source in ('nutritionix', 'usda_fdc')
+                new_ingredient = Ingredient( # Assign all fields incl new micros, api fields, json
+                    name=form.name.data.strip(), category=form.category.data.strip() or None,
+                    typical_unit=form.typical_unit.data.strip(), unit_quantity=form.unit_quantity.data,
+                    calories=form.calories.data, protein=form.protein.data, carbs=form.carbs.data,
+                    fat=form.fat.data, fiber=form.fiber.data, sugar=form.sugar.data, calcium=form.calcium.data,
+                    iron=form.iron.data, potassium=form.potassium.data, sodium=form.sodium.data, vit_d=form.vit_d.data,
+                    notes=form.notes.data, # Save user notes
+                    data_source=data_source,
+                    api_info=form.notes.data if from_lookup else None, # Example: If API source, store notes content as API info
+                    api_name=form.name.data if from_lookup else None, # Example: If API source, store form name as API name
+                    other_details=_parse_other_details(form.other_details_json.data) if from_lookup else None # Carried over from the lookup GET
+                )
+                db.session.add(new_ingredient); db.session.commit()
+                flash(f'Ingredient "{new_ingredient.name}" ({data_source}) added.', 'success')
+                if similar: flash(f'Possible duplicates: {describe_similar(similar)}.', 'warning')
+                return redirect(url_for('.ingredients_list'))
+            except Exception as e: db.session.rollback(); flash(f'Error: {e}', 'danger'); logger.exception('Adding ingredient failed')
+
+    return render_template('add_edit_ingredient.html', form=form, title='Add Ingredient', action_url=url_for('.add_ingredient'))
+
+
+@bp.route('/ingredients/edit/<int:ingredient_id>', methods=['GET', 'POST'])
+def edit_ingredient(ingredient_id):
+    from ..forms import IngredientForm
+    # ... (Keep existing logic, ensure ALL new fields are handled on POST) ...
+    ingredient = Ingredient.query.get_or_404(ingredient_id)
+    if not can_edit(ingredient): abort(403) # Shared by every user's recipes: admins only
+    form = IngredientForm(obj=ingredient)
+    if form.validate_on_submit():
+        similar = find_similar(Ingredient, form.name.data, exclude_id=ingredient_id) if form.name.data.strip() != ingredient.name else []
+        if exact_duplicate(similar, form.name.data): flash('Name exists.', 'danger')
+        else:
+            try: # Assign all fields
+                 ingredient.name = form.name.data.strip(); ingredient.category = form.category.data.strip() or None
+                 ingredient.typical_unit = form.typical_unit.data.strip(); ingredient.unit_quantity = form.unit_quantity.data
+                 ingredient.calories = form.calories.data; ingredient.protein = form.protein.data; ingredient.carbs = form.carbs.data
+                 ingredient.fat = form.fat.data; ingredient.fiber = form.fiber.data; ingredient.sugar = form.sugar.data
+                 ingredient.calcium = form.calcium.data; ingredient.iron = form.iron.data; ingredient.potassium = form.potassium.data
+                 ingredient.sodium = form.sodium.data; ingredient.vit_d = form.vit_d.data; ingredient.notes = form.notes.data
+                 # Decide if editing should reset data_source? For now, let's not.
+                 ingredient.updated_at = datetime.utcnow()
+                 state = db.inspect(ingredient); nutrients_changed = any(state.attrs[k].history.has_changes() for k in ('unit_quantity',) + column_names(Ingredient))
+                 changed = []
+                 if nutrients_changed: # Recipes using it (and the recipes including those) get new totals in the same commit
+                     db.session.flush()
+                     changed = recompute_with_ancestors(*{rid for (rid,) in db.session.query(RecipeIngredient.recipe_id).filter_by(ingredient_id=ingredient.id)})
+                 db.session.commit(); flash(f'Ingredient "{ingredient.name}" updated.', 'success')
+                 if changed: recalc_after_edit(recipe_ids=changed) # Past logs of those recipes follow the fix
+                 if similar: flash(f'Possible duplicates: {describe_similar(similar)}.', 'warning')
+                 return redirect(url_for('.ingredients_list'))
+            except Exception as e: db.session.rollback(); flash(f'Error: {e}', 'danger')
+    return render_template('add_edit_ingredient.html', form=form, title=f'Edit: {ingredient.name}', action_url=url_for('.edit_ingredient', ingredient_id=ingredient_id))
+
+
+@bp.route('/ingredients/delete/<int:ingredient_id>', methods=['POST'])
+def delete_ingredient(ingredient_id):
+    # ... (Keep existing code) ...
+    ingredient = Ingredient.query.get_or_404(ingredient_id)
+    if not can_edit(ingredient): abort(403) # Shared by every user's recipes: admins only
+    try: db.session.delete(ingredient); db.session.commit(); flash(f'"{ingredient.name}" deleted.', 'success')
+    except Exception as e: db.session.rollback(); flash(f'Error: {e}', 'danger')
+    return redirect(url_for('.ingredients_list'))
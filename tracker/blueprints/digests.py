@@ -0,0 +1,18 @@
+""" Weekly digest pages; the digests themselves are written in the background (see tracker.digests). """
+from datetime import date
+from flask import Blueprint, abort, g, render_template
+
+from .. import digests
+
+bp = Blueprint('digests', __name__)
+
+@bp.route('/digests')
+@bp.route('/digests/<week>')
+def weekly_digest(week=None):
+    """ The stored digest of the week starting `week` (any day of it works), or the latest one. """
+    weeks = digests.user_digests(g.user.id)
+    if week is None: start = weeks[0].week_start if weeks else digests.last_complete_week()
+    else:
+        try: start = digests.week_start(date.fromisoformat(week))
+        except ValueError: abort(404)
+    return render_template('digests.html', digest=digests.get(g.user.id, start), weeks=weeks)
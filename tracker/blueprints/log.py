@@ -0,0 +1,173 @@
+""" Daily log views: viewing a day, adding/removing entries and exporting a date range. """
+import csv
+import io
+import logging
+from datetime import date, timedelta
+from flask import Blueprint, Response, abort, g, render_template, request, redirect, url_for, flash
+
+from ..accounts import user_logs
+from ..extensions import db
+from .. import adherence, bulk_log, catalog_cache, history
+from ..models import MEAL_TYPES, Food, MealLog, MealTemplate, Recipe
+from ..nutrients import column_names
+from ..nutrition import calculate_nutrients, get_day_summary
+
+bp = Blueprint('log', __name__)
+logger = logging.getLogger(__name__)
+
+@bp.route('/', methods=['GET'])
+def index(): return redirect(url_for('.daily_log', date=date.today().isoformat()))
+
+@bp.route('/log', methods=['GET'])
+def daily_log():
+    from ..forms import ApplyTemplateForm, CopyEntriesForm, LogEntryForm, LogRecipeForm, SaveTemplateForm
+    # ... (GET logic remains the same, fetching logs/summary, instantiating forms) ...
+    log_date_str = request.args.get('date', date.today().isoformat())
+    try: log_date_obj = date.fromisoformat(log_date_str)
+    except ValueError: log_date_obj = date.today(); log_date_str = log_date_obj.isoformat(); flash('Invalid date.', 'warning')
+    log_food_form = LogEntryForm(log_date=log_date_str)
+    log_recipe_form = LogRecipeForm(log_date=log_date_str)
+    meal_types = list(MEAL_TYPES)
+    logs_by_meal = history.day_entries_by_meal(g.user.id, log_date_obj, meal_types) # Live and archived entries
+    daily_summary = get_day_summary(log_date_obj, g.user.id)
+    goals = adherence.status(g.user, log_date_obj)
+    prev_date = (log_date_obj - timedelta(days=1)).isoformat()
+    next_date = (log_date_obj + timedelta(days=1)).isoformat()
+    copy_form = CopyEntriesForm(log_date=log_date_str, source_date=log_date_obj - timedelta(days=1))
+    template_form = SaveTemplateForm(log_date=log_date_str)
+    apply_form = ApplyTemplateForm(log_date=log_date_str)
+    return render_template('daily_log.html', log_form=log_food_form, log_recipe_form=log_recipe_form, copy_form=copy_form, template_form=template_form, apply_form=apply_form,
+                           current_date_str=log_date_str, current_date_obj=log_date_obj, prev_date=prev_date, next_date=next_date, logs_by_meal=logs_by_meal, daily_summary=daily_summary, goals=goals, meal_types=meal_types)
+
+def _date_range_args(default_days=30):
+    """ ?start=&end= (ISO dates, inclusive); defaults to the last `default_days` days. Raises ValueError. """
+    end = date.fromisoformat(request.args['end']) if request.args.get('end') else date.today()
+    start = date.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=default_days - 1)
+    if start > end: raise ValueError('start is after end')
+    return start, end
+
+@bp.route('/log/export.csv', methods=['GET'])
+def export_logs():
+    """ The user's entries between ?start= and ?end= as CSV, archived months included. """
+    try: start, end = _date_range_args()
+    except ValueError: abort(400)
+    out = io.StringIO(); writer = csv.writer(out)
+    writer.writerow(['date', 'meal', 'kind', 'name', 'quantity', *column_names(MealLog)])
+    for log in history.entries(g.user.id, start, end):
+        source = log.food if log.food_id else log.recipe
+        writer.writerow([log.log_date.isoformat(), log.meal_type, 'food' if log.food_id else 'recipe', source.name if source else '',
+                         log.quantity_consumed, *[getattr(log, name) for name in column_names(MealLog)]])
+    return Response(out.getvalue(), mimetype='text/csv', headers={'Content-Disposition': f'attachment; filename=meal_log_{start}_{end}.csv'})
+
+@bp.route('/log/food', methods=['POST'])
+def log_food_entry():
+    from ..forms import LogEntryForm
+    # ... (Keep this route using manual Food DB as per starting point) ...
+    form = LogEntryForm(request.form, load_choices=False) # The food is checked through the catalog cache, not a full choice list
+    log_date_str = form.log_date.data or date.today().isoformat()
+
+    if form.validate_on_submit():
+        try:
+            food = catalog_cache.get_visible_or_404(Food, form.food_id.data, g.user.id)
+            quantity = form.quantity_consumed.data
+            calculated = calculate_nutrients(food, quantity)
+            new_log = MealLog(user_id=g.user.id, log_date=date.fromisoformat(log_date_str), meal_type=form.meal_type.data, food_id=food.id, recipe_id=None, quantity_consumed=quantity, **calculated.as_columns(MealLog))
+            db.session.add(new_log); db.session.commit()
+            flash(f'Added {quantity} {food.unit} of {food.name}.', 'success')
+        except Exception as e: db.session.rollback(); flash(f'Error logging food: {e}', 'danger'); logger.exception('Logging food failed')
+    else: flash("Log food error: " + "; ".join([f"{form[f].label.text}: {e}" for f,errs in form.errors.items() for e in errs]), "danger")
+    return redirect(url_for('.daily_log', date=log_date_str))
+
+@bp.route('/log/recipe', methods=['POST'])
+def log_recipe_entry():
+    from ..forms import LogRecipeForm
+    # ... (Keep existing code, ensure it saves new calculated nutrients) ...
+    form = LogRecipeForm(request.form, load_choices=False)
+    log_date_str = form.log_date.data or date.today().isoformat()
+
+    if form.validate_on_submit():
+        try:
+            recipe = catalog_cache.get_visible_or_404(Recipe, form.recipe_id.data, g.user.id)
+            quantity = form.quantity_consumed.data # Multiplier
+            # Calculate portion nutrients
+            nutrients = recipe.portion(quantity).as_columns(MealLog)
+
+            new_log = MealLog(user_id=g.user.id, log_date=date.fromisoformat(log_date_str), meal_type=form.meal_type.data, recipe_id=recipe.id, food_id=None, quantity_consumed=quantity, **nutrients)
+            db.session.add(new_log); db.session.commit()
+            serv_str = f'{quantity} {"serving" if quantity == 1 else "servings"}'; flash(f'Logged {serv_str} of "{recipe.name}".', 'success')
+        except Exception as e: db.session.rollback(); flash(f'Error logging recipe: {e}', 'danger'); logger.exception('Logging recipe failed')
+    else: flash("Log recipe error: " + "; ".join([f"{form[f].label.text}: {e}" for f,errs in form.errors.items() for e in errs]), "danger")
+    return redirect(url_for('.daily_log', date=log_date_str))
+
+
+def _form_errors(form): return "; ".join([f"{form[f].label.text}: {e}" for f,errs in form.errors.items() for e in errs])
+
+@bp.route('/log/copy', methods=['POST'])
+def copy_entries():
+    """ Logs a past day (or one of its meals) again on the viewed day, in one INSERT ... SELECT. """
+    from ..forms import CopyEntriesForm
+    form = CopyEntriesForm(request.form)
+    log_date_str = form.log_date.data or date.today().isoformat()
+    if form.validate_on_submit():
+        source, what = form.source_date.data, form.meal_type.data or 'entries'
+        try:
+            count = bulk_log.copy_entries(g.user.id, source, date.fromisoformat(log_date_str), form.meal_type.data or None)
+            if count: flash(f'Copied {count} {"entry" if count == 1 else "entries"} from {source.isoformat()}.', 'success')
+            else: flash(f'No {what} logged on {source.isoformat()}.', 'info')
+        except Exception as e: db.session.rollback(); flash(f'Error copying entries: {e}', 'danger'); logger.exception('Copying entries failed')
+    else: flash("Copy error: " + _form_errors(form), "danger")
+    return redirect(url_for('.daily_log', date=log_date_str))
+
+@bp.route('/log/templates', methods=['GET'])
+def meal_templates():
+    templates = MealTemplate.query.filter_by(user_id=g.user.id).options(db.selectinload(MealTemplate.items)).order_by(MealTemplate.name).all()
+    return render_template('meal_templates.html', templates=templates)
+
+@bp.route('/log/templates', methods=['POST'])
+def save_meal_template():
+    """ Saves one meal of the viewed day as a template. """
+    from ..forms import SaveTemplateForm
+    form = SaveTemplateForm(request.form)
+    log_date_str = form.log_date.data or date.today().isoformat()
+    if form.validate_on_submit():
+        name = form.name.data.strip()
+        if MealTemplate.query.filter(MealTemplate.user_id == g.user.id, db.func.lower(MealTemplate.name) == name.lower()).first(): flash(f'A template named "{name}" exists.', 'warning')
+        else:
+            try:
+                template = bulk_log.save_template(g.user.id, name, date.fromisoformat(log_date_str), form.meal_type.data)
+                if template: flash(f'Saved template "{template.name}" ({len(template.items)} items).', 'success')
+                else: flash(f'Nothing logged for {form.meal_type.data} to save.', 'info')
+            except Exception as e: db.session.rollback(); flash(f'Error saving template: {e}', 'danger'); logger.exception('Saving meal template failed')
+    else: flash("Template error: " + _form_errors(form), "danger")
+    return redirect(url_for('.daily_log', date=log_date_str))
+
+@bp.route('/log/templates/apply', methods=['POST'])
+def apply_meal_template():
+    from ..forms import ApplyTemplateForm
+    form = ApplyTemplateForm(request.form)
+    log_date_str = form.log_date.data or date.today().isoformat()
+    if form.validate_on_submit():
+        template = MealTemplate.query.filter_by(id=form.template_id.data, user_id=g.user.id).first_or_404()
+        try:
+            count = bulk_log.apply_template(template, g.user.id, date.fromisoformat(log_date_str), form.meal_type.data or None)
+            flash(f'Logged "{template.name}" ({count} {"entry" if count == 1 else "entries"}).', 'success')
+        except Exception as e: db.session.rollback(); flash(f'Error logging template: {e}', 'danger'); logger.exception('Applying meal template failed')
+    else: flash("Template error: " + _form_errors(form), "danger")
+    return redirect(url_for('.daily_log', date=log_date_str))
+
+@bp.route('/log/templates/<int:template_id>/delete', methods=['POST'])
+def delete_meal_template(template_id):
+    template = MealTemplate.query.filter_by(id=template_id, user_id=g.user.id).first_or_404()
+    try: db.session.delete(template); db.session.commit(); flash(f'Template "{template.name}" deleted.', 'success')
+    except Exception as e: db.session.rollback(); flash(f'Error: {e}', 'danger')
+    return redirect(url_for('.meal_templates'))
+
+
+@bp.route('/log/delete/<int:log_id>', methods=['POST'])
+def delete_log_entry(log_id):
+    # ... (Keep existing code) ...
+    log = user_logs().filter(MealLog.id == log_id).first_or_404()
+    date_str = log.log_date.isoformat()
+    try: db.session.delete(log); db.session.commit(); flash("Log entry deleted.", "success")
+    except Exception as e: db.session.rollback(); flash(f"Error deleting log: {e}", "danger")
+    return redirect(url_for('.daily_log', date=date_str))
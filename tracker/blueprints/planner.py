@@ -0,0 +1,187 @@
+""" Meal plan suggestion and shopping list views. """
+import csv
+import io
+import logging
+import math
+from datetime import date, timedelta
+from flask import Blueprint, Response, abort, g, redirect, render_template, request, flash, url_for
+
+from .. import shopping
+from ..accounts import visible
+from ..models import Recipe
+from ..nutrients import NutrientVector
+
+bp = Blueprint('planner', __name__)
+logger = logging.getLogger(__name__)
+
+@bp.route('/suggest-meal-plan')
+def suggest_meal_plan():
+    # === The user's targets (falling back to the old defaults when unset) ===
+    TARGET_CALORIES = g.user.target_calories or 2100.0
+    TARGET_PROTEIN = g.user.target_protein or 100.0
+    # TARGET_FIBER = 30.0 # Can add later
+
+    # === Simple Target Distribution (Approximate percentages) ===
+    targets_per_meal = {
+        'Breakfast': {'protein': TARGET_PROTEIN * 0.30, 'calories': TARGET_CALORIES * 0.25},
+        'Lunch':     {'protein': TARGET_PROTEIN * 0.40, 'calories': TARGET_CALORIES * 0.35},
+        'Dinner':    {'protein': TARGET_PROTEIN * 0.30, 'calories': TARGET_CALORIES * 0.30}
+    }
+
+    # === Fetch Valid Recipes (with nutrition info) ===
+    all_recipes = Recipe.query.filter(
+        visible(Recipe),
+        Recipe.total_calories.isnot(None),
+        Recipe.total_calories > 0, # Ensure calories > 0 for sensible calculations
+        Recipe.total_protein.isnot(None)
+    ).all()
+
+    if not all_recipes:
+        flash("No recipes found with calculated nutrition data.", "warning")
+        return render_template('suggest_plan.html', suggested_plan=[], targets={'calories': TARGET_CALORIES, 'protein': TARGET_PROTEIN}, plan_totals=NutrientVector().as_dict())
+
+    # === Meal Planning Algorithm (Heuristic V1 - WITH NO REPEAT) ===
+    suggested_plan = []
+    plan_totals = NutrientVector()
+    remaining_protein = TARGET_PROTEIN
+    remaining_calories = TARGET_CALORIES
+    used_recipe_ids = set() # <-- NEW: Keep track of selected recipe IDs
+
+    # Process meal slots
+    for meal_type in ['Breakfast', 'Lunch', 'Dinner']:
+        meal_target_protein = targets_per_meal[meal_type]['protein']
+        meal_target_calories = targets_per_meal[meal_type]['calories']
+        best_recipe = None
+        multiplier = 0.0
+        portion_nutrients = {}
+
+        # --- Filter recipes suitable for this meal type AND NOT ALREADY USED ---
+        candidate_recipes = [
+            r for r in all_recipes if
+            r.id not in used_recipe_ids and # <-- NEW: Exclude used recipes
+            (meal_type in (r.meal_type_suitability or 'Any').split(',') or
+             'Any' in (r.meal_type_suitability or 'Any').split(','))
+        ]
+
+        if not candidate_recipes:
+            logger.info('No suitable unused recipes', extra={'meal_type': meal_type})
+            suggested_plan.append({'meal_type': meal_type, 'recipe': None, 'multiplier': 0, 'nutrients': {}})
+            continue # Skip to next meal
+
+        # --- Selection Logic ---
+        # Keep prioritization logic (Protein for B/L, Fiber/etc for D)
+        if meal_type in ['Breakfast', 'Lunch']:
+            candidate_recipes.sort(key=lambda r: r.total_protein or 0, reverse=True)
+            best_recipe = candidate_recipes[0] # Select the best remaining candidate
+        elif meal_type == 'Dinner':
+            if hasattr(Recipe, 'total_fiber'):
+                 # Check if fiber data exists and is positive before sorting
+                 candidates_with_fiber = [r for r in candidate_recipes if r.total_fiber and r.total_fiber > 0]
+                 if candidates_with_fiber:
+                     candidates_with_fiber.sort(key=lambda r: r.total_fiber, reverse=True)
+                     best_recipe = candidates_with_fiber[0]
+                 else: # Fallback if no recipes with fiber found
+                     logger.info('No dinner candidates with fiber, falling back to protein sort')
+                     candidate_recipes.sort(key=lambda r: r.total_protein or 0, reverse=True)
+                     if candidate_recipes: best_recipe = candidate_recipes[0]
+            else: # Fallback if no fiber column at all
+                 candidate_recipes.sort(key=lambda r: r.total_protein or 0, reverse=True)
+                 if candidate_recipes: best_recipe = candidate_recipes[0]
+
+
+        # --- Proceed ONLY if a best_recipe was actually found ---
+        if best_recipe:
+            # --- Calculate Serving Multiplier ---
+            recipe_protein = best_recipe.total_protein or 0.0
+            recipe_calories = best_recipe.total_calories or 0.0 # Assumed > 0 by initial query filter
+
+            if recipe_protein > 0:
+                protein_multiplier = meal_target_protein / recipe_protein
+                multiplier = max(0.1, protein_multiplier) # Minimum 0.1 serving
+            else:
+                multiplier = 1.0 # Default to 1 serving if no protein
+
+            # --- Adjust multiplier based on calories ---
+            calorie_multiplier_meal = meal_target_calories / recipe_calories
+            calorie_multiplier_day = remaining_calories / recipe_calories if remaining_calories > 0 else 1.0
+
+            # Adjust: try to hit protein goal, but cap by meal/day calories, max 2 servings?
+            multiplier = min(multiplier, calorie_multiplier_meal * 1.2, calorie_multiplier_day * 1.1, 2.0) # Allow slight calorie overshoot
+            multiplier = max(0.1, multiplier) # Ensure minimum again
+            multiplier = round(multiplier * 4) / 4 # Round to nearest 0.25
+
+            # --- Calculate Nutrients for this Portion ---
+            portion = NutrientVector.from_columns(best_recipe, multiplier)
+            portion_nutrients = portion.as_dict()
+
+
+            # --- Add suggestion to plan ---
+            suggested_plan.append({
+                'meal_type': meal_type,
+                'recipe': best_recipe,
+                'multiplier': multiplier,
+                'nutrients': portion_nutrients # Use original keys for display in template? Adjust template if needed.
+            })
+
+            # --- Update State ---
+            used_recipe_ids.add(best_recipe.id) # <-- NEW: Mark recipe as used
+            remaining_protein -= portion['protein']
+            remaining_calories -= portion['calories']
+            plan_totals += portion
+
+        else: # If no suitable candidate found after sorting (e.g., all remaining had 0 protein)
+            logger.info('No recipe selected after filtering', extra={'meal_type': meal_type})
+            suggested_plan.append({'meal_type': meal_type, 'recipe': None, 'multiplier': 0, 'nutrients': {}})
+
+
+    # Prepare targets dict for template
+    targets = {'calories': TARGET_CALORIES, 'protein': TARGET_PROTEIN}
+
+    shopping_plan = ','.join(f"{s['recipe'].id}:{s['multiplier']}" for s in suggested_plan if s['recipe']) # For the shopping list link
+
+    return render_template('suggest_plan.html',
+                           suggested_plan=suggested_plan,
+                           targets=targets,
+                           plan_totals=plan_totals.as_dict(),
+                           shopping_plan=shopping_plan)
+
+
+def _parse_plan(raw):
+    """ '12:1.5,7:0.75' -> {12: 1.5, 7: 0.75}; a recipe named twice gets both amounts. Raises ValueError, also for
+    servings that are not positive finite numbers. """
+    servings = {}
+    for part in raw.split(','):
+        if not part.strip(): continue
+        recipe_id, _, amount = part.partition(':')
+        amount = float(amount or 1)
+        if not math.isfinite(amount) or amount <= 0: raise ValueError('bad servings') # nan, inf and 0 would reach the totals
+        servings[int(recipe_id)] = servings.get(int(recipe_id), 0.0) + amount
+    return servings
+
+@bp.route('/shopping-list')
+def shopping_list():
+    """ Groceries for ?plan=<recipe id>:<servings>,... (e.g. from the suggested plan), or for the recipes logged between
+    ?start= and ?end= (default: the coming week). ?format=csv downloads the list. """
+    plan = request.args.get('plan', '').strip()
+    start = end = None
+    if plan:
+        try: servings = _parse_plan(plan)
+        except ValueError:
+            flash("Invalid plan: each entry must be a recipe id and a positive number of servings.", "error")
+            return redirect(url_for('planner.suggest_meal_plan'))
+    try:
+        if plan: items = shopping.for_plan(servings, g.user.id)
+        else:
+            start = date.fromisoformat(request.args['start']) if request.args.get('start') else date.today()
+            end = date.fromisoformat(request.args['end']) if request.args.get('end') else start + timedelta(days=6)
+            if start > end or (end - start).days > 366: raise ValueError('bad range')
+            items = shopping.for_logged(g.user.id, start, end)
+    except ValueError: abort(400)
+    if request.args.get('format') == 'csv':
+        out = io.StringIO(); writer = csv.writer(out)
+        writer.writerow(['category', 'ingredient', 'quantity', 'unit', 'recipes'])
+        for item in (item for _, group in shopping.by_category(items) for item in group):
+            writer.writerow([item['category'], item['name'], round(item['quantity'], 2), item['unit'], item['recipes']])
+        filename = 'shopping_list_plan.csv' if plan else f'shopping_list_{start}_{end}.csv'
+        return Response(out.getvalue(), mimetype='text/csv', headers={'Content-Disposition': f'attachment; filename={filename}'})
+    return render_template('shopping_list.html', groups=shopping.by_category(items), item_count=len(items), plan=plan, start=start, end=end)
@@ -0,0 +1,170 @@
+""" Recipe views: recipe CRUD and ingredient lines with total recalculation. """
+import logging
+from datetime import datetime
+from flask import Blueprint, g, render_template, request, redirect, url_for, flash
+
+from ..accounts import get_editable_or_404, get_visible_or_404, new_owner_id, visible
+from ..extensions import db
+from ..models import Ingredient, Recipe, RecipeIngredient, SubRecipe
+from ..nutrition import RecipeCycleError
+from ..recalc import recalc_after_edit
+from ..recipe_graph import add_ingredient, add_sub_recipe, ancestors, edit_with_retry, load_edges, recompute_with_ancestors, remove_ingredient
+
+bp = Blueprint('recipes', __name__)
+logger = logging.getLogger(__name__)
+
+def _sub_recipe_choices(recipe):
+    """ Recipes that can go inside `recipe`: not itself, not already included, not one that contains it. """
+    _, parents = load_edges()
+    excluded = {recipe.id} | {sr.sub_recipe_id for sr in recipe.sub_recipes} | ancestors(recipe.id, parents)
+    allowed = Recipe.owner_id.is_(None) if recipe.owner_id is None else visible(Recipe) # Shared recipes only contain shared ones
+    return [(r.id, r.name) for r in Recipe.query.filter(allowed, Recipe.id.notin_(excluded)).order_by(Recipe.name)]
+
+# --- Recipe Routes ---
+@bp.route('/recipes')
+def recipes_list():
+    # ... (Keep existing code) ...
+    recipes = Recipe.query.filter(visible(Recipe)).order_by(Recipe.name).all()
+    return render_template('recipes_list.html', recipes=recipes)
+
+@bp.route('/recipes/add', methods=['GET', 'POST'])
+def add_recipe():
+    from ..forms import RecipeForm
+    # ... (Keep existing code) ...
+    form = RecipeForm()
+    if form.validate_on_submit():
+        try:
+            new_recipe = Recipe(name=form.name.data.strip(), owner_id=new_owner_id(form.shared.data), description=form.description.data, instructions=form.instructions.data, meal_type_suitability=",".join(form.meal_type_suitability.data) or 'Any')
+            db.session.add(new_recipe); db.session.commit()
+            flash(f'Recipe "{new_recipe.name}" created.', 'success')
+            return redirect(url_for('.recipe_detail', recipe_id=new_recipe.id))
+        except Exception as e: db.session.rollback(); flash(f'Error: {e}', 'danger')
+    return render_template('add_edit_recipe.html', form=form, title="Create Recipe", action_url=url_for('.add_recipe'), allow_share=g.user.is_admin)
+
+@bp.route('/recipes/<int:recipe_id>', methods=['GET'])
+def recipe_detail(recipe_id):
+    from ..forms import AddIngredientToRecipeForm, AddSubRecipeForm, PasteIngredientsForm
+    # ... (Keep existing code) ...
+    recipe = get_visible_or_404(Recipe, recipe_id, db.selectinload(Recipe.ingredients).joinedload(RecipeIngredient.ingredient), db.selectinload(Recipe.sub_recipes).joinedload(SubRecipe.sub_recipe))
+    add_ingredient_form = AddIngredientToRecipeForm()
+    current_ids = {ri.ingredient_id for ri in recipe.ingredients}; available = Ingredient.query.filter(Ingredient.id.notin_(current_ids)).order_by(Ingredient.name).all()
+    add_ingredient_form.ingredient_id.choices = [(i.id, f"{i.name} ({i.typical_unit})") for i in available]
+    add_sub_recipe_form = AddSubRecipeForm()
+    add_sub_recipe_form.sub_recipe_id.choices = _sub_recipe_choices(recipe)
+    return render_template('recipe_detail.html', recipe=recipe, add_ingredient_form=add_ingredient_form, add_sub_recipe_form=add_sub_recipe_form,
+                           paste_form=PasteIngredientsForm())
+
+
+@bp.route('/recipes/<int:recipe_id>/edit', methods=['GET', 'POST'])
+def edit_recipe(recipe_id):
+    from ..forms import RecipeForm
+    # ... (Keep existing code) ...
+    recipe = get_editable_or_404(Recipe, recipe_id); form = RecipeForm(obj=recipe)
+    if request.method == 'GET': form.meal_type_suitability.data = recipe.meal_type_suitability.split(',') if recipe.meal_type_suitability else []
+    if form.validate_on_submit():
+        def save():
+             recipe.name=form.name.data.strip(); recipe.description=form.description.data; recipe.instructions=form.instructions.data
+             recipe.meal_type_suitability = ",".join(form.meal_type_suitability.data) or 'Any'; recipe.updated_at = datetime.utcnow()
+        try:
+             edit_with_retry(save); flash(f'"{recipe.name}" updated.', 'success'); return redirect(url_for('.recipe_detail', recipe_id=recipe.id))
+        except Exception as e: db.session.rollback(); flash(f'Error: {e}', 'danger')
+    return render_template('add_edit_recipe.html', form=form, title=f"Edit: {recipe.name}", action_url=url_for('.edit_recipe', recipe_id=recipe_id))
+
+
+@bp.route('/recipes/<int:recipe_id>/add_ingredient', methods=['POST'])
+def add_ingredient_to_recipe(recipe_id):
+    from ..forms import AddIngredientToRecipeForm
+    # ... (Keep existing code - ensure ALL totals are updated) ...
+    recipe = get_editable_or_404(Recipe, recipe_id); form = AddIngredientToRecipeForm(request.form)
+    current_ids = {ri.ingredient_id for ri in recipe.ingredients}; available = Ingredient.query.filter(Ingredient.id.notin_(current_ids)).order_by(Ingredient.name).all()
+    form.ingredient_id.choices = [(i.id, f"{i.name} ({i.typical_unit})") for i in available]
+    if form.validate_on_submit():
+        ingredient = db.session.get(Ingredient, form.ingredient_id.data)
+        if not ingredient: flash("Ingredient not found.",'danger')
+        else:
+            ingredient_id, ingredient_name, unit = ingredient.id, ingredient.name, ingredient.typical_unit
+            try:
+                changed = edit_with_retry(lambda: add_ingredient(recipe_id, ingredient_id, form.quantity.data)) # Also refreshes every recipe using this one
+                if changed is None: flash(f"{ingredient_name} already in recipe.", 'warning')
+                else: recalc_after_edit(recipe_ids=changed); flash(f"Added {form.quantity.data} {unit} of {ingredient_name}.", 'success')
+            except Exception as e: db.session.rollback(); flash(f"Error: {e}", 'danger'); logger.exception('Adding recipe ingredient failed', extra={'recipe_id': recipe_id})
+    else: flash("Add ingredient error: " + "; ".join([f"{form[f].label.text}: {e}" for f,errs in form.errors.items() for e in errs]), "danger")
+    return redirect(url_for('.recipe_detail', recipe_id=recipe_id))
+
+
+@bp.route('/recipes/<int:recipe_id>/paste_ingredients', methods=['POST'])
+def paste_ingredients(recipe_id):
+    from .. import quota
+    from ..forms import PasteIngredientsForm
+    from ..recipe_paste import add_pasted
+    get_editable_or_404(Recipe, recipe_id); form = PasteIngredientsForm(request.form)
+    if form.validate_on_submit():
+        try:
+            result = add_pasted(recipe_id, form.lines.data, quota.BATCH) # One lookup call, one edit and one recompute for the whole list
+            if result['changed']: recalc_after_edit(recipe_ids=result['changed'])
+            created = f" (new ingredients: {', '.join(result['created'])})" if result['created'] else ""
+            flash(f"Added {result['added']} ingredient lines{created}.", 'success' if result['added'] else 'warning')
+            if result['skipped']: flash("Skipped: " + "; ".join(f'"{text}" ({reason})' for text, reason in result['skipped']), 'warning')
+        except Exception as e: db.session.rollback(); flash(f"Error: {e}", 'danger'); logger.exception('Pasting recipe ingredients failed', extra={'recipe_id': recipe_id})
+    else: flash("Paste ingredients error: " + "; ".join([f"{form[f].label.text}: {e}" for f,errs in form.errors.items() for e in errs]), "danger")
+    return redirect(url_for('.recipe_detail', recipe_id=recipe_id))
+
+
+@bp.route('/recipes/remove_ingredient/<int:recipe_ingredient_id>', methods=['POST'])
+def remove_ingredient_from_recipe(recipe_ingredient_id):
+    # ... (Keep existing code - ensure ALL totals are updated/reset) ...
+    ri = RecipeIngredient.query.options(db.joinedload(RecipeIngredient.ingredient)).get_or_404(recipe_ingredient_id)
+    recipe_id = get_editable_or_404(Recipe, ri.recipe_id).id; ingredient_name = ri.ingredient.name if ri.ingredient else '?'
+    try:
+        changed = edit_with_retry(lambda: remove_ingredient(recipe_ingredient_id))
+        if changed is None: flash(f"{ingredient_name} was already removed.", 'info')
+        else: recalc_after_edit(recipe_ids=changed); flash(f"Removed {ingredient_name}.", 'success')
+    except Exception as e: db.session.rollback(); flash(f"Error: {e}", "danger"); logger.exception('Removing recipe ingredient failed', extra={'recipe_ingredient_id': recipe_ingredient_id})
+    return redirect(url_for('.recipe_detail', recipe_id=recipe_id))
+
+
+@bp.route('/recipes/delete/<int:recipe_id>', methods=['POST'])
+def delete_recipe(recipe_id):
+    # ... (Keep existing code) ...
+    recipe = get_editable_or_404(Recipe, recipe_id); name = recipe.name
+    def delete():
+        parent_ids = [sr.recipe_id for sr in recipe.used_in]
+        db.session.delete(recipe); db.session.flush()
+        return recompute_with_ancestors(*parent_ids) # Recipes that used it lose its contribution
+    try:
+        changed = edit_with_retry(delete); recalc_after_edit(recipe_ids=changed); flash(f'"{name}" deleted.', 'success')
+    except Exception as e: db.session.rollback(); flash(f'Error: {e}', 'danger')
+    return redirect(url_for('.recipes_list'))
+
+
+@bp.route('/recipes/<int:recipe_id>/add_sub_recipe', methods=['POST'])
+def add_sub_recipe_to_recipe(recipe_id):
+    from ..forms import AddSubRecipeForm
+    recipe = get_editable_or_404(Recipe, recipe_id); form = AddSubRecipeForm(request.form)
+    form.sub_recipe_id.choices = _sub_recipe_choices(recipe)
+    if form.validate_on_submit():
+        sub_recipe = Recipe.query.get(form.sub_recipe_id.data)
+        if not sub_recipe: flash("Recipe not found.", 'danger')
+        else:
+            try:
+                changed = edit_with_retry(lambda: add_sub_recipe(recipe, sub_recipe, form.multiplier.data))
+                recalc_after_edit(recipe_ids=changed); flash(f'Added {form.multiplier.data} x "{sub_recipe.name}".', 'success')
+            except RecipeCycleError as e: db.session.rollback(); flash(f"Can't add: {e}", 'danger')
+            except Exception as e: db.session.rollback(); flash(f"Error: {e}", 'danger'); logger.exception('Adding sub-recipe failed', extra={'recipe_id': recipe.id})
+    else: flash("Add sub-recipe error: " + "; ".join([f"{form[f].label.text}: {e}" for f,errs in form.errors.items() for e in errs]), "danger")
+    return redirect(url_for('.recipe_detail', recipe_id=recipe_id))
+
+
+@bp.route('/recipes/remove_sub_recipe/<int:sub_recipe_link_id>', methods=['POST'])
+def remove_sub_recipe_from_recipe(sub_recipe_link_id):
+    link = SubRecipe.query.options(db.joinedload(SubRecipe.sub_recipe)).get_or_404(sub_recipe_link_id)
+    recipe_id = get_editable_or_404(Recipe, link.recipe_id).id; sub_name = link.sub_recipe.name if link.sub_recipe else '?'
+    def remove():
+        current = db.session.get(SubRecipe, sub_recipe_link_id)
+        if current is None: return []
+        db.session.delete(current); db.session.flush()
+        return recompute_with_ancestors(recipe_id)
+    try:
+        changed = edit_with_retry(remove); recalc_after_edit(recipe_ids=changed); flash(f'Removed "{sub_name}".', 'success')
+    except Exception as e: db.session.rollback(); flash(f"Error: {e}", "danger"); logger.exception('Removing sub-recipe failed', extra={'sub_recipe_link_id': sub_recipe_link_id})
+    return redirect(url_for('.recipe_detail', recipe_id=recipe_id))
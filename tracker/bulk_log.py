@@ -0,0 +1,94 @@
+""" Server-side bulk logging: copying a day or a meal to another date, and meal templates.
+
+Each operation is one statement, INSERT INTO meal_logs ... SELECT over the
+source rows (the same user's entries on another day, or a template's items),
+so copying a day is one round trip however many entries it has. Entries carry
+their stored nutrients along, as if they had been logged again with the same
+numbers; `flask recalc-logs` updates them after catalog edits like any other
+entry. A source day in an archived month (see tracker.log_archive) is read
+through tracker.history and written with one executemany instead.
+
+A template's items are copied from a logged meal the same way, and its
+total_* columns are the SQL sums of the items, refreshed when items go away
+(a deleted food or recipe takes its template items with it).
+"""
+from datetime import datetime
+
+from sqlalchemy import event
+
+from . import history
+from .extensions import db
+from .log_archive import is_archived
+from .models import MealLog, MealTemplate, MealTemplateItem
+from .nutrients import column_names
+from .signals import meal_logs_changed
+
+ENTRY_COLUMNS = ('food_id', 'recipe_id', 'quantity_consumed', *column_names(MealLog)) # Same names on MealTemplateItem
+
+
+def _day_filter(user_id, day, meal_type):
+    return (MealLog.user_id == user_id, MealLog.log_date == day, *([MealLog.meal_type == meal_type] if meal_type else []))
+
+
+def _archived_entries(user_id, day, meal_type):
+    return [e for e in history.entries(user_id, day, day) if not meal_type or e.meal_type == meal_type]
+
+
+def copy_entries(user_id, source, target, meal_type=None):
+    """ Logs `user_id`'s entries of `source` (one meal, or the whole day) again on `target`, in one transaction.
+    Returns the number of entries copied. """
+    now = datetime.utcnow()
+    if is_archived(source):
+        rows = [{'user_id': user_id, 'log_date': target, 'meal_type': e.meal_type, 'created_at': now, **{c: getattr(e, c) for c in ENTRY_COLUMNS}}
+                for e in _archived_entries(user_id, source, meal_type)]
+        if rows: db.session.execute(MealLog.__table__.insert(), rows)
+        count = len(rows)
+    else:
+        select = (db.select(db.literal(user_id), db.literal(target), MealLog.meal_type, *[getattr(MealLog, c) for c in ENTRY_COLUMNS], db.literal(now))
+                  .where(*_day_filter(user_id, source, meal_type)).order_by(MealLog.created_at, MealLog.id))
+        count = db.session.execute(MealLog.__table__.insert().from_select(['user_id', 'log_date', 'meal_type', *ENTRY_COLUMNS, 'created_at'], select)).rowcount
+    db.session.commit()
+    if count: meal_logs_changed.send(db.session, dates={target}, days={(user_id, target)})
+    return count
+
+
+def _refresh_totals(connection, template_ids):
+    """ Sets total_* of the templates to the sums of their items' nutrients. """
+    templates, items = MealTemplate.__table__, MealTemplateItem.__table__
+    sums = {total: db.select(db.func.sum(items.c[name])).where(items.c.template_id == templates.c.id).scalar_subquery()
+            for total, name in zip(column_names(MealTemplate), column_names(MealTemplateItem))}
+    connection.execute(templates.update().where(templates.c.id.in_(template_ids)).values(sums))
+
+
+@event.listens_for(MealTemplateItem, 'after_delete')
+def _item_deleted(mapper, connection, target): _refresh_totals(connection, [target.template_id])
+
+
+def save_template(user_id, name, day, meal_type):
+    """ A new template holding `user_id`'s `meal_type` entries of `day`, or None (nothing saved) if that meal is empty. """
+    template = MealTemplate(user_id=user_id, name=name, meal_type=meal_type)
+    db.session.add(template); db.session.flush()
+    if is_archived(day):
+        rows = [{'template_id': template.id, **{c: getattr(e, c) for c in ENTRY_COLUMNS}} for e in _archived_entries(user_id, day, meal_type)]
+        if rows: db.session.execute(MealTemplateItem.__table__.insert(), rows)
+        count = len(rows)
+    else:
+        select = (db.select(db.literal(template.id), *[getattr(MealLog, c) for c in ENTRY_COLUMNS])
+                  .where(*_day_filter(user_id, day, meal_type)).order_by(MealLog.created_at, MealLog.id))
+        count = db.session.execute(MealTemplateItem.__table__.insert().from_select(['template_id', *ENTRY_COLUMNS], select)).rowcount
+    if not count: db.session.rollback(); return None
+    _refresh_totals(db.session.connection(), [template.id])
+    db.session.commit()
+    return template
+
+
+def apply_template(template, user_id, day, meal_type=None):
+    """ Logs every item of `template` on `day`, into `meal_type` or the template's own meal. Returns the entries added. """
+    now = datetime.utcnow()
+    select = (db.select(db.literal(user_id), db.literal(day), db.literal(meal_type or template.meal_type),
+                        *[getattr(MealTemplateItem, c) for c in ENTRY_COLUMNS], db.literal(now))
+              .where(MealTemplateItem.template_id == template.id).order_by(MealTemplateItem.id))
+    count = db.session.execute(MealLog.__table__.insert().from_select(['user_id', 'log_date', 'meal_type', *ENTRY_COLUMNS, 'created_at'], select)).rowcount
+    db.session.commit()
+    if count: meal_logs_changed.send(db.session, dates={day}, days={(user_id, day)})
+    return count
@@ -0,0 +1,160 @@
+""" Read-through cache of catalog rows: (model, id) -> CatalogRow, an immutable snapshot of name, unit,
+owner and nutrients.
+
+Logging a food or recipe, and recomputing a recipe from its ingredients, only
+needs those few columns of rows that rarely change. Lookups go through two
+layers: a memo in the SQLAlchemy session's `info` (the session is scoped to
+the request, so a request sees one version of a row throughout), then an LRU
+shared by the worker's threads (CATALOG_CACHE_SIZE rows). Only misses query,
+all of them in one statement per model.
+
+After a local commit, catalog_changed names the changed rows and they are
+dropped from both layers. Writes in other workers are caught by a version
+check: max(updated_at) of the three catalog tables (one statement, three index
+reads), compared with the value this worker last saw; a change empties the
+shared layer. A worker reads it at most once per CATALOG_VERSION_CHECK_S, on
+the first lookup of a request, so logging a known food costs no catalog query
+at all in most requests and one small one in the rest; writes elsewhere show
+after up to that long. Deleting a row leaves the
+maximum alone, and a write stamped by a clock behind the others may too; those
+are caught by age, since entries older than CATALOG_CACHE_TTL_S are reloaded.
+Rows the current session has changed but not committed always come from the
+database, so a recipe recomputed right after an ingredient edit sees the edit.
+"""
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+
+from flask import abort, current_app
+
+from .extensions import db
+from .models import Food, Ingredient, Recipe
+from .nutrients import NutrientVector, columns
+from .signals import CATALOG_MODELS, catalog_changed
+
+# model -> (owner, unit, base quantity) columns; Ingredient is always shared, a recipe is counted in servings
+_PORTION = {Food: lambda: (Food.owner_id, Food.base_unit, Food.base_quantity),
+            Ingredient: lambda: (db.null(), Ingredient.typical_unit, Ingredient.unit_quantity),
+            Recipe: lambda: (Recipe.owner_id, db.literal('serving'), db.literal(1.0))}
+
+
+class CatalogRow:
+    """ What logging and recipe math read from a Food, Ingredient or Recipe. `nutrients` is per `base_quantity`
+    `unit` and shared between threads: scale it (`portion`), never modify it in place. """
+    __slots__ = ('model', 'id', 'name', 'owner_id', 'unit', 'base_quantity', 'nutrients', 'loaded_at')
+
+    def __init__(self, model, row):
+        self.model, self.id, self.name, self.owner_id, self.unit, self.base_quantity = model, *row[:5]
+        self.nutrients = NutrientVector(row[5:])
+        self.loaded_at = time.monotonic()
+
+    def __repr__(self): return f'<CatalogRow {self.model.__name__} {self.id} {self.name!r}>'
+
+    def portion(self, quantity):
+        """ Nutrients of `quantity` units (servings for a recipe); empty if the row has no base quantity. """
+        if not self.base_quantity or quantity is None: return NutrientVector()
+        return self.nutrients.scaled(float(quantity) / float(self.base_quantity))
+
+
+class _LRU:
+    def __init__(self):
+        self._rows, self._lock = OrderedDict(), threading.Lock()
+
+    def get(self, key, max_age):
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None: return None
+            if time.monotonic() - row.loaded_at >= max_age: del self._rows[key]; return None
+            self._rows.move_to_end(key)
+            return row
+
+    def put(self, rows, size):
+        with self._lock:
+            for row in rows:
+                self._rows[(row.model.__name__, row.id)] = row
+                self._rows.move_to_end((row.model.__name__, row.id))
+            while len(self._rows) > size: self._rows.popitem(last=False)
+
+    def discard(self, keys):
+        with self._lock:
+            for key in keys: self._rows.pop(key, None)
+
+    def clear(self):
+        with self._lock: self._rows.clear()
+
+    def __len__(self): return len(self._rows)
+
+
+shared = _LRU()
+_version = {'seen': None, 'checked': float('-inf')}
+_version_lock = threading.Lock()
+
+
+def _uncommitted(session):
+    """ (model name, id) of catalog rows this session has changed, flushed or not, since its last commit. """
+    pending = {(type(obj).__name__, obj.id) for obj in chain(session.new, session.dirty, session.deleted) if isinstance(obj, CATALOG_MODELS)}
+    return pending | session.info.get('catalog_changed', set())
+
+
+def _check_version(session):
+    """ Once per session (request), and per worker at most every CATALOG_VERSION_CHECK_S: empties the shared layer if a
+    catalog row was written since this worker last looked. """
+    if session.info.get('catalog_version_checked'): return
+    session.info['catalog_version_checked'] = True
+    now = time.monotonic()
+    if now - _version['checked'] < current_app.config['CATALOG_VERSION_CHECK_S']: return
+    _version['checked'] = now # Before the query: concurrent requests of this worker skip it rather than repeat it
+    version = tuple(session.execute(db.select(*[db.select(db.func.max(model.updated_at)).scalar_subquery() for model in CATALOG_MODELS])).one())
+    with _version_lock:
+        if _version['seen'] != version: shared.clear(); _version['seen'] = version
+
+
+def get_many(model, ids):
+    """ {id: CatalogRow} for the rows of `model` among `ids` that exist. """
+    session, name = db.session(), model.__name__
+    _check_version(session)
+    memo, uncommitted = session.info.setdefault('catalog_rows', {}), _uncommitted(session)
+    config = current_app.config
+    found, missing = {}, []
+    for ident in ids:
+        key = (name, ident)
+        row = None if key in uncommitted else memo.get(key) or shared.get(key, config['CATALOG_CACHE_TTL_S'])
+        if row is None: missing.append(ident)
+        else: found[ident] = memo[key] = row
+    if missing:
+        query = db.session.query(model.id, model.name, *_PORTION[model](), *columns(model)).filter(model.id.in_(missing))
+        loaded = [CatalogRow(model, row) for row in query]
+        for row in loaded: found[row.id] = row
+        committed = [row for row in loaded if (name, row.id) not in uncommitted]
+        for row in committed: memo[(name, row.id)] = row
+        shared.put(committed, config['CATALOG_CACHE_SIZE'])
+    return found
+
+
+def get(model, ident):
+    """ The CatalogRow of `model` `ident`, or None if there is no such row. """
+    return get_many(model, (ident,)).get(ident)
+
+
+def get_visible(model, ident, user_id):
+    """ Like get(), but None for rows owned by someone other than `user_id`. """
+    row = get(model, ident)
+    return row if row is not None and row.owner_id in (None, user_id) else None
+
+
+def get_visible_or_404(model, ident, user_id):
+    row = get_visible(model, ident, user_id)
+    if row is None: abort(404)
+    return row
+
+
+def _invalidate(session, keys=None, **kwargs):
+    if keys is None: shared.clear(); session.info.pop('catalog_rows', None); return
+    shared.discard(keys)
+    memo = session.info.get('catalog_rows')
+    if memo:
+        for key in keys: memo.pop(key, None)
+
+
+catalog_changed.connect(_invalidate, weak=False)
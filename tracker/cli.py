@@ -0,0 +1,375 @@
+""" Flask CLI commands. """
+import json
+import os
+import subprocess
+import sys
+
+import click
+from flask import current_app
+
+from .config import basedir
+
+
+class LazyMigrateGroup(click.Group):
+    """ Stands in for Flask-Migrate's `flask db` group so Alembic is only
+    imported when a migration command actually runs, not on every app boot. """
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_cli_group
+        from .extensions import db
+        app = current_app._get_current_object()
+        if 'migrate' not in app.extensions: Migrate(app, db)
+        return db_cli_group.make_context(info_name, args, parent=parent, **extra)
+
+
+# Runs in a fresh interpreter so nothing is already in sys.modules.
+_STARTUP_PROBE = """
+import json, time
+t0 = time.perf_counter()
+from tracker import create_app
+t1 = time.perf_counter()
+app = create_app()
+client = app.test_client()
+status = client.get('/api/health').status_code
+t2 = time.perf_counter()
+import sys
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'cold_start_ms': (t2 - t0) * 1000, 'status': status,
+                  'eager': sorted(m for m in ('requests', 'wtforms', 'alembic', 'sqlalchemy.dialects.postgresql') if m in sys.modules)}))
+"""
+
+
+def measure_startup(runs=3):
+    """ The fastest of `runs` fresh-interpreter probes: {'import_ms', 'cold_start_ms', 'status', 'eager'}. """
+    samples = []
+    for _ in range(max(1, runs)):
+        out = subprocess.run([sys.executable, '-c', _STARTUP_PROBE], cwd=basedir, capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return min(samples, key=lambda s: s['cold_start_ms'])
+
+
+def startup_failures(sample, config):
+    """ What in a measure_startup() sample breaks the STARTUP_* budgets; empty when it is within them. """
+    failures = []
+    if sample['status'] != 200: failures.append(f"health check returned {sample['status']}")
+    if sample['import_ms'] > config['STARTUP_IMPORT_BUDGET_MS']: failures.append('import budget exceeded')
+    if sample['cold_start_ms'] > config['STARTUP_COLD_START_BUDGET_MS']: failures.append('cold start budget exceeded')
+    if sample['eager']: failures.append(f"imported eagerly: {', '.join(sample['eager'])}")
+    return failures
+
+
+@click.command('check-startup')
+@click.option('--runs', default=3, show_default=True, help='Fresh interpreters to sample; the fastest run is compared.')
+def check_startup_command(runs):
+    """ Measure package import time and cold start (factory + first request) against the configured budgets. """
+    best, config = measure_startup(runs), current_app.config
+    click.echo(f"import:     {best['import_ms']:8.1f} ms (budget {config['STARTUP_IMPORT_BUDGET_MS']:.0f} ms)")
+    click.echo(f"cold start: {best['cold_start_ms']:8.1f} ms (budget {config['STARTUP_COLD_START_BUDGET_MS']:.0f} ms)")
+    failures = startup_failures(best, config)
+    if failures: raise click.ClickException('; '.join(failures))
+    click.echo('Startup within budget.')
+
+
+@click.command('recalc-logs')
+@click.option('--start', 'start_date', type=click.DateTime(formats=['%Y-%m-%d']), help='First log date to rewrite (inclusive).')
+@click.option('--end', 'end_date', type=click.DateTime(formats=['%Y-%m-%d']), help='Last log date to rewrite (inclusive).')
+@click.option('--food-id', 'food_ids', type=int, multiple=True, help='Only entries of this food (repeatable).')
+@click.option('--recipe-id', 'recipe_ids', type=int, multiple=True, help='Only entries of this recipe (repeatable).')
+@click.option('--chunk-size', default=5000, show_default=True, help='Rows per UPDATE/commit.')
+@click.option('--resume', 'resume_id', type=int, help='Continue an interrupted job from where it stopped.')
+def recalc_logs_command(start_date, end_date, food_ids, recipe_ids, chunk_size, resume_id):
+    """ Recompute MealLog nutrients from the current foods and recipe totals. """
+    from .extensions import db
+    from .models import RecalcJob
+    from .recalc import create_job, describe, run_job
+    if resume_id:
+        job = db.session.get(RecalcJob, resume_id)
+        if job is None: raise click.ClickException(f'No recalc job {resume_id}.')
+        if job.status == 'done': click.echo(describe(job)); return
+    else:
+        by_id = bool(food_ids or recipe_ids) # With ids given, an empty list excludes that kind of entry
+        job = create_job(start_date.date() if start_date else None, end_date.date() if end_date else None,
+                         list(food_ids) if by_id else None, list(recipe_ids) if by_id else None, chunk_size)
+        click.echo(f'Started recalc job {job.id} (resume with --resume {job.id}).')
+    try: run_job(job, progress=lambda j: click.echo(describe(j)))
+    except Exception as e: raise click.ClickException(f'{describe(job)}: {e}')
+    click.echo(describe(job))
+
+
+@click.command('bench-nutrition')
+@click.option('--entries', default=2000, show_default=True, help='Foods/recipes/lines/logs per case.')
+@click.option('--repeat', default=5, show_default=True, help='Timing runs per case; the fastest is reported.')
+def bench_nutrition_command(entries, repeat):
+    """ Micro-benchmark the per-entry cost of the nutrition hot paths (legacy dicts vs NutrientVector). """
+    from . import benchmarks
+    click.echo(f"{'case':<24}{'legacy us':>11}{'vector us':>11}{'speedup':>9}")
+    for name, legacy, vector in benchmarks.run(entries, repeat):
+        click.echo(f'{name:<24}{legacy:>11.2f}{vector:>11.2f}{legacy / vector:>8.1f}x')
+
+
+@click.command('create-user')
+@click.argument('username')
+@click.option('--admin', is_flag=True, help='May create and edit the shared catalog.')
+@click.password_option()
+def create_user_command(username, admin, password):
+    """ Create a login account. """
+    from .extensions import db
+    from .models import User
+    if User.query.filter(db.func.lower(User.username) == username.lower()).first(): raise click.ClickException(f'User "{username}" exists.')
+    user = User(username=username, is_admin=admin); user.set_password(password)
+    db.session.add(user); db.session.commit()
+    click.echo(f'Created user {user.id} "{user.username}"{" (admin)" if admin else ""}.')
+
+
+@click.command('set-password')
+@click.argument('username')
+@click.password_option()
+def set_password_command(username, password):
+    """ Set a user's password, e.g. for the "default" user that owns pre-account data. """
+    from .extensions import db
+    from .models import User
+    user = User.query.filter_by(username=username).first()
+    if user is None: raise click.ClickException(f'No user "{username}".')
+    user.set_password(password); db.session.commit()
+    click.echo(f'Password updated for "{user.username}".')
+
+
+@click.command('archive-logs')
+@click.option('--before', 'cutoff', required=True, type=click.DateTime(formats=['%Y-%m-%d']), help='Archive every whole month that ends before this date.')
+def archive_logs_command(cutoff):
+    """ Move old meal logs out of the database into monthly column files under LOG_ARCHIVE_DIR. """
+    from .log_archive import archive_before
+    moved = archive_before(cutoff.date(), progress=lambda month, rows: click.echo(f'{month}: {rows} rows archived'))
+    click.echo(f"Archived {sum(moved.values())} rows from {len(moved)} months to {current_app.config['LOG_ARCHIVE_DIR']}.")
+
+
+@click.command('ensure-partitions')
+@click.option('--months-ahead', default=3, show_default=True, help='Future months to create besides the current one.')
+def ensure_partitions_command(months_ahead):
+    """ Create upcoming monthly meal_logs partitions (PostgreSQL; no-op elsewhere). Run from cron. """
+    from .partitions import ensure_partitions, is_partitioned
+    if not is_partitioned(): click.echo('meal_logs is not partitioned on this database; nothing to do.'); return
+    created = ensure_partitions(months_ahead)
+    click.echo(f"Created {', '.join(created)}." if created else 'All partitions exist.')
+
+
+@click.command('load-nutrition-db')
+@click.argument('path', type=click.Path(exists=True))
+@click.option('--data-type', 'data_types', multiple=True, help='FDC data_type to load (repeatable); default: foundation, SR legacy and survey foods.')
+@click.option('--all-types', is_flag=True, help='Load every data type, including the multi-million-row branded foods.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per INSERT/UPDATE and commit.')
+def load_nutrition_db_command(path, data_types, all_types, batch_size):
+    """ Load a USDA FoodData Central CSV download (directory or .zip) as the offline ingredient lookup. """
+    from .reference_foods import DEFAULT_DATA_TYPES, load_fdc
+    types = None if all_types else (data_types or DEFAULT_DATA_TYPES)
+    try: foods, values = load_fdc(path, types, batch_size, progress=lambda stage, n: click.echo(f'{stage}: {n}'))
+    except (FileNotFoundError, ValueError) as e: raise click.ClickException(str(e))
+    click.echo(f'Loaded {foods} foods with {values} nutrient values.')
+
+
+@click.command('dedupe-catalog')
+@click.option('--kind', type=click.Choice(['food', 'ingredient', 'all']), default='all', show_default=True)
+@click.option('--threshold', default=0.6, show_default=True, help='Minimum name similarity (trigram Jaccard) to merge.')
+@click.option('--dry-run', is_flag=True, help='List the clusters without merging.')
+@click.option('--reindex', is_flag=True, help='Rebuild the save-time name index first (after bulk imports).')
+def dedupe_catalog_command(kind, threshold, dry_run, reindex):
+    """ Cluster near-duplicate foods/ingredients and merge each cluster into its most used row. """
+    from .dedupe import find_clusters, merge
+    from .extensions import db
+    from .name_index import KINDS, rebuild
+    for k in (['food', 'ingredient'] if kind == 'all' else [kind]):
+        model = KINDS[k]
+        if reindex: click.echo(f'{k}: {rebuild(k)} name buckets indexed')
+        clusters = find_clusters(k, threshold)
+        names = dict(db.session.query(model.id, model.name).filter(model.id.in_([i for keep, dups in clusters for i in (keep, *dups)]))) if clusters else {}
+        for keeper, duplicates in clusters:
+            click.echo(f'{k} "{names[keeper]}" <- ' + ', '.join(f'"{names[i]}"' for i in duplicates))
+        if dry_run or not clusters: click.echo(f'{k}: {len(clusters)} clusters' + (' (dry run)' if dry_run else '')); continue
+        deleted, repointed = merge(k, clusters)
+        click.echo(f'{k}: merged {deleted} duplicates in {len(clusters)} clusters, {repointed} references repointed')
+
+
+
+@click.command('trace-collector')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', default=4318, show_default=True, help='The OTLP/HTTP port; point TRACE_OTLP_ENDPOINT here.')
+@click.option('--out', 'out_path', default='traces.jsonl', show_default=True, type=click.Path(dir_okay=False), help='File to append export requests to.')
+def trace_collector_command(host, port, out_path):
+    """ Run a local stand-in for an OpenTelemetry collector (OTLP/HTTP JSON traces to a file). """
+    from .telemetry import serve_collector
+    serve_collector(host, port, out_path, echo=click.echo)
+
+
+
+@click.command('compress-static')
+@click.option('--min-size', default=500, show_default=True, help='Smaller files are served as they are.')
+def compress_static_command(min_size):
+    """ Write precompressed .gz (and .br, with brotli installed) variants of the static text assets. Run at build time. """
+    from .compression import compress_static
+    folder = current_app.static_folder
+    if not folder or not os.path.isdir(folder): click.echo(f'No static folder at {folder}; nothing to do.'); return
+    click.echo(f'{compress_static(folder, min_size, echo=click.echo)} files written.')
+
+
+@click.command('bench-compression')
+@click.option('--user', 'username', required=True, help='Render the pages as this user.')
+@click.option('--path', 'paths', multiple=True, help='Route to measure (repeatable); default: the large log and catalog pages.')
+@click.option('--level', type=int, help='gzip level; default COMPRESS_LEVEL.')
+@click.option('--brotli-level', type=int, help='brotli quality; default COMPRESS_BROTLI_LEVEL.')
+@click.option('--repeat', default=5, show_default=True, help='Timing runs per case; the fastest is reported.')
+def bench_compression_command(username, paths, level, brotli_level, repeat):
+    """ Bytes saved vs CPU spent compressing, per route. """
+    from datetime import date, timedelta
+    from . import benchmarks
+    from .models import User
+    user = User.query.filter_by(username=username).first()
+    if user is None: raise click.ClickException(f'No user "{username}".')
+    config = current_app.config
+    paths = paths or ('/log', '/ingredients', '/database', f'/api/history?start={(date.today() - timedelta(days=89)).isoformat()}')
+    click.echo(f"{'route':<40}{'raw B':>9}{'render ms':>11}  {'coding':<8}{'bytes':>8}{'saved':>8}{'cpu ms':>8}{'cpu/render':>11}")
+    for path, raw, render_ms, rows in benchmarks.compression(current_app._get_current_object(), user.id, paths, level or config['COMPRESS_LEVEL'],
+                                                             config['COMPRESS_BROTLI_LEVEL'] if brotli_level is None else brotli_level, repeat):
+        for i, (coding, lvl, size, cpu_ms) in enumerate(rows):
+            head = f'{path[:39]:<40}{raw:>9}{render_ms:>11.2f}' if i == 0 else ' ' * 60
+            click.echo(f'{head}  {f"{coding}-{lvl}":<8}{size:>8}{1 - size / raw if raw else 0:>8.0%}{cpu_ms:>8.2f}{cpu_ms / render_ms:>11.1%}')
+
+
+
+@click.command('bench-similarity')
+@click.option('--items', default=100000, show_default=True, help='Synthetic catalog size.')
+@click.option('--queries', default=200, show_default=True)
+@click.option('-k', default=10, show_default=True, help='Neighbours per query.')
+def bench_similarity_command(items, queries, k):
+    """ Time the substitution index (KD-tree build, incremental update, top-k queries) against a full scan. """
+    from . import benchmarks
+    click.echo(f"{'case':<46}{'p50 ms':>9}{'p95 ms':>9}")
+    for name, p50, p95 in benchmarks.similarity(items, queries, k): click.echo(f'{name:<46}{p50:>9.2f}{p95:>9.2f}')
+
+
+
+@click.command('stress-recipe-edits')
+@click.option('--threads', default=8, show_default=True)
+@click.option('--operations', default=50, show_default=True, help='Edits per thread.')
+@click.option('--ingredients', default=10, show_default=True, help='Scratch ingredients the threads add and remove.')
+@click.option('--database-url', default=None, help='Scratch database to run against (e.g. PostgreSQL); default a temporary SQLite file.')
+def stress_recipe_edits_command(threads, operations, ingredients, database_url):
+    """ Concurrency check: many threads add/remove lines of one scratch recipe; its totals must stay exact. """
+    from . import benchmarks
+    outcomes, problems = benchmarks.recipe_edit_stress(current_app._get_current_object(), threads, operations, ingredients, database_url=database_url)
+    for name, count in sorted(outcomes.items()): click.echo(f'{name:<24}{count:>8}')
+    if problems: raise click.ClickException('Totals drifted:\n' + '\n'.join(problems))
+    click.echo('Totals exact; one line per ingredient.')
+
+
+@click.command('bench-concurrency')
+@click.option('--worker-class', 'worker_classes', multiple=True, help='gunicorn worker class to compare (repeatable); default sync and gthread.')
+@click.option('--workers', default=2, show_default=True)
+@click.option('--threads', default=8, show_default=True, help='Threads per worker for threaded worker classes.')
+@click.option('--concurrency', default=64, show_default=True, help='Client threads sending requests at once.')
+@click.option('--requests', 'requests_per_run', default=400, show_default=True, help='Requests per worker class.')
+@click.option('--latency-ms', default=200, show_default=True, help='Delay the Nutritionix stub adds to every call.')
+@click.option('--path', default='/api/lookup?q=bench food {i}', show_default=True, help='Route to load; {i} is the request number.')
+def bench_concurrency_command(worker_classes, workers, threads, concurrency, requests_per_run, latency_ms, path):
+    """ Throughput of I/O-bound API routes under gunicorn per worker class, against a local Nutritionix stub with latency. """
+    from . import benchmarks
+    results = benchmarks.concurrency(current_app._get_current_object(), worker_classes or ('sync', 'gthread'), workers, threads, concurrency,
+                                     requests_per_run, latency_ms, path)
+    click.echo(f"{'worker class':<14}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'seconds':>9}{'upstream conns':>16}  statuses")
+    for worker_class, statuses, elapsed, rate, p50, p95, upstream in results:
+        click.echo(f"{worker_class:<14}{rate:>8.1f}{p50:>9.0f}{p95:>9.0f}{elapsed:>9.1f}{upstream:>16}  {dict(statuses)}")
+
+
+@click.command('quota-status')
+def quota_status_command():
+    """ Shows the Nutritionix budget shared by the workers: tokens left, limits and call counters. """
+    from .quota import status
+    info = status()
+    click.echo(f"Backend: {info['backend']} (batch lookups leave {info['interactive_reserve']:.0%} to interactive ones)")
+    for name, limit in info['limits'].items(): click.echo(f"{name:<8}{info['tokens'][name]:>10.1f} of {limit} tokens")
+    for name, value in info['counters'].items(): click.echo(f'{name:<24}{value:>8}')
+
+
+
+@click.command('warm-up')
+def warm_up_command():
+    """ Runs the pre-serving warm-up (mappers, templates, deferred imports, catalog cache) and shows what each step took. """
+    from .warmup import warm_up
+    state = warm_up(current_app._get_current_object())
+    for name, step in state['steps'].items():
+        click.echo(f"{name:<12}{step['ms']:>9.1f} ms  " + (f"error: {step['error']}" if 'error' in step else f"{step['count']} loaded"))
+    click.echo(f"{'total':<12}{state['ms']:>9.1f} ms")
+
+
+
+@click.command('run-jobs')
+@click.option('--loop', is_flag=True, help='Keep polling (SCHEDULER_POLL_S) instead of running due jobs once.')
+def run_jobs_command(loop):
+    """ Runs the scheduled jobs that are due and no other worker holds, then lists every job's state. """
+    from . import scheduler
+    app = current_app._get_current_object()
+    if loop: scheduler.run_forever(app)
+    for name, status in scheduler.run_due(app).items(): click.echo(f'{name}: {status}')
+    for job in scheduler.jobs():
+        click.echo(f'{job.name:<20} next {job.next_run_at:%Y-%m-%d %H:%M}  last {job.last_status or "-"}: {job.last_result or ""}')
+
+
+@click.command('digests')
+@click.option('--week', 'week', default=None, help='Any day of the week (YYYY-MM-DD); default the last complete week.')
+@click.option('--user', 'usernames', multiple=True, help='Only these users (repeatable).')
+@click.option('--force', is_flag=True, help='Rewrite digests that already exist.')
+def digests_command(week, usernames, force):
+    """ Writes weekly digests now instead of waiting for the scheduler. """
+    from datetime import date
+    from . import digests
+    from .models import User
+    start = digests.week_start(date.fromisoformat(week)) if week else digests.last_complete_week()
+    user_ids = [user.id for user in User.query.filter(User.username.in_(usernames))] if usernames else None
+    click.echo(f'{digests.generate(start, user_ids, force)} digests written for the week of {start.isoformat()}.')
+
+
+@click.command('rebuild-adherence')
+@click.option('--user', 'usernames', multiple=True, help='Only these users (repeatable); default everyone.')
+def rebuild_adherence_command(usernames):
+    """ Recomputes goal-adherence days and streaks from the meal log (to repair them). """
+    from . import adherence
+    from .extensions import db
+    from .models import User
+    users = User.query.filter(User.username.in_(usernames)) if usernames else User.query
+    for user_id, username in users.with_entities(User.id, User.username).order_by(User.id).all():
+        days = adherence.rebuild(db.session.connection(), user_id); db.session.commit()
+        click.echo(f'{username}: {days} days')
+
+
+@click.command('rebuild-sync')
+def rebuild_sync_command():
+    """ Records every food, ingredient, recipe and meal log in the /api/sync change feed (to repair it).
+    Clients get every row again on their next sync; deletions already recorded are kept. """
+    from . import sync
+    from .extensions import db
+    counts = sync.rebuild(db.session.connection()); db.session.commit()
+    click.echo(', '.join(f'{count} {kind}' for kind, count in counts.items()))
+
+
+def register_cli(app):
+    app.cli.add_command(LazyMigrateGroup('db', help='Perform database migrations (Flask-Migrate).'))
+    app.cli.add_command(check_startup_command)
+    app.cli.add_command(recalc_logs_command)
+    app.cli.add_command(bench_nutrition_command)
+    app.cli.add_command(create_user_command)
+    app.cli.add_command(set_password_command)
+    app.cli.add_command(archive_logs_command)
+    app.cli.add_command(ensure_partitions_command)
+    app.cli.add_command(load_nutrition_db_command)
+    app.cli.add_command(dedupe_catalog_command)
+    app.cli.add_command(trace_collector_command)
+    app.cli.add_command(compress_static_command)
+    app.cli.add_command(bench_compression_command)
+    app.cli.add_command(bench_similarity_command)
+    app.cli.add_command(stress_recipe_edits_command)
+    app.cli.add_command(bench_concurrency_command)
+    app.cli.add_command(quota_status_command)
+    app.cli.add_command(warm_up_command)
+    app.cli.add_command(run_jobs_command)
+    app.cli.add_command(digests_command)
+    app.cli.add_command(rebuild_adherence_command)
+    app.cli.add_command(rebuild_sync_command)
@@ -0,0 +1,201 @@
+""" Response compression: gzip (and brotli when the `brotli` package is installed) for HTML, JSON and text.
+
+`CompressionMiddleware` wraps the WSGI app. It compresses a response when the
+client accepts an encoding, the media type is in COMPRESS_MIMETYPES and the
+body reaches COMPRESS_MIN_SIZE bytes. When there is no Content-Length
+(streamed responses) it buffers only up to that size, then compresses chunk by
+chunk and flushes after each one, so streams stay streams. Responses that
+already carry a Content-Encoding, partial content and `no-transform` pass
+through untouched.
+
+Static files are compressed ahead of time: `flask compress-static` writes
+`.gz` (and `.br`) files next to each text asset, and the static view serves
+the best variant the client accepts. Static URLs built with `static_url()`
+carry a version parameter; only those responses are cached for a year
+(STATIC_MAX_AGE) and marked immutable.
+"""
+import gzip
+import mimetypes
+import os
+import zlib
+
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+DEFAULT_MIMETYPES = ('text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript', 'application/javascript',
+                     'application/json', 'application/xml', 'image/svg+xml')
+STATIC_SUFFIXES = ('.css', '.js', '.mjs', '.json', '.svg', '.html', '.txt', '.xml', '.map', '.csv')
+
+
+def _brotli():
+    try: import brotli
+    except ImportError: return None
+    return brotli
+
+
+def accepted_encodings(header):
+    """ {coding: q} from an Accept-Encoding header; codings with q=0 are left out. """
+    accepted = {}
+    for part in (header or '').lower().split(','):
+        coding, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try: q = float(params.strip()[2:])
+            except ValueError: q = 0.0
+        if coding and q > 0: accepted[coding] = q
+    return accepted
+
+
+class _Gzip:
+    def __init__(self, level): self._z = zlib.compressobj(level, zlib.DEFLATED, 31) # 31: gzip container
+    def compress(self, data): return self._z.compress(data)
+    def flush(self): return self._z.flush(zlib.Z_SYNC_FLUSH)
+    def finish(self): return self._z.flush()
+
+
+class _Brotli:
+    def __init__(self, brotli, quality): self._c = brotli.Compressor(quality=quality)
+    def compress(self, data): return self._c.process(data)
+    def flush(self): return self._c.flush()
+    def finish(self): return self._c.finish()
+
+
+def compress(data, coding, level):
+    """ One-shot compression of `data`, as the middleware would produce it for a buffered response. """
+    compressor = _Brotli(_brotli(), level) if coding == 'br' else _Gzip(level)
+    return compressor.compress(data) + compressor.finish()
+
+
+class CompressionMiddleware:
+    """ WSGI middleware; see the module docstring. """
+
+    def __init__(self, wsgi_app, level=6, brotli_level=4, min_size=500, mimetypes=DEFAULT_MIMETYPES):
+        self.wsgi_app, self.level, self.brotli_level, self.min_size = wsgi_app, level, brotli_level, min_size
+        self.mimetypes, self.brotli = frozenset(mimetypes), _brotli()
+
+    def _coding(self, environ):
+        accepted = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING'))
+        if self.brotli is not None and 'br' in accepted: return 'br'
+        return 'gzip' if 'gzip' in accepted or '*' in accepted else None
+
+    def __call__(self, environ, start_response):
+        coding = self._coding(environ)
+        if coding is None or environ.get('REQUEST_METHOD') == 'HEAD': return self.wsgi_app(environ, start_response)
+        started = {}
+        def capture(status, headers, exc_info=None):
+            started.update(status=status, headers=headers, exc_info=exc_info)
+            return lambda data: started.setdefault('written', []).append(data) # Legacy write(); sent ahead of the body
+        app_iter = self.wsgi_app(environ, capture)
+        return self._respond(app_iter, coding, started, start_response)
+
+    def _compressible(self, status, headers):
+        get = {k.lower(): v for k, v in headers}.get
+        if not status.startswith('200') or get('content-encoding') or get('content-range'): return False
+        if 'no-transform' in (get('cache-control') or ''): return False
+        if (get('content-type') or '').split(';')[0].strip().lower() not in self.mimetypes: return False
+        length = get('content-length')
+        return length is None or int(length) >= self.min_size
+
+    def _respond(self, app_iter, coding, started, start_response):
+        chunks = iter(app_iter)
+        try:
+            buffered = list(started.get('written', []))
+            if 'status' not in started: buffered += [next(chunks, b'')] # start_response may wait for the first chunk
+            status, headers = started['status'], started['headers']
+            compressing = self._compressible(status, headers)
+            streaming = compressing and not any(k.lower() == 'content-length' for k, _ in headers)
+            while streaming and sum(map(len, buffered)) < self.min_size: # Unknown length: look at enough of it to decide
+                chunk = next(chunks, None)
+                if chunk is None: compressing = False; break
+                buffered.append(chunk)
+        except BaseException:
+            if hasattr(app_iter, 'close'): app_iter.close()
+            raise
+        if not compressing:
+            start_response(status, headers, started['exc_info'])
+            return self._passthrough(buffered, chunks, app_iter)
+        headers = [(k, v) for k, v in headers if k.lower() not in ('content-length', 'vary')] + [('Content-Encoding', coding)]
+        vary = [v for k, v in started['headers'] if k.lower() == 'vary']
+        headers.append(('Vary', ', '.join(vary + ['Accept-Encoding'])))
+        headers = [(k, 'W/' + v if k.lower() == 'etag' and not v.startswith('W/') else v) for k, v in headers] # Same content, other bytes
+        start_response(status, headers, started['exc_info'])
+        compressor = _Brotli(self.brotli, self.brotli_level) if coding == 'br' else _Gzip(self.level)
+        return self._compressed(compressor, buffered, chunks, app_iter, streaming)
+
+    @staticmethod
+    def _passthrough(buffered, chunks, app_iter):
+        try:
+            yield from buffered
+            yield from chunks
+        finally:
+            if hasattr(app_iter, 'close'): app_iter.close()
+
+    @staticmethod
+    def _compressed(compressor, buffered, chunks, app_iter, streaming):
+        try:
+            yield compressor.compress(b''.join(buffered)) + (compressor.flush() if streaming else b'')
+            for chunk in chunks:
+                out = compressor.compress(chunk) + (compressor.flush() if streaming else b'')
+                if out: yield out
+            yield compressor.finish()
+        finally:
+            if hasattr(app_iter, 'close'): app_iter.close()
+
+
+# --- Static files --------------------------------------------------------------------
+
+def static_url(filename):
+    """ url_for('static') plus the file's mtime as `v`, so a changed file gets a new URL and old ones can be cached forever. """
+    try: version = f'{int(os.stat(os.path.join(current_app.static_folder, filename)).st_mtime):x}'
+    except (OSError, TypeError): version = None
+    return url_for('static', filename=filename, v=version)
+
+
+def _send_static(filename):
+    """ The static view: the best precompressed variant the client accepts, else the file itself. """
+    versioned = 'v' in request.args # Only versioned URLs may be cached for long; others revalidate
+    folder, max_age = current_app.static_folder, current_app.config['STATIC_MAX_AGE'] if versioned else None
+    accepted = accepted_encodings(request.headers.get('Accept-Encoding'))
+    source = safe_join(folder, filename)
+    response = None
+    if source is not None and os.path.isfile(source):
+        for coding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            variant = source + suffix
+            if coding in accepted and os.path.isfile(variant) and os.stat(variant).st_mtime >= os.stat(source).st_mtime:
+                response = send_from_directory(folder, filename + suffix, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream', max_age=max_age)
+                response.headers['Content-Encoding'] = coding
+                break
+    if response is None: response = send_from_directory(folder, filename, max_age=max_age)
+    response.vary.add('Accept-Encoding')
+    if versioned: response.cache_control.public = True; response.cache_control.immutable = True
+    return response
+
+
+def compress_static(folder, min_size=500, echo=print):
+    """ Writes `.gz` (level 9) and, with brotli installed, `.br` (quality 11) next to every text asset under `folder`
+    that is at least `min_size` bytes and changed since its variants were written. Returns the files written. """
+    brotli, written = _brotli(), 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            if not name.endswith(STATIC_SUFFIXES) or os.path.getsize(path) < min_size: continue
+            mtime = os.stat(path).st_mtime
+            with open(path, 'rb') as f: data = f.read()
+            targets = [('.gz', lambda d: gzip.compress(d, 9, mtime=0))] + ([('.br', lambda d: brotli.compress(d, quality=11))] if brotli else [])
+            for suffix, encode in targets:
+                if os.path.exists(path + suffix) and os.stat(path + suffix).st_mtime >= mtime: continue
+                out = encode(data)
+                if len(out) >= len(data): continue # Not worth serving
+                with open(path + suffix, 'wb') as f: f.write(out)
+                written += 1
+                echo(f'{os.path.relpath(path + suffix, folder)}: {len(data)} -> {len(out)} bytes')
+    return written
+
+
+def init_app(app):
+    config = app.config
+    if config['COMPRESSION']:
+        app.wsgi_app = CompressionMiddleware(app.wsgi_app, config['COMPRESS_LEVEL'], config['COMPRESS_BROTLI_LEVEL'],
+                                             config['COMPRESS_MIN_SIZE'], config['COMPRESS_MIMETYPES'] or DEFAULT_MIMETYPES)
+    if app.has_static_folder and 'static' in app.view_functions: app.view_functions['static'] = _send_static
+    app.jinja_env.globals['static_url'] = static_url
@@ -0,0 +1,83 @@
+""" Default configuration, read from the environment when create_app() runs. """
+import os
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def database_url():
+    url = os.environ.get('DATABASE_URL')
+    if url and url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url or 'sqlite:///' + os.path.join(basedir, 'local_tracker.db')
+
+
+def default_config():
+    return {
+        'SECRET_KEY': os.environ.get('SECRET_KEY', 'local-insecure-fallback-key'),
+        'SQLALCHEMY_DATABASE_URI': database_url(),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        # --- Accounts: let visitors create their own account at /register ---
+        'ALLOW_REGISTRATION': os.environ.get('ALLOW_REGISTRATION', 'true').lower() in ('1', 'true', 'yes'),
+        # --- Nutritionix API Configuration ---
+        'NUTRITIONIX_APP_ID': os.environ.get('NUTRITIONIX_APP_ID'),
+        'NUTRITIONIX_API_KEY': os.environ.get('NUTRITIONIX_API_KEY'),
+        'NUTRITIONIX_API_URL': os.environ.get('NUTRITIONIX_API_URL', 'https://trackapi.nutritionix.com/v2/natural/nutrients'),
+        'NUTRITIONIX_POOL_SIZE': int(os.environ.get('NUTRITIONIX_POOL_SIZE', 16)), # Kept-alive connections per process; at least the gunicorn threads
+        # --- Nutritionix budget shared by all workers (see tracker.quota): calls per minute / day of the API plan ---
+        'NUTRITIONIX_PER_MINUTE': int(os.environ.get('NUTRITIONIX_PER_MINUTE', 30)),
+        'NUTRITIONIX_PER_DAY': int(os.environ.get('NUTRITIONIX_PER_DAY', 200)),
+        'QUOTA_PATH': os.environ.get('QUOTA_PATH', os.path.join(basedir, 'nutritionix_quota.db')),
+        'QUOTA_REDIS_URL': os.environ.get('QUOTA_REDIS_URL'), # e.g. redis://localhost:6379/0; needs the redis package
+        'QUOTA_INTERACTIVE_RESERVE': float(os.environ.get('QUOTA_INTERACTIVE_RESERVE', 0.25)), # Share of each bucket batch lookups leave alone
+        'QUOTA_INTERACTIVE_WAIT_S': float(os.environ.get('QUOTA_INTERACTIVE_WAIT_S', 3)),
+        'QUOTA_BATCH_WAIT_S': float(os.environ.get('QUOTA_BATCH_WAIT_S', 120)),
+        'QUOTA_CACHE_TTL_S': float(os.environ.get('QUOTA_CACHE_TTL_S', 30 * 24 * 3600)), # Lookup results are reused this long
+        # --- Recommender: rebuild the in-memory nutrient matrix at least this often (seconds) ---
+        'RECOMMENDER_MAX_AGE_S': float(os.environ.get('RECOMMENDER_MAX_AGE_S', 300)),
+        'SIMILARITY_MAX_AGE_S': float(os.environ.get('SIMILARITY_MAX_AGE_S', 300)), # Full rebuild of the substitution index
+        # --- Catalog row cache (see tracker.catalog_cache): rows per worker, and how long before a row is re-read ---
+        'CATALOG_CACHE_SIZE': int(os.environ.get('CATALOG_CACHE_SIZE', 20000)),
+        'CATALOG_CACHE_TTL_S': float(os.environ.get('CATALOG_CACHE_TTL_S', 60)), # Bounds what the version check misses (deletions)
+        'CATALOG_VERSION_CHECK_S': float(os.environ.get('CATALOG_VERSION_CHECK_S', 2)), # Per worker; how late other workers' writes show
+        # --- Rewrite past MealLog nutrients right after a food/recipe edit (see tracker.recalc) ---
+        'RECALC_LOGS_ON_EDIT': os.environ.get('RECALC_LOGS_ON_EDIT', '').lower() in ('1', 'true', 'yes'),
+        'RECALC_CHUNK_SIZE': int(os.environ.get('RECALC_CHUNK_SIZE', 5000)),
+        # --- Monthly meal log archives written by `flask archive-logs` (see tracker.log_archive) ---
+        'LOG_ARCHIVE_DIR': os.environ.get('LOG_ARCHIVE_DIR', os.path.join(basedir, 'log_archive')),
+        # --- Logging and tracing (see tracker.telemetry); LOG_LEVEL=OFF and TRACING=off turn each off entirely ---
+        'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'INFO'),
+        'LOG_FORMAT': os.environ.get('LOG_FORMAT', 'json'), # json | text
+        'LOG_SAMPLE_RATE': float(os.environ.get('LOG_SAMPLE_RATE', 1.0)), # Share of traces whose DEBUG/INFO records are kept
+        'TRACING': os.environ.get('TRACING', 'off'), # off | file | otlp
+        'TRACE_SAMPLE_RATE': float(os.environ.get('TRACE_SAMPLE_RATE', 1.0)),
+        'TRACE_FILE': os.environ.get('TRACE_FILE', os.path.join(basedir, 'traces.jsonl')),
+        'TRACE_OTLP_ENDPOINT': os.environ.get('TRACE_OTLP_ENDPOINT', 'http://127.0.0.1:4318/v1/traces'),
+        'TRACE_SERVICE_NAME': os.environ.get('TRACE_SERVICE_NAME', 'tracker'),
+        # --- Response compression (see tracker.compression); brotli is used when the package is installed ---
+        'COMPRESSION': os.environ.get('COMPRESSION', 'true').lower() in ('1', 'true', 'yes'),
+        'COMPRESS_LEVEL': int(os.environ.get('COMPRESS_LEVEL', 6)), # gzip 1-9
+        'COMPRESS_BROTLI_LEVEL': int(os.environ.get('COMPRESS_BROTLI_LEVEL', 4)), # brotli 0-11; dynamic pages want a cheap level
+        'COMPRESS_MIN_SIZE': int(os.environ.get('COMPRESS_MIN_SIZE', 500)), # bytes; smaller bodies go out as they are
+        'COMPRESS_MIMETYPES': None, # None = tracker.compression.DEFAULT_MIMETYPES (HTML, JSON, CSV, CSS, JS, SVG)
+        'STATIC_MAX_AGE': int(os.environ.get('STATIC_MAX_AGE', 365 * 24 * 3600)), # seconds, for versioned static URLs
+        # --- Warm-up before serving (see tracker.warmup): catalog rows logged most over these days are preloaded ---
+        'WARMUP_LOG_DAYS': int(os.environ.get('WARMUP_LOG_DAYS', 14)),
+        'WARMUP_CATALOG_ROWS': int(os.environ.get('WARMUP_CATALOG_ROWS', 5000)), # Per kind, capped by CATALOG_CACHE_SIZE
+        # --- Background jobs (see tracker.scheduler): each gunicorn worker polls for due jobs; one worker runs each ---
+        'SCHEDULER': os.environ.get('SCHEDULER', 'true').lower() in ('1', 'true', 'yes'),
+        'SCHEDULER_POLL_S': float(os.environ.get('SCHEDULER_POLL_S', 60)),
+        'SCHEDULER_LEASE_S': float(os.environ.get('SCHEDULER_LEASE_S', 1800)), # A claimed run is given up after this long
+        # --- Weekly digests (see tracker.digests) ---
+        'DIGEST_INTERVAL_S': float(os.environ.get('DIGEST_INTERVAL_S', 3600)), # How often missing digests are looked for
+        'DIGEST_BATCH_SIZE': int(os.environ.get('DIGEST_BATCH_SIZE', 5000)), # meal_logs rows per read
+        'DIGEST_USERS_PER_BATCH': int(os.environ.get('DIGEST_USERS_PER_BATCH', 200)),
+        # --- Goal adherence on the daily log (see tracker.adherence): calories count as on target within this share ---
+        'ADHERENCE_CALORIE_TOLERANCE': float(os.environ.get('ADHERENCE_CALORIE_TOLERANCE', 0.10)),
+        'ADHERENCE_WINDOW_DAYS': int(os.environ.get('ADHERENCE_WINDOW_DAYS', 7)), # "Protein target hit n of the last 7 days"
+        'SYNC_PAGE_SIZE': int(os.environ.get('SYNC_PAGE_SIZE', 500)), # /api/sync changes per page unless ?limit= asks for fewer
+        'SYNC_PAGE_MAX': int(os.environ.get('SYNC_PAGE_MAX', 2000)),
+        'SYNC_LOG_DAYS': int(os.environ.get('SYNC_LOG_DAYS', 90)), # Meal logs older than this are not sent to clients
+        # --- Startup budgets checked by `flask check-startup` (milliseconds) ---
+        'STARTUP_IMPORT_BUDGET_MS': float(os.environ.get('STARTUP_IMPORT_BUDGET_MS', 500)),
+        'STARTUP_COLD_START_BUDGET_MS': float(os.environ.get('STARTUP_COLD_START_BUDGET_MS', 1500)),
+    }
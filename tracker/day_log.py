@@ -0,0 +1,118 @@
+""" Day logs as JSON for API clients: entries grouped by meal plus the day's summary, for one or many days.
+
+The dashboard used to scrape daily_log.html; /api/log/<date> and
+/api/log?dates= give it the same data without rendering a page. All requested
+days come from one meal_logs statement that selects plain column tuples (no
+ORM objects, no joins), whatever the number of days. The summary of each day
+is summed from those same rows. Archived months (tracker.log_archive) add
+their entries from the archive.
+
+`fields=` trims each entry and summary to the nutrients (and entry attributes
+in ENTRY_FIELDS) the client names; fewer columns are then selected too.
+`include=food,recipe` embeds the name and unit of each entry's food or recipe,
+read through the catalog row cache. Documents hold only str, int, float, bool
+and None, so `dumps` can use orjson when it is installed and otherwise the
+standard library encoder, without a `default` hook.
+"""
+import json
+from datetime import date
+
+from . import catalog_cache
+from .extensions import db
+from .log_archive import any_archived, archived_entries
+from .models import MEAL_TYPES, Food, MealLog, Recipe
+from .nutrients import NUTRIENT_KEYS, column_names
+
+ENTRY_FIELDS = ('quantity', 'logged_at') # Besides the nutrients; id, food_id and recipe_id are always there
+INCLUDES = {'food': Food, 'recipe': Recipe}
+MAX_DAYS = 92
+
+try: import orjson # Optional: several times faster on large documents
+except ImportError: orjson = None
+
+
+def dumps(document):
+    """ `document` as compact JSON bytes. """
+    if orjson is not None: return orjson.dumps(document)
+    return json.dumps(document, separators=(',', ':'), allow_nan=False).encode()
+
+
+def parse_fields(raw):
+    """ 'calories,protein,quantity' -> (nutrient keys, entry fields); no `raw` selects everything. Raises ValueError. """
+    if not raw: return NUTRIENT_KEYS, ENTRY_FIELDS
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = set(names) - set(NUTRIENT_KEYS) - set(ENTRY_FIELDS)
+    if unknown: raise ValueError(f'Unknown fields: {", ".join(sorted(unknown))}')
+    return tuple(key for key in NUTRIENT_KEYS if key in names), tuple(field for field in ENTRY_FIELDS if field in names)
+
+
+def parse_include(raw):
+    """ 'food,recipe' -> ('food', 'recipe'). Raises ValueError. """
+    names = tuple(name.strip() for name in (raw or '').split(',') if name.strip())
+    unknown = set(names) - INCLUDES.keys()
+    if unknown: raise ValueError(f'Cannot include: {", ".join(sorted(unknown))}')
+    return names
+
+
+def parse_dates(raw):
+    """ '2024-05-01,2024-05-03' (or a range '2024-05-01..2024-05-30', or a mix) -> sorted distinct dates. Raises ValueError. """
+    days = set()
+    for part in (raw or '').split(','):
+        first, _, last = part.strip().partition('..')
+        if not first: continue
+        first = date.fromisoformat(first); last = date.fromisoformat(last) if last else first
+        if last < first or (last - first).days >= MAX_DAYS: raise ValueError(f'Bad date range {part.strip()}')
+        days.update(date.fromordinal(n) for n in range(first.toordinal(), last.toordinal() + 1))
+        if len(days) > MAX_DAYS: raise ValueError(f'At most {MAX_DAYS} days per request')
+    if not days: raise ValueError('No dates')
+    return sorted(days)
+
+
+def _rows(user_id, days, keys):
+    """ (id, log_date, meal_type, food_id, recipe_id, quantity, created_at, *nutrients in `keys`) tuples for `days`, in logging order. """
+    by_key = dict(zip(NUTRIENT_KEYS, column_names(MealLog)))
+    nutrient_columns = [getattr(MealLog, by_key[key]) for key in keys]
+    first, last = days[0], days[-1]
+    contiguous = (last - first).days + 1 == len(days)
+    rows = (db.session.query(MealLog.id, MealLog.log_date, MealLog.meal_type, MealLog.food_id, MealLog.recipe_id, MealLog.quantity_consumed,
+                             MealLog.created_at, *nutrient_columns)
+            .filter(MealLog.user_id == user_id, MealLog.log_date.between(first, last) if contiguous else MealLog.log_date.in_(days))
+            .order_by(MealLog.log_date, MealLog.created_at, MealLog.id).all())
+    if not any_archived(first, last): return rows
+    wanted = set(days)
+    cold = [(e.id, e.log_date, e.meal_type, e.food_id, e.recipe_id, e.quantity_consumed, e.created_at, *[getattr(e, by_key[key]) for key in keys])
+            for e in archived_entries(user_id, first, last, exclude_ids={row[0] for row in rows}) if e.log_date in wanted]
+    return sorted(rows + cold, key=lambda row: (row[1], row[6] is None, row[6] or 0, row[0]))
+
+
+def _embedded(rows, include):
+    """ {kind: {id: {id, name, unit}}} of the foods/recipes the rows reference. """
+    embedded = {}
+    for kind in include:
+        position = 3 if kind == 'food' else 4
+        cached = catalog_cache.get_many(INCLUDES[kind], {row[position] for row in rows if row[position] is not None})
+        embedded[kind] = {i: {'id': i, 'name': row.name, 'unit': row.unit} for i, row in cached.items()}
+    return embedded
+
+
+def days(user_id, dates, keys=NUTRIENT_KEYS, entry_fields=ENTRY_FIELDS, include=()):
+    """ [{date, meals: {meal type: [entry]}, summary: {key: total}}] for each of `dates` (sorted), days without entries included. """
+    rows = _rows(user_id, dates, keys)
+    embedded = _embedded(rows, include)
+    documents = {day: {'date': day.isoformat(), 'meals': {meal: [] for meal in MEAL_TYPES}, 'summary': dict.fromkeys(keys, 0.0)} for day in dates}
+    for row in rows:
+        log_id, log_date, meal_type, food_id, recipe_id, quantity, created_at = row[:7]
+        values = [v if v is not None and v - v == 0 else None for v in row[7:]] # NaN and infinities are not JSON; read as missing
+        entry = {'id': log_id, 'food_id': food_id, 'recipe_id': recipe_id}
+        if 'quantity' in entry_fields: entry['quantity'] = quantity
+        if 'logged_at' in entry_fields: entry['logged_at'] = created_at.isoformat() if created_at else None
+        entry.update(zip(keys, values))
+        for kind in include:
+            source_id = food_id if kind == 'food' else recipe_id
+            if source_id is not None: entry[kind] = embedded[kind].get(source_id)
+        document = documents[log_date]
+        document['meals'].setdefault(meal_type, []).append(entry)
+        summary = document['summary']
+        for key, value in zip(keys, values):
+            if value is not None: summary[key] += value
+    return list(documents.values())
@@ -0,0 +1,79 @@
+""" Catalog deduplication for `flask dedupe-catalog`: cluster near-duplicate names and merge each cluster.
+
+Only rows that can stand in for each other are grouped: foods of the same owner
+and base unit, ingredients of the same typical unit (quantities are stored in
+those units, so repointing across units would change what was eaten). Each
+cluster keeps its most referenced row; the others' MealLog / MealTemplateItem
+references are repointed with one UPDATE per cluster and table (the repointed
+log days are announced with meal_logs_changed after the commit, so the sync feed
+and adherence cache see them). Recipe lines are
+moved to the keeper one by one, since a recipe has at most one line per
+ingredient: a recipe that would name it twice keeps one line with the summed
+quantity. Affected recipe totals are recomputed and the duplicates are deleted. Past log entries keep their
+calculated nutrients; archived months (tracker.log_archive) keep the old ids.
+"""
+from collections import Counter
+
+from .extensions import db
+from .models import Food, Ingredient, MealLog, MealTemplateItem, RecipeIngredient
+from .name_index import SIMILARITY_THRESHOLD, cluster
+from .recipe_graph import recompute_with_ancestors
+from .signals import meal_logs_changed
+
+# kind -> (model, scope columns, referencing columns)
+KINDS = {'food': (Food, ('owner_id', 'base_unit'), (MealLog.food_id, MealTemplateItem.food_id)),
+         'ingredient': (Ingredient, ('typical_unit',), (RecipeIngredient.ingredient_id,))}
+
+
+def find_clusters(kind, threshold=SIMILARITY_THRESHOLD):
+    """ [(keeper id, [duplicate ids])] for one kind; the keeper is the most referenced row, then the oldest. """
+    model, scope_columns, refs = KINDS[kind]
+    rows = db.session.query(model.id, model.name, *[getattr(model, c) for c in scope_columns])
+    items = [(row[0], row[1], tuple(v.strip().lower() if isinstance(v, str) else v for v in row[2:])) for row in rows]
+    clusters = cluster(items, threshold)
+    if not clusters: return []
+    uses = Counter()
+    for ref in refs: uses.update(dict(db.session.query(ref, db.func.count()).filter(ref.isnot(None)).group_by(ref)))
+    result = []
+    for ids in clusters:
+        keeper = min(ids, key=lambda i: (-uses[i], i))
+        result.append((keeper, sorted(i for i in ids if i != keeper)))
+    return result
+
+
+def _move_recipe_lines(keeper, duplicates):
+    """ Points the recipe lines of `duplicates` at `keeper`, folding the lines of one recipe into a single line (the
+    keeper's own if it has one) with the summed quantity. Returns (lines moved or folded, ids of their recipes). """
+    lines = RecipeIngredient.query.filter(RecipeIngredient.ingredient_id.in_([keeper, *duplicates])).order_by(RecipeIngredient.id).all()
+    moved = [line for line in lines if line.ingredient_id != keeper]
+    kept = {}
+    for line in sorted(lines, key=lambda line: line.ingredient_id != keeper): kept.setdefault(line.recipe_id, line) # The keeper's line, else the oldest
+    for line in moved:
+        if kept[line.recipe_id] is not line: kept[line.recipe_id].quantity += line.quantity; db.session.delete(line)
+    db.session.flush() # Folded lines go before the survivors take the keeper's id (one line per recipe and ingredient)
+    for line in kept.values(): line.ingredient_id = keeper
+    db.session.flush()
+    return len(moved), {line.recipe_id for line in moved}
+
+
+def merge(kind, clusters):
+    """ Merges every (keeper, duplicates) pair in one transaction. Returns (rows deleted, references repointed). """
+    model, _, refs = KINDS[kind]
+    repointed, recipe_ids, days = 0, set(), set()
+    for keeper, duplicates in clusters:
+        for ref in refs:
+            if ref is RecipeIngredient.ingredient_id:
+                moved, recipes = _move_recipe_lines(keeper, duplicates)
+                repointed += moved; recipe_ids |= recipes
+                continue
+            if ref is MealLog.food_id: days.update(map(tuple, db.session.query(MealLog.user_id, MealLog.log_date).filter(ref.in_(duplicates)).distinct()))
+            repointed += db.session.execute(db.update(ref.class_).where(ref.in_(duplicates)).values({ref.key: keeper})
+                                            .execution_options(synchronize_session=False)).rowcount
+    db.session.expire_all() # Loaded relationships still list the old references
+    duplicate_ids = [i for _, duplicates in clusters for i in duplicates]
+    for row in model.query.filter(model.id.in_(duplicate_ids)): db.session.delete(row) # ORM delete: name_buckets and ingredient_nutrients follow
+    db.session.flush()
+    if recipe_ids: recompute_with_ancestors(*recipe_ids)
+    db.session.commit()
+    if days: meal_logs_changed.send(db.session, dates={day for _, day in days}, days=days)
+    return len(duplicate_ids), repointed
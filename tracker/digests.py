@@ -0,0 +1,145 @@
+""" Weekly nutrition digests, precomputed off the request path and served as stored.
+
+A digest covers one Monday-to-Sunday week of one user. It holds the daily
+averages over the days with entries, set against the user's targets; the foods
+and recipes that brought the most calories; and the micronutrients whose
+average stayed below SHORTFALL of the target. Where the user set no target,
+REFERENCE_INTAKES is used. Each digest is stored twice: as JSON
+(/api/digests/<week>) and as the rendered HTML body of its page
+(/digests/<week>).
+
+The scheduler (tracker.scheduler) runs `run_scheduled` every
+DIGEST_INTERVAL_S. It writes the last complete week's digest for every user
+who logged in that week and does not have one yet, so reruns and overlapping
+polls do nothing. `generate(force=True)` rewrites digests; a digest is
+replaced, never duplicated (one row per user and week). Users are handled
+DIGEST_USERS_PER_BATCH at a time. Their entries are read in keyset batches of
+DIGEST_BATCH_SIZE rows and folded into per-user running totals, so memory
+stays bounded however much was logged. Weeks in archived months
+(tracker.log_archive) are not digested.
+"""
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from flask import current_app, render_template
+
+from . import catalog_cache
+from .extensions import db
+from .log_archive import is_archived
+from .models import Food, MealLog, Recipe, User, WeeklyDigest
+from .nutrients import NutrientVector, columns
+
+logger = logging.getLogger(__name__)
+
+UNITS = {'calories': 'kcal', 'protein': 'g', 'carbs': 'g', 'fat': 'g', 'fiber': 'g', 'sugar': 'g',
+         'calcium': 'mg', 'iron': 'mg', 'potassium': 'mg', 'sodium': 'mg', 'vit_d': 'mcg'}
+REFERENCE_INTAKES = {'fiber': 28.0, 'calcium': 1300.0, 'iron': 18.0, 'potassium': 4700.0, 'vit_d': 20.0} # US Daily Values
+SHORTFALL = 0.8 # An average below this share of the target is a shortfall
+TOP_SOURCES = 5
+
+
+def week_start(day):
+    """ The Monday of `day`'s week. """
+    return day - timedelta(days=day.weekday())
+
+
+def last_complete_week(today=None):
+    return week_start(today or date.today()) - timedelta(days=7)
+
+
+class _Week:
+    """ Running totals of one user's week, fed entry by entry. """
+    __slots__ = ('days', 'calories_by_source', 'entries_by_source', 'entries')
+
+    def __init__(self):
+        self.days, self.calories_by_source, self.entries_by_source, self.entries = {}, Counter(), Counter(), 0
+
+    def add(self, log_date, food_id, recipe_id, nutrients):
+        vector = NutrientVector(nutrients)
+        day = self.days.get(log_date)
+        if day is None: self.days[log_date] = vector
+        else: day += vector
+        source = ('food', food_id) if food_id is not None else ('recipe', recipe_id)
+        self.calories_by_source[source] += vector['calories']; self.entries_by_source[source] += 1
+        self.entries += 1
+
+    def summary(self, user, start):
+        """ The digest's JSON document. """
+        averages = NutrientVector.sum(self.days.values()).scaled(1.0 / len(self.days)).as_dict()
+        targets = user.targets()
+        percent = {key: round(100.0 * averages[key] / target) for key, target in targets.items() if target}
+        shortfalls = []
+        for key, reference in REFERENCE_INTAKES.items():
+            target = targets.get(key) or reference
+            if averages[key] < SHORTFALL * target:
+                shortfalls.append({'nutrient': key, 'average': averages[key], 'target': target, 'percent': round(100.0 * averages[key] / target),
+                                   'reference': key not in targets})
+        top = self.calories_by_source.most_common(TOP_SOURCES)
+        rows = {'food': catalog_cache.get_many(Food, [i for (kind, i), _ in top if kind == 'food']),
+                'recipe': catalog_cache.get_many(Recipe, [i for (kind, i), _ in top if kind == 'recipe'])}
+        top_sources = [{'kind': kind, 'id': i, 'name': rows[kind][i].name if i in rows[kind] else '(deleted)', 'calories': calories,
+                        'entries': self.entries_by_source[(kind, i)]} for (kind, i), calories in top]
+        return {'week_start': start.isoformat(), 'week_end': (start + timedelta(days=6)).isoformat(), 'days_logged': len(self.days),
+                'entries': self.entries, 'averages': averages, 'targets': targets, 'percent_of_target': percent,
+                'top_sources': top_sources, 'shortfalls': shortfalls,
+                'daily_calories': {day.isoformat(): totals['calories'] for day, totals in sorted(self.days.items())}}
+
+
+def _read_weeks(user_ids, start, end, batch_size):
+    """ {user_id: _Week} of `user_ids`' entries in [start, end], read in keyset batches of (user_id, id). """
+    weeks, after = {}, (0, 0)
+    fields = (MealLog.user_id, MealLog.id, MealLog.log_date, MealLog.food_id, MealLog.recipe_id, *columns(MealLog))
+    while True:
+        rows = (db.session.query(*fields).filter(MealLog.user_id.in_(user_ids), MealLog.log_date.between(start, end),
+                                                 db.or_(MealLog.user_id > after[0], db.and_(MealLog.user_id == after[0], MealLog.id > after[1])))
+                .order_by(MealLog.user_id, MealLog.id).limit(batch_size).all())
+        if not rows: return weeks
+        for row in rows:
+            week = weeks.get(row[0])
+            if week is None: week = weeks[row[0]] = _Week()
+            week.add(row[2], row[3], row[4], row[5:])
+        after = (rows[-1][0], rows[-1][1])
+
+
+def generate(start, user_ids=None, force=False):
+    """ Writes the digests of the week beginning on Monday `start` for the users who logged in it (or only `user_ids`),
+    skipping users who already have one unless `force`. Returns the number written. """
+    config = current_app.config
+    end = start + timedelta(days=6)
+    if start.weekday() != 0: raise ValueError(f'{start} is not a Monday')
+    if is_archived(start) or is_archived(end):
+        logger.info('Week lies in an archived month; no digest', extra={'week_start': start.isoformat()}); return 0
+    pending = db.session.query(MealLog.user_id).filter(MealLog.log_date.between(start, end)).distinct()
+    if user_ids is not None: pending = pending.filter(MealLog.user_id.in_(list(user_ids)))
+    if not force:
+        pending = pending.filter(~db.exists().where(WeeklyDigest.user_id == MealLog.user_id, WeeklyDigest.week_start == start))
+    pending, written, per_batch = sorted(uid for (uid,) in pending), 0, config['DIGEST_USERS_PER_BATCH']
+    for i in range(0, len(pending), per_batch):
+        chunk = pending[i:i + per_batch]
+        weeks = _read_weeks(chunk, start, end, config['DIGEST_BATCH_SIZE'])
+        users = {user.id: user for user in User.query.filter(User.id.in_(chunk))}
+        db.session.execute(db.delete(WeeklyDigest).where(WeeklyDigest.user_id.in_(chunk), WeeklyDigest.week_start == start))
+        for user_id, week in weeks.items():
+            data = week.summary(users[user_id], start)
+            html = render_template('digest_body.html', digest=data, units=UNITS, shortfall=SHORTFALL)
+            db.session.add(WeeklyDigest(user_id=user_id, week_start=start, generated_at=datetime.utcnow(), data=data, html=html))
+        db.session.commit() # One transaction per batch of users: a digest is never seen half-replaced
+        written += len(weeks)
+    return written
+
+
+def run_scheduled(app):
+    """ Scheduler job: the last complete week's missing digests. """
+    start = last_complete_week()
+    return f'{generate(start)} digests written for the week of {start.isoformat()}'
+
+
+def user_digests(user_id):
+    """ The user's digests, newest week first, without their bodies. """
+    return (WeeklyDigest.query.filter_by(user_id=user_id).options(db.load_only(WeeklyDigest.week_start, WeeklyDigest.generated_at))
+            .order_by(WeeklyDigest.week_start.desc()).all())
+
+
+def get(user_id, start):
+    return WeeklyDigest.query.filter_by(user_id=user_id, week_start=start).first()
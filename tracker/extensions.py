@@ -0,0 +1,23 @@
+""" Flask extension singletons, bound to an app inside create_app(). """
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import MetaData
+
+# --- Naming Convention (Essential for Alembic/Migrate) ---
+convention = {
+    "ix": "ix_%(column_0_label)s",
+    "uq": "uq_%(table_name)s_%(column_0_name)s",
+    "ck": "ck_%(table_name)s_%(constraint_name)s",
+    "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+    "pk": "pk_%(table_name)s"
+}
+metadata = MetaData(naming_convention=convention)
+
+db = SQLAlchemy(metadata=metadata) # Apply metadata
+
+
+def dispose_engines(app):
+    """ Drops pooled connections inherited from a parent process (call after fork).
+    close=False leaves the parent's sockets alone; the child just opens new ones on demand. """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
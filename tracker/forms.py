@@ -0,0 +1,151 @@
+""" WTForms definitions. Imported lazily by the views that render them. """
+from flask import g
+from flask_wtf import FlaskForm
+from wtforms import StringField, FloatField, SubmitField, SelectField, HiddenField, TextAreaField, SelectMultipleField, PasswordField, BooleanField, DateField
+from wtforms.validators import DataRequired, NumberRange, InputRequired, Optional, Length, EqualTo, ValidationError
+from wtforms.widgets import ListWidget, CheckboxInput
+
+from . import catalog_cache
+from .accounts import visible
+from .models import MEAL_TYPES, Food, MealTemplate, Recipe
+
+class IngredientForm(FlaskForm):
+    name = StringField('Ingredient Name', validators=[DataRequired(), Length(max=150)])
+    category = StringField('Category', validators=[Optional(), Length(max=100)], description="e.g., Vegetable, Protein")
+    typical_unit = StringField('Typical Unit', default='g', validators=[DataRequired(), Length(max=50)], description="e.g., g, ml, piece")
+    unit_quantity = FloatField('Nutrients Per Qty', default=100.0, validators=[InputRequired(), NumberRange(min=0.001)])
+    calories = FloatField('Est. Calories', validators=[Optional(), NumberRange(min=0)])
+    protein = FloatField('Est. Protein (g)', validators=[Optional(), NumberRange(min=0)])
+    carbs = FloatField('Est. Carbs (g)', validators=[Optional(), NumberRange(min=0)])
+    fat = FloatField('Est. Fat (g)', validators=[Optional(), NumberRange(min=0)])
+    fiber = FloatField('Est. Fiber (g)', validators=[Optional(), NumberRange(min=0)])
+    sugar = FloatField('Est. Sugar (g)', validators=[Optional(), NumberRange(min=0)])
+    calcium = FloatField('Est. Calcium (mg)', validators=[Optional(), NumberRange(min=0)])
+    iron = FloatField('Est. Iron (mg)', validators=[Optional(), NumberRange(min=0)])
+    potassium = FloatField('Est. Potassium (mg)', validators=[Optional(), NumberRange(min=0)])
+    sodium = FloatField('Est. Sodium (mg)', validators=[Optional(), NumberRange(min=0)])
+    vit_d = FloatField('Est. Vit D (mcg)', validators=[Optional(), NumberRange(min=0)])
+    notes = TextAreaField('Notes', validators=[Optional()])
+    data_source_flag = HiddenField(default='manual') # Tracks if data came from API lookup
+    other_details_json = HiddenField() # Extra API nutrients, carried from the lookup GET to the save POST
+    submit = SubmitField('Save Ingredient')
+
+class FoodForm(FlaskForm):
+    name = StringField('Food Name', validators=[DataRequired(), Length(max=150)])
+    base_unit = StringField('Base Unit', validators=[DataRequired(), Length(max=50)])
+    base_quantity = FloatField('Nutrients Per Qty', default=100.0, validators=[InputRequired(), NumberRange(min=0.001)])
+    calories = FloatField('Calories (kcal)', default=0, validators=[InputRequired(), NumberRange(min=0)])
+    protein = FloatField('Protein (g)', default=0, validators=[InputRequired(), NumberRange(min=0)])
+    carbs = FloatField('Carbs (g)', default=0, validators=[InputRequired(), NumberRange(min=0)])
+    fat = FloatField('Fat (g)', default=0, validators=[InputRequired(), NumberRange(min=0)])
+    fiber = FloatField('Fiber (g)', default=0, validators=[Optional(), NumberRange(min=0)])
+    sugar = FloatField('Sugar (g)', default=0, validators=[Optional(), NumberRange(min=0)])
+    calcium = FloatField('Calcium (mg)', default=0, validators=[Optional(), NumberRange(min=0)])
+    iron = FloatField('Iron (mg)', default=0, validators=[Optional(), NumberRange(min=0)])
+    potassium = FloatField('Potassium (mg)', default=0, validators=[Optional(), NumberRange(min=0)])
+    sodium = FloatField('Sodium (mg)', default=0, validators=[Optional(), NumberRange(min=0)])
+    vit_d = FloatField('Vit D (mcg)', default=0, validators=[Optional(), NumberRange(min=0)])
+    notes = TextAreaField('Notes', validators=[Optional()])
+    shared = BooleanField('Shared with all users', description="Admins only; otherwise the food is private to you")
+    submit = SubmitField('Save Food')
+
+class RecipeForm(FlaskForm):
+    name = StringField('Recipe Name', validators=[DataRequired(), Length(max=200)])
+    description = TextAreaField('Description (Optional)')
+    instructions = TextAreaField('Instructions (Optional)')
+    meal_type_suitability = SelectMultipleField('Suitable for Meals', choices=[('Breakfast','Breakfast'), ('Lunch','Lunch'), ('Dinner','Dinner'), ('Snack','Snack'), ('Any','Any')], option_widget=CheckboxInput(), widget=ListWidget(prefix_label=False), validators=[Optional()])
+    shared = BooleanField('Shared with all users', description="Admins only; otherwise the recipe is private to you")
+    submit = SubmitField('Save Recipe Details')
+
+class AddIngredientToRecipeForm(FlaskForm):
+    ingredient_id = SelectField('Ingredient', coerce=int, validators=[DataRequired()])
+    quantity = FloatField('Quantity', validators=[InputRequired(), NumberRange(min=0.001)])
+    submit = SubmitField('Add Ingredient')
+
+class PasteIngredientsForm(FlaskForm):
+    lines = TextAreaField('Ingredient list', validators=[DataRequired(), Length(max=10000)], description="One per line, e.g. 2 cups cooked rice")
+    submit = SubmitField('Add All')
+
+class AddSubRecipeForm(FlaskForm):
+    sub_recipe_id = SelectField('Recipe', coerce=int, validators=[DataRequired()])
+    multiplier = FloatField('Servings', default=1.0, validators=[InputRequired(), NumberRange(min=0.01)], description="e.g., 0.25 of the sauce recipe")
+    submit = SubmitField('Add Sub-recipe')
+
+class LogEntryForm(FlaskForm): # For logging FOOD items (manual db)
+    food_id = SelectField('Food Item', coerce=int, validators=[DataRequired()])
+    quantity_consumed = FloatField('Quantity Consumed', validators=[DataRequired(), NumberRange(min=0.001)])
+    meal_type = HiddenField(validators=[DataRequired()])
+    log_date = HiddenField(validators=[DataRequired()])
+    submit = SubmitField('Add to Log') # Name used to differentiate submits
+
+    def __init__(self, *args, load_choices=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not load_choices: self.food_id.validate_choice = False; return # Posted: validate_food_id checks the one id
+        try: self.food_id.choices = [(f.id, f.name) for f in Food.query.filter(visible(Food)).order_by(Food.name).all()]
+        except: self.food_id.choices = [] # Handle case where DB not ready
+
+    def validate_food_id(self, field):
+        if not field.validate_choice and catalog_cache.get_visible(Food, field.data, g.user.id) is None: raise ValidationError('Not a valid choice.')
+
+class LogRecipeForm(FlaskForm):
+    recipe_id = SelectField('Recipe', coerce=int, validators=[DataRequired()])
+    quantity_consumed = FloatField('Servings / Multiplier', default=1.0, validators=[InputRequired(), NumberRange(min=0.01)], description="e.g., 1=whole recipe, 0.5=half")
+    meal_type = HiddenField(validators=[DataRequired()])
+    log_date = HiddenField(validators=[DataRequired()])
+    submit = SubmitField('Log Recipe') # Name used to differentiate submits
+
+    def __init__(self, *args, load_choices=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not load_choices: self.recipe_id.validate_choice = False; return # Posted: validate_recipe_id checks the one id
+        try: self.recipe_id.choices = [(r.id, r.name) for r in Recipe.query.filter(visible(Recipe)).order_by(Recipe.name).all()]
+        except: self.recipe_id.choices = [] # Handle case where DB not ready
+
+    def validate_recipe_id(self, field):
+        if not field.validate_choice and catalog_cache.get_visible(Recipe, field.data, g.user.id) is None: raise ValidationError('Not a valid choice.')
+
+class CopyEntriesForm(FlaskForm): # Copies a past day or meal onto log_date
+    source_date = DateField('Copy From', validators=[DataRequired()])
+    meal_type = SelectField('Meal', choices=[('', 'Whole day')] + [(m, m) for m in MEAL_TYPES], validators=[Optional()])
+    log_date = HiddenField(validators=[DataRequired()])
+    submit = SubmitField('Copy to This Day')
+
+class SaveTemplateForm(FlaskForm): # Saves one meal of log_date as a MealTemplate
+    name = StringField('Template Name', validators=[DataRequired(), Length(max=100)])
+    meal_type = HiddenField(validators=[DataRequired()])
+    log_date = HiddenField(validators=[DataRequired()])
+    submit = SubmitField('Save as Template')
+
+class ApplyTemplateForm(FlaskForm):
+    template_id = SelectField('Template', coerce=int, validators=[DataRequired()])
+    meal_type = SelectField('Log Into', choices=[('', "Template's meal")] + [(m, m) for m in MEAL_TYPES], validators=[Optional()])
+    log_date = HiddenField(validators=[DataRequired()])
+    submit = SubmitField('Log Template')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.template_id.choices = [(t.id, t.name) for t in MealTemplate.query.filter_by(user_id=g.user.id).order_by(MealTemplate.name)]
+
+class LoginForm(FlaskForm):
+    username = StringField('Username', validators=[DataRequired(), Length(max=80)])
+    password = PasswordField('Password', validators=[DataRequired()])
+    submit = SubmitField('Log In')
+
+class RegisterForm(FlaskForm):
+    username = StringField('Username', validators=[DataRequired(), Length(min=2, max=80)])
+    password = PasswordField('Password', validators=[DataRequired(), Length(min=8)])
+    confirm = PasswordField('Repeat Password', validators=[DataRequired(), EqualTo('password', message='Passwords must match.')])
+    submit = SubmitField('Create Account')
+
+class TargetsForm(FlaskForm): # Daily targets; blank = no target for that nutrient
+    target_calories = FloatField('Calories (kcal)', validators=[Optional(), NumberRange(min=0)])
+    target_protein = FloatField('Protein (g)', validators=[Optional(), NumberRange(min=0)])
+    target_carbs = FloatField('Carbs (g)', validators=[Optional(), NumberRange(min=0)])
+    target_fat = FloatField('Fat (g)', validators=[Optional(), NumberRange(min=0)])
+    target_fiber = FloatField('Fiber (g)', validators=[Optional(), NumberRange(min=0)])
+    target_sugar = FloatField('Sugar (g)', validators=[Optional(), NumberRange(min=0)])
+    target_calcium = FloatField('Calcium (mg)', validators=[Optional(), NumberRange(min=0)])
+    target_iron = FloatField('Iron (mg)', validators=[Optional(), NumberRange(min=0)])
+    target_potassium = FloatField('Potassium (mg)', validators=[Optional(), NumberRange(min=0)])
+    target_sodium = FloatField('Sodium (mg)', validators=[Optional(), NumberRange(min=0)])
+    target_vit_d = FloatField('Vit D (mcg)', validators=[Optional(), NumberRange(min=0)])
+    submit = SubmitField('Save Targets')
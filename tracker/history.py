@@ -0,0 +1,55 @@
+""" A user's meal log across the live table and the monthly archive (see tracker.log_archive).
+
+Views and exports read history through these functions and never need to know
+where a month lives. The archive is only consulted for months that have been
+archived, so current days cost exactly the meal_logs queries they always did.
+An id present in both stores (an archive run that stopped before its delete
+committed) is taken from meal_logs.
+"""
+from collections import defaultdict
+
+from .extensions import db
+from .log_archive import any_archived, archived_daily_totals, archived_entries, is_archived
+from .models import Food, MealLog, Recipe
+from .nutrients import NutrientVector, columns
+
+
+def _hot_ids(user_id, start, end):
+    return {i for (i,) in db.session.query(MealLog.id).filter(MealLog.user_id == user_id, MealLog.log_date.between(start, end))}
+
+
+def entries(user_id, start, end):
+    """ All of `user_id`'s entries with start <= log_date <= end, by date then time logged; food/recipe loaded. """
+    hot = (MealLog.query.filter(MealLog.user_id == user_id, MealLog.log_date.between(start, end))
+           .options(db.joinedload(MealLog.food), db.joinedload(MealLog.recipe)).order_by(MealLog.log_date, MealLog.created_at, MealLog.id).all())
+    if not any_archived(start, end): return hot
+    cold = archived_entries(user_id, start, end, exclude_ids={log.id for log in hot})
+    foods = {f.id: f for f in Food.query.filter(Food.id.in_({e.food_id for e in cold if e.food_id is not None}))}
+    recipes = {r.id: r for r in Recipe.query.filter(Recipe.id.in_({e.recipe_id for e in cold if e.recipe_id is not None}))}
+    for entry in cold: entry.food, entry.recipe = foods.get(entry.food_id), recipes.get(entry.recipe_id)
+    return sorted(hot + cold, key=lambda e: (e.log_date, e.created_at is None, e.created_at or 0, e.id))
+
+
+def day_entries_by_meal(user_id, day, meal_types):
+    """ {meal type: [entries]} for one day, in logging order. """
+    by_meal = {meal: [] for meal in meal_types}
+    for entry in entries(user_id, day, day): by_meal.setdefault(entry.meal_type, []).append(entry)
+    return by_meal
+
+
+def daily_totals(user_id, start, end):
+    """ {date: NutrientVector} for every day in [start, end] with entries; SQL sums for meal_logs, NumPy for the archive. """
+    rows = (db.session.query(MealLog.log_date, *[db.func.sum(col) for col in columns(MealLog)])
+            .filter(MealLog.user_id == user_id, MealLog.log_date.between(start, end)).group_by(MealLog.log_date))
+    totals = defaultdict(NutrientVector)
+    for log_date, *values in rows: totals[log_date] += NutrientVector(values)
+    if any_archived(start, end):
+        for day, vector in archived_daily_totals(user_id, start, end, exclude_ids=_hot_ids(user_id, start, end)).items(): totals[day] += vector
+    return dict(sorted(totals.items()))
+
+
+def day_totals(user_id, day):
+    """ One day's NutrientVector; the archive is only opened if the day's month was archived. """
+    total = NutrientVector(db.session.query(*[db.func.sum(col) for col in columns(MealLog)]).filter(MealLog.user_id == user_id, MealLog.log_date == day).one())
+    if is_archived(day): total += archived_daily_totals(user_id, day, day, exclude_ids=_hot_ids(user_id, day, day)).get(day, NutrientVector())
+    return total
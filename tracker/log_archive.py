@@ -0,0 +1,253 @@
+""" Cold storage for old meal logs: one directory of packed column files per month.
+
+`flask archive-logs --before DATE` moves every whole month before DATE out of
+meal_logs into LOG_ARCHIVE_DIR/YYYY-MM/, one NumPy .npy file per column plus a
+manifest.json. Nutrients and quantities are float32 (NULL as NaN), ids int32/int64
+(NULL as -1), dates int32 days since 1970-01-01, meal types int8 codes into the
+manifest's list. Rows are sorted by (user_id, log_date, id), so a user's day or
+range is two binary searches over memory-mapped files and reads only the pages
+it needs. A month is written to a temporary directory and renamed into place
+before its rows leave the database; a month archived twice is merged by id.
+
+Archived entries are read-only: `flask recalc-logs` and deleting from the daily
+log only reach rows still in meal_logs. `tracker.history` merges both stores.
+"""
+import json
+import os
+import re
+import shutil
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+
+from .extensions import db
+from .models import MealLog
+from .nutrients import NutrientVector, column_names
+from .partitions import drop_partition, is_partitioned, lock_partition, month_start, next_month
+
+FORMAT_VERSION = 1
+EPOCH = date(1970, 1, 1)
+_EPOCH_DATETIME = datetime(1970, 1, 1)
+_MONTH_DIR = re.compile(r'^\d{4}-\d{2}$')
+# column -> dtype; MealLog attributes keep their names, dates and times are stored as integers
+FLOAT_COLUMNS = ('quantity_consumed',) + column_names(MealLog)
+INT_COLUMNS = {'id': 'int64', 'user_id': 'int32', 'log_date': 'int32', 'meal_type': 'int8', 'food_id': 'int32', 'recipe_id': 'int32', 'created_at': 'int64'}
+DELETE_BATCH = 1000
+
+
+def archive_dir(): return current_app.config['LOG_ARCHIVE_DIR']
+
+
+def month_key(d): return f'{d.year:04d}-{d.month:02d}'
+
+
+def _month_path(key): return os.path.join(archive_dir(), key)
+
+
+def archived_months():
+    """ Sorted 'YYYY-MM' keys of the complete month archives on disk. """
+    root = archive_dir()
+    if not os.path.isdir(root): return []
+    return sorted(k for k in os.listdir(root) if _MONTH_DIR.match(k) and os.path.exists(os.path.join(root, k, 'manifest.json')))
+
+
+def is_archived(d): return os.path.exists(os.path.join(_month_path(month_key(d)), 'manifest.json'))
+
+
+class MonthArchive:
+    """ Read side of one month: columns are memory-mapped on first use. """
+    __slots__ = ('path', 'manifest', '_columns')
+
+    def __init__(self, path):
+        self.path, self._columns = path, {}
+        with open(os.path.join(path, 'manifest.json')) as f: self.manifest = json.load(f)
+        if self.manifest.get('version') != FORMAT_VERSION: raise ValueError(f'{path}: unsupported archive format {self.manifest.get("version")}')
+
+    def __len__(self): return self.manifest['rows']
+
+    def column(self, name):
+        if name not in self._columns:
+            import numpy as np
+            self._columns[name] = np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r')
+        return self._columns[name]
+
+    def user_range(self, user_id, start, end):
+        """ (lo, hi) row bounds of `user_id`'s entries with start <= log_date <= end. """
+        import numpy as np
+        users = self.column('user_id')
+        lo, hi = int(np.searchsorted(users, user_id, 'left')), int(np.searchsorted(users, user_id, 'right'))
+        days = self.column('log_date')[lo:hi]
+        return lo + int(np.searchsorted(days, (start - EPOCH).days, 'left')), lo + int(np.searchsorted(days, (end - EPOCH).days, 'right'))
+
+
+_open_archives = {} # key -> ((inode, mtime) of the manifest, MonthArchive); re-archiving writes a new manifest file
+
+
+def open_month(key):
+    path = _month_path(key)
+    try: stat = os.stat(os.path.join(path, 'manifest.json'))
+    except FileNotFoundError: _open_archives.pop(key, None); return None
+    version = (stat.st_ino, stat.st_mtime_ns)
+    cached = _open_archives.get(key)
+    if cached is None or cached[0] != version: cached = _open_archives[key] = (version, MonthArchive(path))
+    return cached[1]
+
+
+def months_between(start, end):
+    month = month_start(start)
+    while month <= end: yield month_key(month); month = next_month(month)
+
+
+def any_archived(start, end):
+    """ Whether any month overlapping [start, end] has been archived (a stat per month, no files opened). """
+    return any(os.path.exists(os.path.join(_month_path(key), 'manifest.json')) for key in months_between(start, end))
+
+
+def _slices(user_id, start, end):
+    """ (archive, lo, hi) for each archived month overlapping [start, end] that has rows for the user. """
+    for key in months_between(start, end):
+        archive = open_month(key)
+        if archive is None: continue
+        lo, hi = archive.user_range(user_id, start, end)
+        if hi > lo: yield archive, lo, hi
+
+
+class ArchivedLog:
+    """ A read-only stand-in for a MealLog row from the archive; `food`/`recipe` are attached by the reader. """
+    archived = True
+
+    def __init__(self, **values): self.__dict__.update(values)
+
+
+def _nullable(v, null): return None if v == null else v
+
+
+def archived_entries(user_id, start, end, exclude_ids=()):
+    """ ArchivedLog rows for `user_id` in [start, end], by date then id, skipping ids still in meal_logs. """
+    entries = []
+    for archive, lo, hi in _slices(user_id, start, end):
+        cols = {name: archive.column(name)[lo:hi].tolist() for name in (*INT_COLUMNS, *FLOAT_COLUMNS)}
+        meal_types = archive.manifest['meal_types']
+        for i, log_id in enumerate(cols['id']):
+            if log_id in exclude_ids: continue
+            created = cols['created_at'][i]
+            entries.append(ArchivedLog(
+                id=log_id, user_id=cols['user_id'][i], log_date=EPOCH + timedelta(days=cols['log_date'][i]), meal_type=meal_types[cols['meal_type'][i]],
+                food_id=_nullable(cols['food_id'][i], -1), recipe_id=_nullable(cols['recipe_id'][i], -1),
+                created_at=None if created < 0 else _EPOCH_DATETIME + timedelta(seconds=created),
+                **{name: None if cols[name][i] != cols[name][i] else cols[name][i] for name in FLOAT_COLUMNS})) # NaN != NaN
+    return entries
+
+
+def archived_daily_totals(user_id, start, end, exclude_ids=()):
+    """ {date: NutrientVector} of `user_id`'s archived entries in [start, end], summed per day with NumPy. """
+    import numpy as np
+    totals = {}
+    for archive, lo, hi in _slices(user_id, start, end):
+        days = np.asarray(archive.column('log_date')[lo:hi])
+        matrix = np.column_stack([archive.column(name)[lo:hi] for name in column_names(MealLog)]).astype(np.float64)
+        if exclude_ids:
+            keep = ~np.isin(archive.column('id')[lo:hi], list(exclude_ids))
+            days, matrix = days[keep], matrix[keep]
+        if not len(days): continue
+        unique_days, starts = np.unique(days, return_index=True) # days is sorted within a user's slice
+        sums = np.add.reduceat(np.nan_to_num(matrix), starts, axis=0)
+        for day, row in zip(unique_days.tolist(), sums.tolist()): totals[EPOCH + timedelta(days=day)] = NutrientVector(row)
+    return totals
+
+
+# --- Writing -----------------------------------------------------------------------
+
+def _query_month(month):
+    cols = [MealLog.id, MealLog.user_id, MealLog.log_date, MealLog.meal_type, MealLog.food_id, MealLog.recipe_id, MealLog.created_at]
+    return (db.session.query(*cols, *[getattr(MealLog, name) for name in FLOAT_COLUMNS])
+            .filter(MealLog.log_date >= month, MealLog.log_date < next_month(month)).order_by(MealLog.id).all())
+
+
+def _pack(rows, meal_types):
+    """ Column arrays for query rows, in INT_COLUMNS + FLOAT_COLUMNS order. """
+    import numpy as np
+    codes = {m: i for i, m in enumerate(meal_types)}
+    ids, users, dates, meals, foods, recipes, created = zip(*[row[:7] for row in rows])
+    arrays = {'id': np.array(ids, dtype='int64'), 'user_id': np.array(users, dtype='int32'),
+              'log_date': np.array([(d - EPOCH).days for d in dates], dtype='int32'),
+              'meal_type': np.array([codes[m] for m in meals], dtype='int8'),
+              'food_id': np.array([-1 if v is None else v for v in foods], dtype='int32'),
+              'recipe_id': np.array([-1 if v is None else v for v in recipes], dtype='int32'),
+              'created_at': np.array([-1 if v is None else int((v - _EPOCH_DATETIME).total_seconds()) for v in created], dtype='int64')}
+    values = np.array([row[7:] for row in rows], dtype=np.float64) # None -> NaN
+    for j, name in enumerate(FLOAT_COLUMNS): arrays[name] = values[:, j].astype('float32')
+    return arrays
+
+
+def _merge(existing, fresh, meal_types):
+    """ Combines an existing month archive with freshly packed rows; fresh rows win on id. """
+    import numpy as np
+    old_types = existing.manifest['meal_types']
+    remap = np.array([meal_types.index(m) for m in old_types], dtype='int8')
+    keep = ~np.isin(existing.column('id'), fresh['id'])
+    merged = {}
+    for name, array in fresh.items():
+        old = np.asarray(existing.column(name))[keep]
+        if name == 'meal_type': old = remap[old]
+        merged[name] = np.concatenate([old, array])
+    return merged
+
+
+def _write_month(key, arrays, meal_types, source_rows):
+    """ Writes a month to `<key>.tmp`, then swaps it in with renames; readers only ever open `<key>`. """
+    import numpy as np
+    order = np.lexsort((arrays['id'], arrays['log_date'], arrays['user_id'])) # Last key is the primary sort
+    root = archive_dir(); os.makedirs(root, exist_ok=True)
+    final, tmp, old = _month_path(key), _month_path(key) + '.tmp', _month_path(key) + '.old'
+    shutil.rmtree(tmp, ignore_errors=True); os.makedirs(tmp)
+    for name, array in arrays.items(): np.save(os.path.join(tmp, f'{name}.npy'), np.ascontiguousarray(array[order]))
+    manifest = {'version': FORMAT_VERSION, 'month': key, 'rows': int(len(order)), 'meal_types': meal_types,
+                'columns': {name: str(array.dtype) for name, array in arrays.items()},
+                'min_id': int(arrays['id'].min()), 'max_id': int(arrays['id'].max()),
+                'source_rows': source_rows, 'archived_at': datetime.utcnow().isoformat(timespec='seconds')}
+    with open(os.path.join(tmp, 'manifest.json'), 'w') as f: json.dump(manifest, f, indent=1); f.flush(); os.fsync(f.fileno())
+    if os.path.exists(final): os.replace(final, old)
+    os.replace(tmp, final)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+def _recover(key):
+    """ Puts back a previous archive left as `<key>.old` by a run that stopped between its two renames. """
+    final, old = _month_path(key), _month_path(key) + '.old'
+    if os.path.isdir(old) and not os.path.exists(final): os.replace(old, final)
+
+
+def _delete_rows(month, ids):
+    if is_partitioned() and drop_partition(month): return # The whole month's partition goes at once
+    for i in range(0, len(ids), DELETE_BATCH):
+        MealLog.query.filter(MealLog.id.in_(ids[i:i + DELETE_BATCH])).delete(synchronize_session=False)
+
+
+def archive_month(month):
+    """ Moves one month of meal_logs into the archive. Returns the number of rows moved. """
+    month, key = month_start(month), month_key(month)
+    _recover(key)
+    if is_partitioned(): lock_partition(month) # Nothing may land in the month between reading it and dropping its partition
+    rows = _query_month(month)
+    if not rows: db.session.rollback(); return 0
+    existing = open_month(key)
+    meal_types = sorted({row[3] for row in rows} | set(existing.manifest['meal_types'] if existing else ()))
+    arrays = _pack(rows, meal_types)
+    if existing is not None: arrays = _merge(existing, arrays, meal_types)
+    _write_month(key, arrays, meal_types, len(rows))
+    try: _delete_rows(month, [row[0] for row in rows]); db.session.commit()
+    except Exception: db.session.rollback(); raise # The archive already holds the rows; readers skip ids still in meal_logs
+    return len(rows)
+
+
+def archive_before(cutoff, progress=None):
+    """ Archives every whole month that ends on or before `cutoff`. Returns {month key: rows moved}. """
+    first = db.session.query(db.func.min(MealLog.log_date)).scalar()
+    moved, month = {}, month_start(first) if first else None
+    while month is not None and next_month(month) <= cutoff:
+        moved[month_key(month)] = archive_month(month)
+        if progress: progress(month_key(month), moved[month_key(month)])
+        month = next_month(month)
+    return moved
@@ -0,0 +1,382 @@
+""" Database models. """
+from datetime import datetime
+
+from sqlalchemy.types import TypeDecorator, JSON
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from .extensions import db
+from .nutrients import NUTRIENT_KEYS, column_names
+
+
+class JSONDocument(TypeDecorator):
+    """ JSON everywhere, JSONB on PostgreSQL (indexable and queryable there); the dialect module loads only when connected to it. """
+    impl = JSON
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import JSONB
+            return dialect.type_descriptor(JSONB())
+        return dialect.type_descriptor(JSON())
+
+
+class User(db.Model):
+    """ An account owning its meal logs and private foods/recipes; target_* are daily targets (None = no target). """
+    __tablename__ = 'users'
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    password_hash = db.Column(db.String(255), nullable=True) # None = cannot log in until `flask set-password`
+    is_admin = db.Column(db.Boolean, nullable=False, default=False) # May create and edit the shared catalog
+    target_calories = db.Column(db.Float, nullable=True, default=2100.0)
+    target_protein = db.Column(db.Float, nullable=True, default=100.0)
+    target_carbs = db.Column(db.Float, nullable=True)
+    target_fat = db.Column(db.Float, nullable=True)
+    target_fiber = db.Column(db.Float, nullable=True)
+    target_sugar = db.Column(db.Float, nullable=True)
+    target_calcium = db.Column(db.Float, nullable=True)
+    target_iron = db.Column(db.Float, nullable=True)
+    target_potassium = db.Column(db.Float, nullable=True)
+    target_sodium = db.Column(db.Float, nullable=True)
+    target_vit_d = db.Column(db.Float, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    def set_password(self, password): self.password_hash = generate_password_hash(password)
+    def check_password(self, password): return bool(self.password_hash) and check_password_hash(self.password_hash, password)
+    def targets(self):
+        """ {nutrient key: daily target} for the targets that are set. """
+        return {key: getattr(self, name) for key, name in zip(NUTRIENT_KEYS, column_names(User)) if getattr(self, name) is not None}
+    def __repr__(self): return f'<User {self.username}>'
+
+
+class Food(db.Model):
+    __tablename__ = 'foods'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(150), nullable=False, index=True)
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True, index=True) # None = shared catalog
+    base_unit = db.Column(db.String(50), nullable=False)
+    base_quantity = db.Column(db.Float, nullable=False, default=100.0)
+    calories = db.Column(db.Float, nullable=False, default=0)
+    protein = db.Column(db.Float, nullable=False, default=0)
+    carbs = db.Column(db.Float, nullable=False, default=0)
+    fat = db.Column(db.Float, nullable=False, default=0)
+    fiber = db.Column(db.Float, nullable=True, default=0.0) # Allow null, default 0
+    sugar = db.Column(db.Float, nullable=True, default=0.0)
+    calcium = db.Column(db.Float, nullable=True, default=0.0)
+    iron = db.Column(db.Float, nullable=True, default=0.0)
+    potassium = db.Column(db.Float, nullable=True, default=0.0)
+    sodium = db.Column(db.Float, nullable=True, default=0.0)
+    vit_d = db.Column(db.Float, nullable=True, default=0.0)
+    other_details = db.Column(db.JSON, nullable=True) # Flexible storage
+    notes = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True) # max() over the catalog tables is tracker.catalog_cache's version
+    logs = db.relationship('MealLog', backref='food', lazy='select', cascade="all, delete-orphan")
+    template_items = db.relationship('MealTemplateItem', backref='food', lazy='select', cascade='all, delete-orphan')
+    __table_args__ = ( db.UniqueConstraint('owner_id', 'name', name='uq_foods_owner_id_name'),)
+    def __repr__(self): return f'<Food {self.name}>'
+
+
+class Ingredient(db.Model):
+    __tablename__ = 'ingredients'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(150), unique=True, nullable=False, index=True)
+    category = db.Column(db.String(100), nullable=True)
+    typical_unit = db.Column(db.String(50), nullable=False, default='g')
+    unit_quantity = db.Column(db.Float, nullable=False, default=100.0)
+    calories = db.Column(db.Float, nullable=True)
+    protein = db.Column(db.Float, nullable=True)
+    carbs = db.Column(db.Float, nullable=True)
+    fat = db.Column(db.Float, nullable=True)
+    fiber = db.Column(db.Float, nullable=True)
+    sugar = db.Column(db.Float, nullable=True)
+    calcium = db.Column(db.Float, nullable=True)
+    iron = db.Column(db.Float, nullable=True)
+    potassium = db.Column(db.Float, nullable=True)
+    sodium = db.Column(db.Float, nullable=True)
+    vit_d = db.Column(db.Float, nullable=True)     # Check API unit!
+    other_details = db.Column(JSONDocument, nullable=True) # Extra nf_* values, same basis as the columns above
+    data_source = db.Column(db.String(50), nullable=True) # 'manual', 'nutritionix', 'usda_fdc'
+    api_name = db.Column(db.String(250), nullable=True) # Name returned by API
+    api_info = db.Column(db.String(100), nullable=True) # Original serving info
+    notes = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    recipes_where_used = db.relationship('RecipeIngredient', backref='ingredient', lazy='select')
+    # GIN index on other_details: added by tracker.nutrient_index.init_app() on PostgreSQL only
+    def __repr__(self): return f'<Ingredient {self.name}>'
+
+
+class IngredientNutrient(db.Model):
+    """ One numeric value of Ingredient.other_details per 100 g, kept by tracker.nutrient_index on SQLite (PostgreSQL reads the JSONB). """
+    __tablename__ = 'ingredient_nutrients'
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredients.id', ondelete='CASCADE'), primary_key=True)
+    nutrient = db.Column(db.String(64), primary_key=True)
+    amount = db.Column(db.Float, nullable=False)
+    # Covers "nutrient = ? AND amount > ? ORDER BY amount" without touching the table
+    __table_args__ = ( db.Index('ix_ingredient_nutrients_nutrient_amount', 'nutrient', 'amount', 'ingredient_id'),)
+    def __repr__(self): return f'<IngredientNutrient {self.ingredient_id} {self.nutrient}={self.amount}>'
+
+
+class Recipe(db.Model):
+    __tablename__ = 'recipes'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False, index=True)
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True, index=True) # None = shared catalog
+    description = db.Column(db.Text, nullable=True)
+    instructions = db.Column(db.Text, nullable=True)
+    meal_type_suitability = db.Column(db.String(100), nullable=True, default='Any')
+    total_calories = db.Column(db.Float, nullable=True)
+    total_protein = db.Column(db.Float, nullable=True)
+    total_carbs = db.Column(db.Float, nullable=True)
+    total_fat = db.Column(db.Float, nullable=True)
+    total_fiber = db.Column(db.Float, nullable=True)
+    total_sugar = db.Column(db.Float, nullable=True)
+    total_calcium = db.Column(db.Float, nullable=True)
+    total_iron = db.Column(db.Float, nullable=True)
+    total_potassium = db.Column(db.Float, nullable=True)
+    total_sodium = db.Column(db.Float, nullable=True)
+    total_vit_d = db.Column(db.Float, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1') # Optimistic lock; see tracker.recipe_graph.edit_with_retry
+    ingredients = db.relationship('RecipeIngredient', backref='recipe', lazy='select', cascade='all, delete-orphan')
+    sub_recipes = db.relationship('SubRecipe', foreign_keys='SubRecipe.recipe_id', backref='recipe', lazy='select', cascade='all, delete-orphan')
+    used_in = db.relationship('SubRecipe', foreign_keys='SubRecipe.sub_recipe_id', lazy='select', cascade='all, delete-orphan', overlaps='sub_recipe')
+    logs = db.relationship('MealLog', backref='recipe', lazy='select')
+    template_items = db.relationship('MealTemplateItem', backref='recipe', lazy='select', cascade='all, delete-orphan')
+    __mapper_args__ = {'version_id_col': version} # Every ORM UPDATE is "... WHERE id = ? AND version = ?" and bumps it
+    def __repr__(self): return f'<Recipe {self.name}>'
+
+
+class RecipeIngredient(db.Model):
+    __tablename__ = 'recipe_ingredients'
+    id = db.Column(db.Integer, primary_key=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id'), nullable=False, index=True)
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredients.id'), nullable=False, index=True)
+    quantity = db.Column(db.Float, nullable=False)
+    # ingredient = defined by backref from Ingredient
+    # recipe = defined by backref from Recipe
+    __table_args__ = ( db.UniqueConstraint('recipe_id', 'ingredient_id'),) # One line per ingredient; double submits fail here
+    def __repr__(self):
+        ing_name = self.ingredient.name if hasattr(self, 'ingredient') and self.ingredient else '?'
+        unit = self.ingredient.typical_unit if hasattr(self, 'ingredient') and self.ingredient else 'unit'
+        rec_id = self.recipe.id if hasattr(self, 'recipe') and self.recipe else '?'
+        return f'<{self.quantity} {unit} of {ing_name} in Recipe {rec_id}>'
+
+
+class SubRecipe(db.Model):
+    """ A recipe used inside another (sauce, dough, spice mix), scaled by `multiplier` servings; the graph stays acyclic (tracker.recipe_graph). """
+    __tablename__ = 'recipe_subrecipes'
+    id = db.Column(db.Integer, primary_key=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id'), nullable=False, index=True) # The containing recipe
+    sub_recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id'), nullable=False, index=True)
+    multiplier = db.Column(db.Float, nullable=False, default=1.0)
+    sub_recipe = db.relationship('Recipe', foreign_keys=[sub_recipe_id], lazy='select', overlaps='used_in')
+    # recipe = defined by backref from Recipe.sub_recipes
+    __table_args__ = ( db.UniqueConstraint('recipe_id', 'sub_recipe_id'), db.CheckConstraint('recipe_id <> sub_recipe_id', name='subrecipe_not_self'),)
+    def __repr__(self): return f'<SubRecipe {self.multiplier} x Recipe {self.sub_recipe_id} in Recipe {self.recipe_id}>'
+
+
+class MealLog(db.Model):
+    __tablename__ = 'meal_logs'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    log_date = db.Column(db.Date, nullable=False, index=True)
+    meal_type = db.Column(db.String(50), nullable=False)
+    food_id = db.Column(db.Integer, db.ForeignKey('foods.id'), nullable=True, index=True)
+    recipe_id =db.Column(db.Integer, db.ForeignKey('recipes.id'), nullable=True, index=True)
+    quantity_consumed = db.Column(db.Float, nullable=False)
+    calculated_calories = db.Column(db.Float, nullable=False)
+    calculated_protein = db.Column(db.Float, nullable=False)
+    calculated_carbs = db.Column(db.Float, nullable=False)
+    calculated_fat = db.Column(db.Float, nullable=False)
+    calculated_fiber = db.Column(db.Float, nullable=True)
+    calculated_sugar = db.Column(db.Float, nullable=True)
+    calculated_calcium = db.Column(db.Float, nullable=True)
+    calculated_iron = db.Column(db.Float, nullable=True)
+    calculated_potassium = db.Column(db.Float, nullable=True)
+    calculated_sodium = db.Column(db.Float, nullable=True)
+    calculated_vit_d = db.Column(db.Float, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # food defined by backref
+    # recipe defined by backref
+    # Every per-user read starts with user_id, so this index keeps it to that user's rows.
+    # Ids must never be reused once rows move to the log archive, hence AUTOINCREMENT on SQLite.
+    __table_args__ = ( db.CheckConstraint('(food_id IS NOT NULL AND recipe_id IS NULL) OR (food_id IS NULL AND recipe_id IS NOT NULL)', name='meal_log_source_check'),
+                       db.Index('ix_meal_logs_user_date_meal', 'user_id', 'log_date', 'meal_type'),
+                       {'sqlite_autoincrement': True},)
+    def __repr__(self): # Keep the adjusted repr
+        if hasattr(self, 'food') and self.food:
+            # ... repr for food ...
+             return f'<MealLog Food ID {self.id}>' # Placeholder
+        elif hasattr(self, 'recipe') and self.recipe:
+            # ... repr for recipe ...
+             return f'<MealLog Recipe ID {self.id}>' # Placeholder
+        else: return f'<MealLog ID {self.id} - Invalid>'
+
+MEAL_TYPES = ('Breakfast', 'Lunch', 'Dinner', 'Snacks') # The daily log's meal sections
+
+
+class MealTemplate(db.Model):
+    """ A saved meal ("usual breakfast") logged in one go; total_* are the sums of its items (see tracker.bulk_log). """
+    __tablename__ = 'meal_templates'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=False)
+    meal_type = db.Column(db.String(50), nullable=False) # Meal it is logged into unless another is picked
+    total_calories = db.Column(db.Float, nullable=True)
+    total_protein = db.Column(db.Float, nullable=True)
+    total_carbs = db.Column(db.Float, nullable=True)
+    total_fat = db.Column(db.Float, nullable=True)
+    total_fiber = db.Column(db.Float, nullable=True)
+    total_sugar = db.Column(db.Float, nullable=True)
+    total_calcium = db.Column(db.Float, nullable=True)
+    total_iron = db.Column(db.Float, nullable=True)
+    total_potassium = db.Column(db.Float, nullable=True)
+    total_sodium = db.Column(db.Float, nullable=True)
+    total_vit_d = db.Column(db.Float, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    items = db.relationship('MealTemplateItem', backref='template', lazy='select', cascade='all, delete-orphan', order_by='MealTemplateItem.id')
+    __table_args__ = ( db.UniqueConstraint('user_id', 'name', name='uq_meal_templates_user_id_name'),)
+    def __repr__(self): return f'<MealTemplate {self.name}>'
+
+
+class MealTemplateItem(db.Model):
+    """ One entry of a MealTemplate, with the nutrients it is logged with, as on MealLog. """
+    __tablename__ = 'meal_template_items'
+    id = db.Column(db.Integer, primary_key=True)
+    template_id = db.Column(db.Integer, db.ForeignKey('meal_templates.id', ondelete='CASCADE'), nullable=False, index=True)
+    food_id = db.Column(db.Integer, db.ForeignKey('foods.id'), nullable=True, index=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id'), nullable=True, index=True)
+    quantity_consumed = db.Column(db.Float, nullable=False)
+    calculated_calories = db.Column(db.Float, nullable=False)
+    calculated_protein = db.Column(db.Float, nullable=False)
+    calculated_carbs = db.Column(db.Float, nullable=False)
+    calculated_fat = db.Column(db.Float, nullable=False)
+    calculated_fiber = db.Column(db.Float, nullable=True)
+    calculated_sugar = db.Column(db.Float, nullable=True)
+    calculated_calcium = db.Column(db.Float, nullable=True)
+    calculated_iron = db.Column(db.Float, nullable=True)
+    calculated_potassium = db.Column(db.Float, nullable=True)
+    calculated_sodium = db.Column(db.Float, nullable=True)
+    calculated_vit_d = db.Column(db.Float, nullable=True)
+    __table_args__ = ( db.CheckConstraint('(food_id IS NOT NULL AND recipe_id IS NULL) OR (food_id IS NULL AND recipe_id IS NOT NULL)', name='meal_template_item_source_check'),)
+    def __repr__(self): return f'<MealTemplateItem {self.id} of template {self.template_id}>'
+
+
+class RecalcJob(db.Model):
+    """ Progress of a chunked MealLog recalculation (see tracker.recalc); `last_id` makes it resumable. """
+    __tablename__ = 'recalc_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    food_ids = db.Column(db.JSON, nullable=True) # None = no food filter
+    recipe_ids = db.Column(db.JSON, nullable=True)
+    start_date = db.Column(db.Date, nullable=True)
+    end_date = db.Column(db.Date, nullable=True)
+    chunk_size = db.Column(db.Integer, nullable=False, default=5000)
+    last_id = db.Column(db.Integer, nullable=False, default=0) # Keyset cursor: every MealLog.id <= last_id is done
+    rows_updated = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='pending') # pending, running, done, failed
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    def __repr__(self): return f'<RecalcJob {self.id} {self.status} @{self.last_id}>'
+
+
+class ReferenceFood(db.Model):
+    """ A per-100 g row of an offline nutrient dataset (`flask load-nutrition-db`, tracker.reference_foods), tried before Nutritionix. """
+    __tablename__ = 'reference_foods'
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(20), nullable=False) # e.g. 'usda_fdc'
+    source_id = db.Column(db.String(40), nullable=False) # The dataset's own id (FDC id)
+    name = db.Column(db.String(300), nullable=False)
+    data_type = db.Column(db.String(40), nullable=True) # e.g. 'sr_legacy_food'
+    rank = db.Column(db.SmallInteger, nullable=False, default=9) # Lower = preferred when names match equally well
+    lead_token = db.Column(db.String(64), nullable=True) # First name token: "Apples, raw" answers "apple" before "Pie, apple"
+    token_count = db.Column(db.SmallInteger, nullable=False, default=0) # Fewer tokens = more generic name
+    calories = db.Column(db.Float, nullable=True)
+    protein = db.Column(db.Float, nullable=True)
+    carbs = db.Column(db.Float, nullable=True)
+    fat = db.Column(db.Float, nullable=True)
+    fiber = db.Column(db.Float, nullable=True)
+    sugar = db.Column(db.Float, nullable=True)
+    calcium = db.Column(db.Float, nullable=True)
+    iron = db.Column(db.Float, nullable=True)
+    potassium = db.Column(db.Float, nullable=True)
+    sodium = db.Column(db.Float, nullable=True)
+    vit_d = db.Column(db.Float, nullable=True)
+    other_details = db.Column(JSONDocument, nullable=True) # Same keys as Ingredient.other_details
+    __table_args__ = ( db.UniqueConstraint('source', 'source_id', name='uq_reference_foods_source_source_id'),)
+    def __repr__(self): return f'<ReferenceFood {self.source}:{self.source_id} {self.name}>'
+
+
+class ReferenceFoodToken(db.Model):
+    """ One (normalized word, food) row of the inverted index of ReferenceFood names. """
+    __tablename__ = 'reference_food_tokens'
+    token = db.Column(db.String(64), primary_key=True)
+    food_id = db.Column(db.Integer, db.ForeignKey('reference_foods.id', ondelete='CASCADE'), primary_key=True, index=True)
+    def __repr__(self): return f'<ReferenceFoodToken {self.token} {self.food_id}>'
+
+
+class NameBucket(db.Model):
+    """ One MinHash LSH bucket of a Food/Ingredient name (tracker.name_index); rows sharing a bucket are near-duplicate candidates. """
+    __tablename__ = 'name_buckets'
+    kind = db.Column(db.String(20), primary_key=True) # 'food' or 'ingredient'
+    bucket = db.Column(db.BigInteger, primary_key=True)
+    item_id = db.Column(db.Integer, primary_key=True)
+    __table_args__ = ( db.Index('ix_name_buckets_kind_item_id', 'kind', 'item_id'),)
+    def __repr__(self): return f'<NameBucket {self.kind} {self.item_id} {self.bucket}>'
+
+
+class ScheduledJob(db.Model):
+    """ A recurring job of tracker.scheduler, run by the one worker whose conditional UPDATE claims it until `locked_until`. """
+    __tablename__ = 'scheduled_jobs'
+    name = db.Column(db.String(64), primary_key=True)
+    next_run_at = db.Column(db.DateTime, nullable=False)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    locked_by = db.Column(db.String(100), nullable=True) # host:pid of the worker running it
+    last_started_at = db.Column(db.DateTime, nullable=True)
+    last_finished_at = db.Column(db.DateTime, nullable=True)
+    last_status = db.Column(db.String(20), nullable=True) # done, failed
+    last_result = db.Column(db.Text, nullable=True) # What the run reported, or the error
+    def __repr__(self): return f'<ScheduledJob {self.name} next {self.next_run_at}>'
+
+
+class WeeklyDigest(db.Model):
+    """ A user's precomputed summary of one Monday-to-Sunday week (tracker.digests), as JSON `data` and the rendered `html`. """
+    __tablename__ = 'weekly_digests'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    week_start = db.Column(db.Date, nullable=False)
+    generated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    data = db.Column(JSONDocument, nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    __table_args__ = ( db.UniqueConstraint('user_id', 'week_start'),) # One per user and week: regenerating replaces it
+    def __repr__(self): return f'<WeeklyDigest user {self.user_id} week of {self.week_start}>'
+
+
+class DailyAdherence(db.Model):
+    """ One user's day totals and target streaks, kept in step with meal_logs by tracker.adherence (NULL flags: no target). """
+    __tablename__ = 'daily_adherence'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    log_date = db.Column(db.Date, primary_key=True)
+    calories = db.Column(db.Float, nullable=False)
+    protein = db.Column(db.Float, nullable=False)
+    calories_ok = db.Column(db.Boolean, nullable=True) # Within ADHERENCE_CALORIE_TOLERANCE of target_calories
+    protein_ok = db.Column(db.Boolean, nullable=True) # At least target_protein
+    calories_streak = db.Column(db.Integer, nullable=False, default=0)
+    protein_streak = db.Column(db.Integer, nullable=False, default=0)
+    def __repr__(self): return f'<DailyAdherence user {self.user_id} {self.log_date}>'
+
+
+class SyncChange(db.Model):
+    """ The latest change of one row synced by tracker.sync (/api/sync): a new `seq`, or a tombstone for a deletion. """
+    __tablename__ = 'sync_changes'
+    seq = db.Column(db.Integer, primary_key=True) # Never reused (AUTOINCREMENT on SQLite): client cursors point into it
+    kind = db.Column(db.String(20), nullable=False) # food, ingredient, recipe, meal_log
+    item_id = db.Column(db.Integer, nullable=False)
+    owner_id = db.Column(db.Integer, nullable=True) # Who may see it; None = shared catalog
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    __table_args__ = ( db.UniqueConstraint('kind', 'item_id'), # One row per item: a new change replaces it
+                       db.Index('ix_sync_changes_owner_id_seq', 'owner_id', 'seq'),
+                       {'sqlite_autoincrement': True},)
+    def __repr__(self): return f'<SyncChange {self.seq} {self.kind} {self.item_id}{" deleted" if self.deleted else ""}>'
@@ -0,0 +1,197 @@
+""" Near-duplicate detection for Food and Ingredient names: MinHash over character trigrams, LSH buckets.
+
+A name is normalized (lowercase words, singular, stopwords dropped, sorted, so
+"Breasts, chicken" reads as "breast chicken"), cut into character trigrams and
+reduced to a MinHash signature of NUM_PERM values. Each of BANDS bands of ROWS
+values is hashed into a bucket; names sharing any bucket are candidates, and
+candidates are confirmed by exact trigram Jaccard similarity. Two names at
+0.6 similarity share a bucket with ~90% probability, at 0.8 almost always.
+
+Buckets live in `name_buckets`, kept in sync by mapper events like
+ingredient_nutrients, so a save probes ~BANDS index entries instead of scanning
+names. `cluster()` does the same in memory for `flask dedupe-catalog`:
+signatures are computed with NumPy and only pairs sharing a bucket, whose
+signatures agree often enough, are compared.
+"""
+import zlib
+from collections import defaultdict
+from hashlib import blake2b
+from random import Random
+
+from sqlalchemy import event, inspect
+
+from .extensions import db
+from .models import Food, Ingredient, NameBucket
+from .reference_foods import tokens
+
+NUM_PERM, BANDS, ROWS = 30, 10, 3
+SIMILARITY_THRESHOLD = 0.6
+MAX_BUCKET = 200 # In batch clustering, buckets this crowded are shared words, not duplicates; they are skipped
+_PRIME = (1 << 31) - 1
+_rng = Random(20240611) # Fixed: the permutations are part of the stored bucket format
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+KINDS = {'food': Food, 'ingredient': Ingredient}
+_KIND_OF = {model: kind for kind, model in KINDS.items()}
+
+
+def normalize(name): return ' '.join(sorted(tokens(name or '')))
+
+
+def _trigrams(normalized):
+    text = f' {normalized} '
+    return {text[i:i + 3] for i in range(len(text) - 2)} if normalized else set()
+
+
+def shingles(name):
+    """ Character trigrams of the normalized name, padded so one-word names still have some. """
+    return _trigrams(normalize(name))
+
+
+def similarity(a, b):
+    """ Jaccard similarity of two shingle sets. """
+    if not a or not b: return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def _shingle_hashes(grams): return [zlib.crc32(g.encode()) for g in grams]
+
+
+def signature(grams):
+    hashes = _shingle_hashes(grams)
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS] if hashes else []
+
+
+def bucket_keys(sig):
+    """ One signed 64-bit key per band of the signature. """
+    return [int.from_bytes(blake2b(f'{band}:{sig[band * ROWS:(band + 1) * ROWS]}'.encode(), digest_size=8).digest(), 'big', signed=True)
+            for band in range(BANDS)] if sig else []
+
+
+def name_buckets(name): return bucket_keys(signature(shingles(name)))
+
+
+# --- Incremental maintenance -----------------------------------------------------------
+
+def _sync(mapper, connection, target):
+    kind, table = _KIND_OF[mapper.class_], NameBucket.__table__
+    connection.execute(table.delete().where(table.c.kind == kind, table.c.item_id == target.id))
+    keys = set(name_buckets(target.name))
+    if keys: connection.execute(table.insert(), [{'kind': kind, 'bucket': key, 'item_id': target.id} for key in keys])
+
+
+def _sync_on_update(mapper, connection, target):
+    if inspect(target).attrs.name.history.has_changes(): _sync(mapper, connection, target)
+
+
+def _drop(mapper, connection, target):
+    table = NameBucket.__table__
+    connection.execute(table.delete().where(table.c.kind == _KIND_OF[mapper.class_], table.c.item_id == target.id))
+
+
+for _model in KINDS.values():
+    event.listen(_model, 'after_insert', _sync)
+    event.listen(_model, 'after_update', _sync_on_update)
+    event.listen(_model, 'after_delete', _drop)
+
+
+def rebuild(kind):
+    """ Recomputes every bucket of one kind (after bulk loads that bypassed the ORM). """
+    model, table = KINDS[kind], NameBucket.__table__
+    db.session.execute(table.delete().where(table.c.kind == kind))
+    rows = [{'kind': kind, 'bucket': key, 'item_id': item_id} for item_id, name in db.session.query(model.id, model.name) for key in set(name_buckets(name))]
+    for i in range(0, len(rows), 10000): db.session.execute(table.insert(), rows[i:i + 10000])
+    db.session.commit()
+    return len(rows)
+
+
+# --- Save-time lookup -------------------------------------------------------------------
+
+def find_similar(model, name, *filters, exclude_id=None, threshold=SIMILARITY_THRESHOLD, limit=5):
+    """ [(similarity, row)] of `model` rows whose names are near `name`, best first. `filters` scope the
+    candidates (e.g. visible(Food)). Case-insensitive equal names score 1.0 and always come back. """
+    grams, keys = shingles(name), name_buckets(name)
+    if not keys: return []
+    candidate_ids = db.session.query(NameBucket.item_id).filter(NameBucket.kind == _KIND_OF[model], NameBucket.bucket.in_(keys))
+    query = model.query.filter(model.id.in_(candidate_ids.scalar_subquery()), *filters)
+    if exclude_id is not None: query = query.filter(model.id != exclude_id)
+    lowered, scored = name.strip().lower(), []
+    for row in query:
+        score = 1.0 if row.name.strip().lower() == lowered else similarity(grams, shingles(row.name))
+        if score >= threshold: scored.append((score, row))
+    scored.sort(key=lambda pair: (-pair[0], pair[1].name))
+    return scored[:limit]
+
+
+def exact_duplicate(similar, name):
+    """ The row among find_similar() results whose name equals `name` ignoring case, if any. """
+    lowered = name.strip().lower()
+    return next((row for _, row in similar if row.name.strip().lower() == lowered), None)
+
+
+def describe_similar(similar):
+    return ', '.join(f'"{row.name}" ({score:.0%})' for score, row in similar)
+
+
+# --- Batch clustering -------------------------------------------------------------------
+
+def _signatures(gram_sets):
+    """ MinHash signatures of many trigram sets at once: a (len(gram_sets), NUM_PERM) array; sets must be non-empty. """
+    import numpy as np
+    hashes, owners = [], []
+    for i, grams in enumerate(gram_sets):
+        h = _shingle_hashes(grams)
+        hashes.extend(h); owners.extend([i] * len(h))
+    sigs = np.empty((len(gram_sets), NUM_PERM), dtype=np.int64)
+    if not hashes: return sigs
+    hashes, owners = np.array(hashes, dtype=np.int64), np.array(owners, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+    for j, (a, b) in enumerate(_PERMUTATIONS): sigs[:, j] = np.minimum.reduceat((a * hashes + b) % _PRIME, starts)
+    return sigs
+
+
+def _buckets(sigs, scopes):
+    """ Yields the row indexes of every LSH bucket (equal scope and equal band) with 2..MAX_BUCKET rows. """
+    import numpy as np
+    for band in range(BANDS):
+        keys = scopes.copy()
+        for column in sigs[:, band * ROWS:(band + 1) * ROWS].T: keys = keys * _PRIME + column # Wraps; a collision only adds candidates
+        order = np.argsort(keys, kind='stable')
+        bounds = np.r_[0, np.flatnonzero(np.diff(keys[order])) + 1, len(order)]
+        sizes = np.diff(bounds)
+        for start in bounds[:-1][(sizes >= 2) & (sizes <= MAX_BUCKET)]:
+            end = bounds[np.searchsorted(bounds, start) + 1]
+            yield order[start:end]
+
+
+def cluster(items, threshold=SIMILARITY_THRESHOLD):
+    """ Groups `items` [(id, name, scope)] into near-duplicate clusters; only items with equal `scope` are grouped.
+    Returns a list of id lists with at least two ids each. Within an LSH bucket, pairs are first screened by the
+    share of equal signature values (the MinHash estimate of their similarity) and only plausible ones are compared. """
+    import numpy as np
+    parent = list(range(len(items)))
+    def find(i):
+        while parent[i] != i: parent[i] = parent[parent[i]]; i = parent[i]
+        return i
+    first, scope_ids = {}, {} # Equal normalized names are joined directly; one of them stands for all in the buckets
+    for i, (_, name, scope) in enumerate(items):
+        key = (scope_ids.setdefault(scope, len(scope_ids)), normalize(name))
+        if not key[1]: continue # Nothing to compare on
+        if key in first: parent[i] = first[key]
+        else: first[key] = i
+    reps = list(first.values())
+    grams = [_trigrams(normalized) for _, normalized in first]
+    sigs = _signatures(grams)
+    scopes = np.array([scope for scope, _ in first], dtype=np.int64)
+    checked, screen = set(), threshold - 0.2 # Two standard errors of the estimate at NUM_PERM 30
+    for members in _buckets(sigs, scopes):
+        block = sigs[members]
+        estimate = (block[:, None, :] == block[None, :, :]).mean(axis=2)
+        for x, y in zip(*np.nonzero(np.triu(estimate >= screen, 1))):
+            r, q = int(members[x]), int(members[y])
+            if (r, q) in checked or find(reps[r]) == find(reps[q]): continue
+            checked.add((r, q))
+            if similarity(grams[r], grams[q]) >= threshold: parent[find(reps[q])] = find(reps[r])
+    groups = defaultdict(list)
+    for i in range(len(items)): groups[find(i)].append(items[i][0])
+    return [ids for ids in groups.values() if len(ids) > 1]
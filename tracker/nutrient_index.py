@@ -0,0 +1,71 @@
+""" Database-side queries over Ingredient.other_details.
+
+On PostgreSQL the column is JSONB with a GIN index and is queried in place.
+Elsewhere (SQLite) each numeric value is mirrored into `ingredient_nutrients`,
+maintained here by mapper events, so the same query runs off a covering index.
+Amounts are compared per 100 g, so only gram-based ingredients are indexed.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from .extensions import db
+from .models import Ingredient, IngredientNutrient
+
+
+def init_app(app):
+    """ Declares the GIN index on ingredients.other_details when running on PostgreSQL.
+    Done here rather than on the model because any postgresql_* index option loads the
+    PostgreSQL dialect at import time, which SQLite deployments should not pay for. """
+    if make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name() != 'postgresql': return
+    if not any(ix.name == 'ix_ingredients_other_details' for ix in Ingredient.__table__.indexes):
+        db.Index('ix_ingredients_other_details', Ingredient.other_details, postgresql_using='gin')
+
+
+def per_100g_amounts(ingredient):
+    """ Returns {nutrient: amount per 100 g} for the numeric entries of other_details. """
+    details = ingredient.other_details
+    if not details or ingredient.typical_unit != 'g' or not ingredient.unit_quantity: return {}
+    factor = 100.0 / ingredient.unit_quantity
+    return {key: float(value) * factor for key, value in details.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)}
+
+
+def _uses_jsonb(connection): return connection.dialect.name == 'postgresql'
+
+
+def _sync_nutrients(mapper, connection, target):
+    if _uses_jsonb(connection): return
+    table = IngredientNutrient.__table__
+    connection.execute(table.delete().where(table.c.ingredient_id == target.id))
+    rows = [{'ingredient_id': target.id, 'nutrient': key, 'amount': amount} for key, amount in per_100g_amounts(target).items()]
+    if rows: connection.execute(table.insert(), rows)
+
+
+def _drop_nutrients(mapper, connection, target):
+    if _uses_jsonb(connection): return
+    table = IngredientNutrient.__table__
+    connection.execute(table.delete().where(table.c.ingredient_id == target.id))
+
+
+event.listen(Ingredient, 'after_insert', _sync_nutrients)
+event.listen(Ingredient, 'after_update', _sync_nutrients)
+event.listen(Ingredient, 'after_delete', _drop_nutrients)
+
+
+def ingredients_by_nutrient(nutrient, min_amount=None, limit=50, descending=True):
+    """ Ingredients having `nutrient` (per 100 g) above `min_amount`, sorted by amount. Runs entirely in SQL. """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        value = Ingredient.other_details[nutrient]
+        amount = db.case((db.func.jsonb_typeof(value) == 'number', value.as_float() * 100.0 / Ingredient.unit_quantity), else_=None)
+        tiebreak = Ingredient.id
+        query = db.session.query(Ingredient.id, Ingredient.name, amount.label('amount')).filter(
+            Ingredient.other_details.op('?')(db.literal(nutrient, db.String)), # GIN-indexed key lookup
+            Ingredient.typical_unit == 'g', Ingredient.unit_quantity > 0, amount.isnot(None))
+    else:
+        amount, tiebreak = IngredientNutrient.amount, IngredientNutrient.ingredient_id # Both in index order
+        query = db.session.query(Ingredient.id, Ingredient.name, amount.label('amount')).join(
+            IngredientNutrient, IngredientNutrient.ingredient_id == Ingredient.id).filter(IngredientNutrient.nutrient == nutrient)
+    if min_amount is not None: query = query.filter(amount > min_amount)
+    order = (amount.desc(), tiebreak.desc()) if descending else (amount.asc(), tiebreak.asc())
+    query = query.order_by(*order).limit(limit)
+    return [{'id': row.id, 'name': row.name, 'amount_per_100g': row.amount} for row in query]
@@ -0,0 +1,139 @@
+""" The nutrient registry and NutrientVector, the one representation used for nutrition math.
+
+Every model stores the same nutrients under its own column names: Food,
+Ingredient and ReferenceFood use the bare key, Recipe `total_<key>`, MealLog `calculated_<key>`,
+User `target_<key>`.
+`column_names(Model)` resolves them once; a NutrientVector holds the values in
+NUTRIENT_KEYS order in a flat array('d'), so adding and scaling are plain loops
+over 11 doubles instead of dict lookups. Batches of rows are summed with NumPy
+when it is installed and the batch is large enough to pay for the conversion.
+"""
+import math
+from array import array
+from functools import lru_cache
+from itertools import chain
+from operator import add, attrgetter, mul
+
+# Nutrient keys in display order; every model's nutrient columns follow it.
+NUTRIENT_KEYS = ('calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar', 'calcium', 'iron', 'potassium', 'sodium', 'vit_d')
+
+COLUMN_PREFIXES = {'Food': '', 'Ingredient': '', 'ReferenceFood': '', 'Recipe': 'total_', 'MealLog': 'calculated_', 'User': 'target_',
+                   'MealTemplate': 'total_', 'MealTemplateItem': 'calculated_'}
+
+NUMPY_MIN_ROWS = 64 # Below this, converting rows to an ndarray costs more than it saves
+
+_INDEX = {key: i for i, key in enumerate(NUTRIENT_KEYS)}
+_ZEROS = array('d', [0.0] * len(NUTRIENT_KEYS))
+_isfinite = math.isfinite
+
+
+@lru_cache(maxsize=None)
+def column_names(model):
+    """ The model's nutrient column names in NUTRIENT_KEYS order. """
+    prefix = COLUMN_PREFIXES[model.__name__]
+    return tuple(prefix + key for key in NUTRIENT_KEYS)
+
+
+def columns(model):
+    """ The model's nutrient column attributes in NUTRIENT_KEYS order, for queries. """
+    return [getattr(model, name) for name in column_names(model)]
+
+
+@lru_cache(maxsize=None)
+def _getter(model): return attrgetter(*column_names(model))
+
+
+def _clean(values, factor=1.0):
+    """ array('d') of factor * `values`, with None, NaN and infinities read as 0 (v - v == 0 only for finite v). """
+    try: return array('d', [v * factor if v is not None and v - v == 0 else 0.0 for v in values])
+    except TypeError: return array('d', [_factor(v) * factor for v in values])
+
+
+def _to_float(v):
+    try: return float(v)
+    except (TypeError, ValueError): return 0.0
+
+
+def _factor(value):
+    value = _to_float(value)
+    return value if _isfinite(value) else 0.0
+
+
+class NutrientVector:
+    """ The nutrients of one food portion, recipe, log entry or day, in NUTRIENT_KEYS order. """
+    __slots__ = ('values',)
+
+    def __init__(self, values=None):
+        self.values = array('d', _ZEROS) if values is None else _clean(values)
+
+    @classmethod
+    def _of(cls, arr):
+        vector = cls.__new__(cls); vector.values = arr
+        return vector
+
+    @classmethod
+    def from_columns(cls, obj, factor=1.0):
+        """ Reads a Food, Ingredient, Recipe or MealLog's nutrient columns, optionally scaled. """
+        return cls._of(_clean(_getter(type(obj))(obj), _factor(factor)))
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        """ Reads a {nutrient key: value} dict; missing keys are 0. """
+        return cls._of(_clean([mapping.get(key) for key in NUTRIENT_KEYS]))
+
+    @classmethod
+    def sum_rows(cls, rows, factors=None):
+        """ sum_i factors[i] * rows[i] over raw nutrient tuples (e.g. column-only query rows). """
+        rows = rows if isinstance(rows, list) else list(rows)
+        if factors is not None: factors = [_factor(f) for f in factors]
+        if len(rows) >= NUMPY_MIN_ROWS:
+            try: import numpy as np
+            except ImportError: np = None
+            if np is not None:
+                matrix = np.nan_to_num(np.array(rows, dtype=np.float64), nan=0.0, posinf=0.0, neginf=0.0)
+                total = matrix.sum(axis=0) if factors is None else np.asarray(factors) @ matrix
+                return cls._of(_clean(total.tolist()))
+        flat, n = _clean(chain.from_iterable(rows)), len(NUTRIENT_KEYS) # Row-major; flat[j::n] is nutrient j's column
+        if factors is None: return cls._of(array('d', [sum(flat[j::n]) for j in range(n)]))
+        return cls._of(array('d', [sum(map(mul, flat[j::n], factors)) for j in range(n)]))
+
+    @classmethod
+    def sum(cls, vectors):
+        total = cls()
+        for vector in vectors: total += vector
+        return total
+
+    def __getitem__(self, key): return self.values[_INDEX[key]]
+
+    def __repr__(self): return f'<NutrientVector {self.as_dict()}>'
+
+    def __eq__(self, other): return isinstance(other, NutrientVector) and self.values == other.values
+
+    def copy(self): return NutrientVector._of(array('d', self.values))
+
+    def as_dict(self): return dict(zip(NUTRIENT_KEYS, self.values))
+
+    def as_columns(self, model):
+        """ {column name: value} for `model`, e.g. MealLog(**vector.as_columns(MealLog)). """
+        return dict(zip(column_names(model), self.values))
+
+    def apply_to(self, obj):
+        """ Writes the values into `obj`'s nutrient columns. """
+        for name, value in zip(column_names(type(obj)), self.values): setattr(obj, name, value)
+
+    def scaled(self, factor): return NutrientVector._of(_clean(self.values, _factor(factor)))
+
+    def add_scaled(self, other, factor=1.0):
+        """ In place: self += factor * other. """
+        self.values = array('d', map(add, self.values, _clean(other.values, _factor(factor))))
+        return self
+
+    def __iadd__(self, other):
+        self.values = array('d', map(add, self.values, other.values))
+        return self
+
+    def __add__(self, other): return self.copy().__iadd__(other)
+
+    def __mul__(self, factor): return self.scaled(factor)
+
+    __rmul__ = __mul__
@@ -0,0 +1,61 @@
+""" Nutrition math shared by the log, recipe and planner views. """
+from datetime import datetime
+
+from . import catalog_cache
+from .extensions import db
+from .history import day_totals
+from .models import Ingredient, Recipe, RecipeIngredient
+from .nutrients import NutrientVector
+
+class RecipeCycleError(ValueError):
+    """ Raised when a recipe (indirectly) contains itself. """
+
+def calculate_recipe_nutrition(recipe_id, memo=None, _visiting=None):
+    """ Calculates and returns total estimated nutrition (a NutrientVector) for a given recipe ID:
+    its ingredients plus `multiplier` x the totals of each sub-recipe.
+    Sub-recipes are evaluated recursively through `memo` (recipe_id -> totals), so each
+    is evaluated once per recomputation; totals already in `memo` are used as-is. """
+    if memo is None: memo = {}
+    if recipe_id in memo: return memo[recipe_id]
+    visiting = _visiting if _visiting is not None else set()
+    if recipe_id in visiting: raise RecipeCycleError(f"Recipe {recipe_id} contains itself.")
+
+    recipe = db.session.get(Recipe, recipe_id)
+    if not recipe: return None
+
+    # One query for the ingredient lines; the ingredients come from the catalog cache. Lines with no valid base quantity are skipped
+    lines = db.session.query(RecipeIngredient.ingredient_id, RecipeIngredient.quantity).filter(RecipeIngredient.recipe_id == recipe_id).all()
+    ingredients = catalog_cache.get_many(Ingredient, {ingredient_id for ingredient_id, _ in lines})
+    lines = [(ingredients[ingredient_id], quantity) for ingredient_id, quantity in lines
+             if ingredient_id in ingredients and ingredients[ingredient_id].base_quantity]
+    totals = NutrientVector.sum_rows([ingredient.nutrients.values for ingredient, _ in lines],
+                                     [None if quantity is None else quantity / ingredient.base_quantity for ingredient, quantity in lines])
+
+    visiting.add(recipe_id)
+    for sr in recipe.sub_recipes:
+        sub_totals = calculate_recipe_nutrition(sr.sub_recipe_id, memo, visiting)
+        if not sub_totals: continue # Sub-recipe deleted
+        totals.add_scaled(sub_totals, sr.multiplier)
+    visiting.discard(recipe_id)
+
+    memo[recipe_id] = totals
+    return totals
+
+def stored_recipe_totals(recipe):
+    """ The recipe's saved total_* columns as a NutrientVector (None counts as 0). """
+    return NutrientVector.from_columns(recipe)
+
+def apply_recipe_totals(recipe, totals):
+    """ Writes a NutrientVector into the recipe's total_* columns. """
+    totals.apply_to(recipe)
+    recipe.updated_at = datetime.utcnow()
+
+def calculate_nutrients(food, quantity_consumed):
+    """ Calculates nutrients (a NutrientVector) for a specific food log entry; `food` is a Food or its CatalogRow. """
+    if isinstance(food, catalog_cache.CatalogRow): return food.portion(quantity_consumed)
+    if not food or not food.base_quantity or quantity_consumed is None: return NutrientVector()
+    return NutrientVector.from_columns(food, float(quantity_consumed) / float(food.base_quantity))
+
+def get_day_summary(log_date_obj, user_id):
+    """ Calculates a user's total nutrients for a given date, summed in SQL (plus the archive for archived months). """
+    return day_totals(user_id, log_date_obj).as_dict()
@@ -0,0 +1,185 @@
+""" Nutritionix natural-language API client. `requests` is imported on first lookup, not at app import.
+Calls are budgeted and their results cached across workers by tracker.quota. Each process keeps one pooled
+HTTP session (up to NUTRITIONIX_POOL_SIZE kept-alive connections) shared by its threads, so a lookup does not
+pay for a new TCP and TLS handshake. """
+import logging
+import os
+import threading
+
+from flask import current_app, flash
+
+from . import quota
+from .telemetry import CLIENT, span
+
+logger = logging.getLogger(__name__)
+
+NUTRITIONIX_API_URL_NATURAL = "https://trackapi.nutritionix.com/v2/natural/nutrients"
+_http = {'pid': None, 'session': None}
+_http_lock = threading.Lock()
+
+
+def _session():
+    """ This process's pooled requests.Session (recreated after a fork: sockets must not be shared with the parent). """
+    if _http['pid'] != os.getpid():
+        with _http_lock:
+            if _http['pid'] != os.getpid():
+                import requests
+                from requests.adapters import HTTPAdapter
+                session, size = requests.Session(), current_app.config['NUTRITIONIX_POOL_SIZE']
+                for prefix in ('https://', 'http://'): session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=size))
+                _http.update(pid=os.getpid(), session=session)
+    return _http['session']
+
+
+def _credentials():
+    app_id = current_app.config.get('NUTRITIONIX_APP_ID')
+    api_key = current_app.config.get('NUTRITIONIX_API_KEY')
+    if not app_id or not api_key:
+        logger.error('Nutritionix API credentials missing')
+        flash("API credentials not configured. Cannot lookup.", "error")
+        return None
+    return app_id, api_key
+
+
+def _post(credentials, query):
+    """ One natural-language call; returns the response's 'foods' (possibly empty). Raises requests' exceptions. """
+    url = current_app.config.get('NUTRITIONIX_API_URL') or NUTRITIONIX_API_URL_NATURAL
+    headers = {'x-app-id': credentials[0], 'x-app-key': credentials[1], 'Content-Type':'application/json'}
+    logger.debug('Querying Nutritionix', extra={'query': query})
+    with span('nutritionix', CLIENT, **{'http.url': url, 'nutritionix.query': query}) as call:
+        response = _session().post(url, headers=headers, json={"query": query}, timeout=15)
+        call.set(**{'http.status_code': response.status_code})
+    logger.debug('Nutritionix response', extra={'query': query, 'status': response.status_code})
+    response.raise_for_status()
+    data = response.json()
+    return (data or {}).get('foods') or []
+
+
+def _parse_food(food_data, ingredient_name):
+    """ One element of the response's 'foods' as a dict ready for DB/Form, normalized to 100 g where the serving weight is known. """
+    parsed = { # Store raw API values first
+        'name': food_data.get('food_name'),
+        'api_serving_qty': food_data.get('serving_qty'),
+        'api_serving_unit': food_data.get('serving_unit'),
+        'api_serving_grams': food_data.get('serving_weight_grams'),
+        'calories': food_data.get('nf_calories'),
+        'protein': food_data.get('nf_protein'),
+        'carbs': food_data.get('nf_total_carbohydrate'),
+        'fat': food_data.get('nf_total_fat'),
+        'fiber': food_data.get('nf_dietary_fiber'),
+        'sugar': food_data.get('nf_sugars'),
+        'calcium': food_data.get('nf_calcium_mg'), # Assume mg
+        'iron': food_data.get('nf_iron_mg'),      # Assume mg
+        'potassium': food_data.get('nf_potassium'),  # Assume mg
+        'sodium': food_data.get('nf_sodium'),      # Assume mg
+        'vit_d': food_data.get('nf_vitamin_d_mcg'),# Assume mcg
+        'nix_id': food_data.get('nix_item_id') or food_data.get('tag_id'),
+        'photo': (food_data.get('photo') or {}).get('thumb'),
+    }
+
+    # Collect OTHER nf_ fields into a dictionary
+    other_nutrients_dict = {}
+    exclude_keys = ['nf_calories', 'nf_protein', 'nf_total_carbohydrate', 'nf_total_fat', 'nf_dietary_fiber',
+                    'nf_sugars', 'nf_calcium_mg', 'nf_iron_mg', 'nf_potassium', 'nf_sodium', 'nf_vitamin_d_mcg',
+                    'nf_cholesterol'] # Add others to EXCLUDE from JSON here if needed
+    for key, value in food_data.items():
+        if key.startswith('nf_') and key not in exclude_keys:
+             if value is not None: other_nutrients_dict[key.replace('nf_','')] = value # Store cleaned key name
+    # Add specific non-nf fields if desired (e.g. cholesterol)
+    cholesterol = food_data.get('nf_cholesterol')
+    if cholesterol is not None: other_nutrients_dict['cholesterol'] = cholesterol
+
+    # --- Normalize to DB format (usually per 100g) ---
+    grams = parsed.get('api_serving_grams')
+    db_data = {'source': 'nutritionix', 'other_details': other_nutrients_dict or None}
+    factor = 1.0
+
+    if grams and grams > 0 and abs(grams - 100.0) > 1:
+        logger.info('Normalizing Nutritionix serving to 100 g', extra={'ingredient': ingredient_name, 'grams': grams})
+        factor = 100.0 / grams
+        db_data['base_unit'] = 'g'; db_data['unit_quantity'] = 100.0
+    elif grams and abs(grams - 100.0) <= 1:
+         db_data['base_unit'] = 'g'; db_data['unit_quantity'] = 100.0; factor = 1.0
+    else: # Cannot normalize, use API serving
+         logger.warning('Storing Nutritionix data per API serving', extra={'ingredient': ingredient_name, 'serving_qty': parsed.get('api_serving_qty'), 'serving_unit': parsed.get('api_serving_unit')})
+         db_data['base_unit'] = parsed.get('api_serving_unit', 'serving'); db_data['unit_quantity'] = parsed.get('api_serving_qty', 1.0); factor = 1.0
+
+    def safe_mult(v, f): return (float(v) * f) if v is not None else None
+    db_data['calories'] = safe_mult(parsed.get('calories'), factor)
+    db_data['protein'] = safe_mult(parsed.get('protein'), factor)
+    db_data['carbs'] = safe_mult(parsed.get('carbs'), factor)
+    db_data['fat'] = safe_mult(parsed.get('fat'), factor)
+    db_data['fiber'] = safe_mult(parsed.get('fiber'), factor)
+    db_data['sugar'] = safe_mult(parsed.get('sugar'), factor)
+    db_data['calcium'] = safe_mult(parsed.get('calcium'), factor)
+    db_data['iron'] = safe_mult(parsed.get('iron'), factor)
+    db_data['potassium'] = safe_mult(parsed.get('potassium'), factor)
+    db_data['sodium'] = safe_mult(parsed.get('sodium'), factor)
+    db_data['vit_d'] = safe_mult(parsed.get('vit_d'), factor)
+
+    db_data['name_from_api'] = parsed.get('name')
+    serving_info_grams = f" ({grams:.1f}g)" if grams is not None else ""
+    db_data['api_info_str'] = f"API: {parsed.get('api_serving_qty')} {parsed.get('api_serving_unit', '')}{serving_info_grams}".strip()
+    return db_data
+
+
+def _report(e, query, ingredient_name):
+    """ Logs and flashes a failed call. """
+    import requests
+    if isinstance(e, requests.exceptions.HTTPError):
+        logger.warning('Nutritionix HTTP error', extra={'status': e.response.status_code, 'query': query, 'body': e.response.text[:500]})
+        if e.response.status_code == 404: flash(f"'{ingredient_name}' not found by Nutritionix.", 'warning')
+        elif e.response.status_code == 429: quota.throttled(); flash("Nutritionix rate limit hit; try again in a minute.", 'warning')
+        else: flash("Nutritionix API Error (check keys/status).", "danger")
+    elif isinstance(e, requests.exceptions.RequestException):
+        logger.warning('Nutritionix connection error', extra={'query': query, 'error': str(e)}); flash("Network error reaching Nutritionix.", "error")
+    else: logger.exception('Processing Nutritionix data failed', extra={'ingredient': ingredient_name}); flash("Error processing API data.", "error")
+
+
+def get_nutritionix_ingredient_data(ingredient_name, priority=quota.INTERACTIVE):
+    """ Queries Nutritionix API, returns dict with data ready for DB/Form or None. `priority` is the quota tier
+    (quota.BATCH for bulk jobs); an earlier result for the same name is reused without a call. """
+    credentials = _credentials()
+    if credentials is None: return None
+
+    previous = quota.cached(ingredient_name)
+    if previous and previous[1]: quota.count('cache.hit'); return previous[0]
+    try: quota.acquire(priority)
+    except quota.QuotaExceeded as e:
+        if previous: quota.count('cache.stale'); flash("Nutritionix lookup limit reached; showing an earlier result.", 'info'); return previous[0]
+        flash(f"Nutritionix lookup limit reached; try again in {max(1, round(e.retry_after / 60))} min.", 'warning'); return None
+
+    query = f"100g {ingredient_name}" # Try getting per 100g directly
+    try:
+        foods = _post(credentials, query)
+        if not foods: logger.info("No 'foods' in Nutritionix response", extra={'ingredient': ingredient_name}); return None
+        db_data = _parse_food(foods[0], ingredient_name)
+        logger.debug('Nutritionix result', extra={'ingredient': ingredient_name, 'result': db_data}) # Serialized by the log thread, and only at DEBUG
+        quota.remember(ingredient_name, db_data)
+        return db_data
+    except Exception as e: _report(e, query, ingredient_name); return None
+
+
+def get_nutritionix_foods(lines, priority=quota.INTERACTIVE):
+    """ Parses many recipe lines ("2 cups rice", "1 onion") with ONE call: the endpoint splits a multi-line query into foods.
+    Returns [{'food_name', 'item', 'serving_grams', 'data'}] in the order Nutritionix recognised them ('item' is the phrase
+    it matched, 'serving_grams' the weight of the quantity on the line, 'data' per 100 g as from get_nutritionix_ingredient_data),
+    or None (with a flash) if the call could not be made. Counts as one call against the quota. """
+    credentials = _credentials()
+    if credentials is None: return None
+    if not lines: return []
+    try: quota.acquire(priority)
+    except quota.QuotaExceeded as e:
+        flash(f"Nutritionix lookup limit reached; try again in {max(1, round(e.retry_after / 60))} min.", 'warning'); return None
+
+    query = "\n".join(lines)
+    try:
+        results = []
+        for food_data in _post(credentials, query):
+            name = food_data.get('food_name') or ''
+            results.append({'food_name': name, 'item': (food_data.get('tags') or {}).get('item') or name,
+                            'serving_grams': food_data.get('serving_weight_grams'), 'data': _parse_food(food_data, name)})
+            if name: quota.remember(name, results[-1]['data'])
+        logger.info('Nutritionix batch parsed', extra={'lines': len(lines), 'foods': len(results)})
+        return results
+    except Exception as e: _report(e, query, f'{len(lines)} lines'); return None
@@ -0,0 +1,64 @@
+""" Monthly range partitions of meal_logs on PostgreSQL.
+
+Migration 5e1a7c3d9b42 turns meal_logs into a table partitioned by log_date, one
+partition per calendar month (`meal_logs_pYYYY_MM`) plus `meal_logs_default` for
+anything outside them. Queries filtered on log_date (a day, a date range) are
+pruned to the months they touch. New months have to exist before rows arrive, so
+`flask ensure-partitions` should run from cron (monthly is enough; it is
+idempotent). On other databases meal_logs is a plain table and this is a no-op.
+"""
+from datetime import date
+
+from .extensions import db
+
+
+def is_partitioned():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def month_start(d): return date(d.year, d.month, 1)
+
+
+def next_month(d): return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def partition_name(month): return f'meal_logs_p{month.year:04d}_{month.month:02d}'
+
+
+def existing_partitions():
+    """ {partition table name} currently attached to meal_logs. """
+    rows = db.session.execute(db.text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                                      "WHERE i.inhparent = 'meal_logs'::regclass"))
+    return {name for (name,) in rows}
+
+
+def ensure_partitions(months_ahead=3, today=None):
+    """ Creates the partitions for the current month and `months_ahead` after it. Returns the names created. """
+    if not is_partitioned(): return []
+    month, existing, created = month_start(today or date.today()), existing_partitions(), []
+    for _ in range(months_ahead + 1):
+        name = partition_name(month)
+        if name not in existing:
+            db.session.execute(db.text(f"CREATE TABLE {name} PARTITION OF meal_logs "
+                                       f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"))
+            created.append(name)
+        month = next_month(month)
+    db.session.commit()
+    return created
+
+
+def lock_partition(month):
+    """ Blocks writes to one month's partition until the transaction ends, if the partition exists. """
+    name = partition_name(month)
+    if db.session.execute(db.text('SELECT to_regclass(:name)'), {'name': name}).scalar() is None: return False
+    db.session.execute(db.text(f'LOCK TABLE {name} IN EXCLUSIVE MODE'))
+    return True
+
+
+def drop_partition(month):
+    """ Detaches and drops one month's partition (after `tracker.log_archive` has written it out). Caller commits. """
+    name = partition_name(month)
+    if name not in existing_partitions(): return False
+    db.session.execute(db.text(f'ALTER TABLE meal_logs DETACH PARTITION {name}'))
+    db.session.execute(db.text(f'DROP TABLE {name}'))
+    return True
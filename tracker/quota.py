@@ -0,0 +1,292 @@
+""" Nutritionix call budget shared by every worker: token buckets, priority tiers and a lookup cache.
+
+Nutritionix limits calls per key per minute and per day. Before a call a worker
+takes one token from each of two buckets (NUTRITIONIX_PER_MINUTE and
+NUTRITIONIX_PER_DAY, refilled continuously) held where all workers see them: a
+small SQLite file (QUOTA_PATH), where `BEGIN IMMEDIATE` is the cross-process
+lock, or with QUOTA_REDIS_URL a Redis-compatible server, where a Lua script
+makes the take atomic (needs the `redis` package; while the server cannot be
+reached, each worker uses the local file instead).
+
+Lookups come in two tiers. INTERACTIVE lookups (someone is waiting on a form)
+may empty the buckets. BATCH lookups (bulk jobs) must leave
+QUOTA_INTERACTIVE_RESERVE of each bucket behind, so a job cannot starve people.
+When there is no token, a lookup waits for the refill: an interactive one for up
+to QUOTA_INTERACTIVE_WAIT_S, a batch one (queued behind the refill) for up to
+QUOTA_BATCH_WAIT_S. After that it gets QuotaExceeded. A batch lookup made while
+serving a request (a pasted ingredient list) keeps the reserve but waits no
+longer than an interactive one: the worker thread is held meanwhile.
+
+Results are cached in the same store for QUOTA_CACHE_TTL_S, so each name is
+looked up once across workers. When the budget is spent, an expired cached
+result is returned instead of an error. A 429 from Nutritionix empties the
+minute bucket for every worker. Counters for granted, waited and rejected calls
+per tier, cache hits and 429s are kept in the store too. `flask quota-status`
+and /api/quota report them. check_config() rejects limits that would break the
+refill math; create_app() runs it.
+"""
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from flask import current_app, has_request_context
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE, BATCH = 'interactive', 'batch'
+TIERS = (INTERACTIVE, BATCH)
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f'Nutritionix budget used up; next call possible in {retry_after:.0f} s')
+        self.retry_after = retry_after
+
+
+def _refill(state, now, capacity, rate):
+    """ Tokens in a bucket last left at `state` (tokens, time), or full if it was never used. """
+    if state is None: return float(capacity)
+    tokens, updated = state
+    return min(float(capacity), tokens + max(0.0, now - updated) * rate)
+
+
+class SQLiteBackend:
+    """ Buckets, counters and cache in one SQLite file; a connection per thread (and per process, after a fork). """
+
+    def __init__(self, path):
+        self.path, self._local = path, threading.local()
+
+    def _db(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            local.conn, local.pid = sqlite3.connect(self.path, timeout=10, isolation_level=None), os.getpid()
+            local.conn.executescript('PRAGMA journal_mode=WAL;'
+                                     'CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL);'
+                                     'CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);'
+                                     'CREATE TABLE IF NOT EXISTS lookups (key TEXT PRIMARY KEY, data TEXT NOT NULL, stored REAL NOT NULL);')
+        return local.conn
+
+    def take(self, buckets, reserve):
+        """ Takes a token from every bucket if each keeps `reserve` of its capacity; returns 0, or the seconds to wait. """
+        conn = self._db()
+        conn.execute('BEGIN IMMEDIATE') # Write lock up front: read-refill-write is one step for all processes
+        try:
+            now = time.time()
+            states = {name: (tokens, updated) for name, tokens, updated in conn.execute('SELECT name, tokens, updated FROM buckets')}
+            levels = [_refill(states.get(name), now, capacity, rate) for name, capacity, rate in buckets]
+            wait = max(((reserve * capacity + 1 - tokens) / rate for tokens, (_, capacity, rate) in zip(levels, buckets)), default=0.0)
+            if wait <= 0:
+                conn.executemany('INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)', [(name, tokens - 1, now) for tokens, (name, _, _) in zip(levels, buckets)])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK'); raise
+        return max(wait, 0.0)
+
+    def levels(self, buckets):
+        now, states = time.time(), {name: (tokens, updated) for name, tokens, updated in self._db().execute('SELECT name, tokens, updated FROM buckets')}
+        return {name: _refill(states.get(name), now, capacity, rate) for name, capacity, rate in buckets}
+
+    def drain(self, name):
+        self._db().execute('INSERT OR REPLACE INTO buckets VALUES (?, 0, ?)', (name, time.time()))
+
+    def incr(self, name, amount=1):
+        self._db().execute('INSERT INTO counters VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = value + excluded.value', (name, amount))
+
+    def counters(self):
+        return dict(self._db().execute('SELECT name, value FROM counters ORDER BY name'))
+
+    def cache_get(self, key):
+        row = self._db().execute('SELECT data, stored FROM lookups WHERE key = ?', (key,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def cache_put(self, key, data, keep_s):
+        now, conn = time.time(), self._db()
+        conn.execute('INSERT OR REPLACE INTO lookups VALUES (?, ?, ?)', (key, json.dumps(data), now))
+        if random.random() < 0.01: conn.execute('DELETE FROM lookups WHERE stored < ?', (now - keep_s,)) # Now and then, drop what no one asked for in ages
+
+
+_TAKE_SCRIPT = """
+local t = redis.call('TIME')
+local now, reserve, wait, levels = tonumber(t[1]) + tonumber(t[2]) / 1e6, tonumber(ARGV[1]), 0, {}
+for i, key in ipairs(KEYS) do
+    local capacity, rate = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens = capacity
+    if state[1] then tokens = math.min(capacity, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate) end
+    levels[i] = tokens
+    wait = math.max(wait, (reserve * capacity + 1 - tokens) / rate)
+end
+if wait <= 0 then
+    for i, key in ipairs(KEYS) do redis.call('HSET', key, 'tokens', levels[i] - 1, 'updated', now) end
+end
+return tostring(wait)
+"""
+
+
+class RedisBackend:
+    """ The same state on a Redis-compatible server, for workers on several hosts. Keys start with `prefix`. """
+
+    def __init__(self, url, prefix='tracker:nutritionix:'):
+        import redis # Optional dependency, only needed with QUOTA_REDIS_URL
+        self.client, self.prefix = redis.Redis.from_url(url, decode_responses=True, socket_connect_timeout=2, socket_timeout=2), prefix
+        self._take = self.client.register_script(_TAKE_SCRIPT)
+        self.errors = redis.RedisError
+
+    def take(self, buckets, reserve):
+        args = [reserve] + [value for _, capacity, rate in buckets for value in (capacity, rate)]
+        return max(float(self._take(keys=[self.prefix + 'bucket:' + name for name, _, _ in buckets], args=args)), 0.0)
+
+    def levels(self, buckets):
+        now = time.time()
+        states = [self.client.hmget(self.prefix + 'bucket:' + name, 'tokens', 'updated') for name, _, _ in buckets]
+        return {name: _refill((float(s[0]), float(s[1])) if s[0] is not None else None, now, capacity, rate)
+                for (name, capacity, rate), s in zip(buckets, states)}
+
+    def drain(self, name):
+        self.client.hset(self.prefix + 'bucket:' + name, mapping={'tokens': 0, 'updated': time.time()})
+
+    def incr(self, name, amount=1):
+        self.client.hincrby(self.prefix + 'counters', name, amount)
+
+    def counters(self):
+        return {name: int(value) for name, value in sorted(self.client.hgetall(self.prefix + 'counters').items())}
+
+    def cache_get(self, key):
+        raw = self.client.get(self.prefix + 'lookup:' + key)
+        if raw is None: return None
+        entry = json.loads(raw)
+        return entry['data'], entry['stored']
+
+    def cache_put(self, key, data, keep_s):
+        self.client.set(self.prefix + 'lookup:' + key, json.dumps({'data': data, 'stored': time.time()}), ex=int(keep_s))
+
+
+class FailoverBackend:
+    """ A Redis backend that hands every call to the SQLite file while the server cannot be reached, trying the
+    server again after FAILOVER_RETRY_S. `active` is the backend the last call used. """
+    FAILOVER_RETRY_S = 30
+
+    def __init__(self, primary, fallback):
+        self.primary, self.fallback, self.active, self._retry_at = primary, fallback, primary, 0.0
+
+    def __getattr__(self, name):
+        def call(*args):
+            if time.monotonic() >= self._retry_at:
+                try:
+                    result = getattr(self.primary, name)(*args)
+                    if self.active is not self.primary: logger.warning('Quota store reachable again'); self.active = self.primary
+                    return result
+                except self.primary.errors as e:
+                    if self.active is self.primary: logger.error('Quota store unreachable; using the local quota file', extra={'error': str(e)})
+                    self.active, self._retry_at = self.fallback, time.monotonic() + self.FAILOVER_RETRY_S
+            return getattr(self.fallback, name)(*args)
+        return call
+
+
+class _Backends:
+    """ One backend per configuration and process. A Redis URL that cannot be used (no redis package, or the server
+    is down) falls back to the SQLite file, so lookups keep working (with the budget then shared only by this host's
+    workers). """
+
+    def __init__(self):
+        self._backends, self._lock = {}, threading.Lock()
+
+    def get(self):
+        config = current_app.config
+        key = (config['QUOTA_REDIS_URL'], config['QUOTA_PATH'], os.getpid())
+        backend = self._backends.get(key)
+        if backend is None:
+            with self._lock:
+                backend = self._backends.get(key)
+                if backend is None:
+                    backend = self._backends[key] = self._create(*key[:2])
+        return backend
+
+    @staticmethod
+    def _create(redis_url, path):
+        if redis_url:
+            try: return FailoverBackend(RedisBackend(redis_url), SQLiteBackend(path))
+            except ImportError: logger.error('QUOTA_REDIS_URL is set but the redis package is not installed; using the local quota file')
+        return SQLiteBackend(path)
+
+
+backends = _Backends()
+
+
+def check_config(config):
+    """ Raises ValueError naming the first budget setting the token buckets cannot work with: a limit of 0 would divide by
+    zero in the refill, and a reserve that leaves less than one token of a bucket would never grant a batch call. """
+    for key in ('NUTRITIONIX_PER_MINUTE', 'NUTRITIONIX_PER_DAY', 'QUOTA_CACHE_TTL_S'):
+        if not config[key] > 0 or config[key] == float('inf'): raise ValueError(f'{key} must be a positive number, not {config[key]!r}')
+    for key in ('QUOTA_INTERACTIVE_WAIT_S', 'QUOTA_BATCH_WAIT_S'):
+        if not 0 <= config[key] < float('inf'): raise ValueError(f'{key} must be a number of seconds >= 0, not {config[key]!r}')
+    reserve, smallest = config['QUOTA_INTERACTIVE_RESERVE'], min(config['NUTRITIONIX_PER_MINUTE'], config['NUTRITIONIX_PER_DAY'])
+    if not 0 <= reserve <= 1 - 1 / smallest: raise ValueError(f'QUOTA_INTERACTIVE_RESERVE must be a share from 0 to {1 - 1 / smallest:.3g}, not {reserve!r}')
+
+
+def buckets(config=None):
+    """ [(name, capacity, tokens per second)] of the configured limits. """
+    config = config or current_app.config
+    per_minute, per_day = config['NUTRITIONIX_PER_MINUTE'], config['NUTRITIONIX_PER_DAY']
+    return [('minute', per_minute, per_minute / 60.0), ('day', per_day, per_day / 86400.0)]
+
+
+def acquire(priority=INTERACTIVE):
+    """ Takes the token for one Nutritionix call, waiting for the refill up to the tier's limit.
+    Raises QuotaExceeded (with the wait that would have been needed) when it cannot. """
+    config, backend = current_app.config, backends.get()
+    reserve = 0.0 if priority == INTERACTIVE else config['QUOTA_INTERACTIVE_RESERVE']
+    interactive_wait = priority == INTERACTIVE or has_request_context() # Someone is waiting on the response
+    deadline = time.monotonic() + config['QUOTA_INTERACTIVE_WAIT_S' if interactive_wait else 'QUOTA_BATCH_WAIT_S']
+    waited = False
+    while True:
+        wait = backend.take(buckets(config), reserve)
+        if wait == 0:
+            backend.incr(f'{priority}.granted')
+            if waited: backend.incr(f'{priority}.waited')
+            return
+        if time.monotonic() + wait > deadline:
+            backend.incr(f'{priority}.rejected')
+            logger.warning('Nutritionix budget exhausted', extra={'priority': priority, 'retry_after_s': round(wait, 1)})
+            raise QuotaExceeded(wait)
+        waited = True
+        time.sleep(wait * random.uniform(1.0, 1.2)) # Spread the waiters out over the refill
+
+
+def lookup_key(name):
+    return ' '.join(name.lower().split())
+
+
+def cached(name):
+    """ (result, fresh) of an earlier lookup of `name`, or None. """
+    entry = backends.get().cache_get(lookup_key(name))
+    if entry is None: return None
+    data, stored = entry
+    return data, time.time() - stored < current_app.config['QUOTA_CACHE_TTL_S']
+
+
+def remember(name, data):
+    backends.get().cache_put(lookup_key(name), data, current_app.config['QUOTA_CACHE_TTL_S'] * 12) # Stale results are kept as a fallback
+
+
+def count(name): backends.get().incr(name)
+
+
+def throttled():
+    """ Nutritionix answered 429: stop every worker until the minute bucket refills. """
+    backend = backends.get()
+    backend.drain('minute'); backend.incr('upstream_429')
+
+
+def status():
+    """ Bucket levels, limits and counters, as /api/quota and `flask quota-status` show them. """
+    backend = backends.get()
+    limits = buckets()
+    return {'backend': type(getattr(backend, 'active', backend)).__name__, 'limits': {name: capacity for name, capacity, _ in limits},
+            'tokens': {name: round(tokens, 2) for name, tokens in backend.levels(limits).items()},
+            'interactive_reserve': current_app.config['QUOTA_INTERACTIVE_RESERVE'], 'counters': backend.counters()}
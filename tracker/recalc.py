@@ -0,0 +1,100 @@
+""" Recomputes MealLog.calculated_* from the current catalog, in resumable keyset chunks.
+
+Log entries snapshot their nutrients when they are logged, so fixing a Food or a
+Recipe leaves older entries with the old numbers. A RecalcJob walks meal_logs in
+id order: each chunk is one set-based UPDATE ... FROM foods (and one from recipes)
+over a bounded id range, committed on its own so no lock is held for long. The
+job row records the last id done, so an interrupted run continues where it
+stopped. After each chunk `meal_logs_changed` is sent with the touched dates.
+"""
+import logging
+
+from flask import current_app
+
+from .extensions import db
+from .models import Food, MealLog, Recipe, RecalcJob
+from .nutrients import column_names, columns
+from .signals import meal_logs_changed
+
+logger = logging.getLogger(__name__)
+
+
+def create_job(start_date=None, end_date=None, food_ids=None, recipe_ids=None, chunk_size=5000):
+    """ Records a pending job. Empty id lists mean "no entries of that kind"; None means no filter. """
+    job = RecalcJob(start_date=start_date, end_date=end_date, chunk_size=chunk_size,
+                    food_ids=sorted(set(food_ids)) if food_ids is not None else None,
+                    recipe_ids=sorted(set(recipe_ids)) if recipe_ids is not None else None)
+    db.session.add(job); db.session.commit()
+    return job
+
+
+def _job_filters(job):
+    filters = []
+    if job.start_date: filters.append(MealLog.log_date >= job.start_date)
+    if job.end_date: filters.append(MealLog.log_date <= job.end_date)
+    if job.food_ids is not None or job.recipe_ids is not None:
+        sources = []
+        if job.food_ids: sources.append(MealLog.food_id.in_(job.food_ids))
+        if job.recipe_ids: sources.append(MealLog.recipe_id.in_(job.recipe_ids))
+        filters.append(db.or_(*sources) if sources else db.false())
+    return filters
+
+
+def _food_values():
+    qty = db.func.coalesce(MealLog.quantity_consumed, 0.0)
+    return {name: db.case((Food.base_quantity > 0, db.func.coalesce(col, 0.0) * qty / Food.base_quantity), else_=0.0)
+            for name, col in zip(column_names(MealLog), columns(Food))}
+
+
+def _recipe_values():
+    qty = db.func.coalesce(MealLog.quantity_consumed, 0.0)
+    return {name: db.func.coalesce(col, 0.0) * qty for name, col in zip(column_names(MealLog), columns(Recipe))}
+
+
+def recalculate_chunk(job, filters):
+    """ Updates the next `chunk_size` matching rows after job.last_id. Returns False once nothing is left. """
+    ids = db.session.query(MealLog.id).filter(MealLog.id > job.last_id, *filters).order_by(MealLog.id).limit(job.chunk_size).subquery()
+    lo, hi = db.session.query(db.func.min(ids.c.id), db.func.max(ids.c.id)).one()
+    if hi is None: return False
+    in_chunk = (MealLog.id.between(lo, hi), *filters) # Same predicate as the select, bounded to the chunk's id range
+    updated = db.session.execute(db.update(MealLog).where(*in_chunk, MealLog.food_id == Food.id).values(**_food_values())
+                                 .execution_options(synchronize_session=False)).rowcount
+    updated += db.session.execute(db.update(MealLog).where(*in_chunk, MealLog.recipe_id == Recipe.id).values(**_recipe_values())
+                                  .execution_options(synchronize_session=False)).rowcount
+    days = set(db.session.query(MealLog.user_id, MealLog.log_date).filter(*in_chunk).distinct())
+    job.last_id, job.rows_updated, job.status = hi, job.rows_updated + updated, 'running'
+    db.session.commit()
+    if days: meal_logs_changed.send(db.session, dates={day for _, day in days}, days=days)
+    return True
+
+
+def run_job(job, progress=None):
+    """ Runs (or resumes) `job` to completion; `progress(job)` is called after every chunk. """
+    filters = _job_filters(job)
+    try:
+        while recalculate_chunk(job, filters):
+            if progress: progress(job)
+        job.status = 'done'; db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        job.status, job.error = 'failed', str(e); db.session.commit()
+        raise
+    return job
+
+
+def recalculate_logs(start_date=None, end_date=None, food_ids=None, recipe_ids=None, chunk_size=5000, progress=None):
+    """ Creates and runs a job in one go. """
+    return run_job(create_job(start_date, end_date, food_ids, recipe_ids, chunk_size), progress)
+
+
+def recalc_after_edit(food_ids=(), recipe_ids=()):
+    """ Post-edit hook: brings past logs of the edited foods/recipes up to date when RECALC_LOGS_ON_EDIT is on.
+    Runs inline after the edit's commit; if it is interrupted the job row stays 'running' for `flask recalc-logs --resume`. """
+    config = current_app.config
+    if not config.get('RECALC_LOGS_ON_EDIT') or not (food_ids or recipe_ids): return None
+    try: return recalculate_logs(food_ids=list(food_ids), recipe_ids=list(recipe_ids), chunk_size=config.get('RECALC_CHUNK_SIZE', 5000))
+    except Exception: logger.exception('Recalculating logs after an edit failed'); return None
+
+
+def describe(job):
+    return f"job {job.id}: {job.status}, {job.rows_updated} rows updated, last id {job.last_id}"
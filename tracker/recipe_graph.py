@@ -0,0 +1,145 @@
+""" The recipe DAG formed by SubRecipe rows: cycle checks, ancestor-only total recomputation and race-free edits.
+
+When a recipe changes, only it and the recipes that (transitively) include it
+can have stale totals. Those are recomputed children-first, with the stored
+totals of every untouched sub-recipe seeding the memo, so each affected recipe
+is evaluated exactly once and nothing else is re-read. Everything is written
+through the session; the caller's single commit makes the whole chain atomic.
+
+Concurrent edits of one recipe are made safe by Recipe.version: each totals
+write is a single "UPDATE ... WHERE id = ? AND version = ?", so a transaction
+that computed totals from an ingredient set another one has since changed
+matches no row. `edit_with_retry` rolls such an edit back and runs it again on
+fresh rows; uq_recipe_ingredients_recipe_id turns a concurrent double submit
+into the same kind of retry, which then finds the line already there.
+"""
+import logging
+import random
+import time
+from collections import defaultdict
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+
+from .extensions import db
+from .models import Recipe, RecipeIngredient, SubRecipe
+from .nutrition import RecipeCycleError, calculate_recipe_nutrition, stored_recipe_totals, apply_recipe_totals
+
+EDIT_ATTEMPTS = 5
+logger = logging.getLogger(__name__)
+
+
+def load_edges():
+    """ One query for the whole graph: (children, parents) adjacency maps. """
+    children, parents = defaultdict(list), defaultdict(set)
+    for parent_id, child_id, multiplier in db.session.query(SubRecipe.recipe_id, SubRecipe.sub_recipe_id, SubRecipe.multiplier):
+        children[parent_id].append((child_id, multiplier))
+        parents[child_id].add(parent_id)
+    return children, parents
+
+
+def descendants(recipe_id, children):
+    seen, stack = set(), [recipe_id]
+    while stack:
+        for child_id, _ in children.get(stack.pop(), ()):
+            if child_id not in seen: seen.add(child_id); stack.append(child_id)
+    return seen
+
+
+def ancestors(recipe_id, parents):
+    seen, stack = set(), [recipe_id]
+    while stack:
+        for parent_id in parents.get(stack.pop(), ()):
+            if parent_id not in seen: seen.add(parent_id); stack.append(parent_id)
+    return seen
+
+
+def creates_cycle(recipe_id, sub_recipe_id, children):
+    """ Would adding `sub_recipe_id` inside `recipe_id` make a recipe contain itself? """
+    return recipe_id == sub_recipe_id or recipe_id in descendants(sub_recipe_id, children)
+
+
+def add_sub_recipe(recipe, sub_recipe, multiplier):
+    """ Links `sub_recipe` into `recipe` and recomputes the affected totals; returns their ids. Caller commits. """
+    children, _ = load_edges()
+    if creates_cycle(recipe.id, sub_recipe.id, children):
+        raise RecipeCycleError(f'"{sub_recipe.name}" already contains "{recipe.name}".')
+    link = SubRecipe(recipe_id=recipe.id, sub_recipe_id=sub_recipe.id, multiplier=multiplier)
+    db.session.add(link); db.session.flush()
+    return recompute_with_ancestors(recipe.id)
+
+
+def affected_in_topological_order(recipe_ids, children, parents):
+    """ `recipe_ids` and all their ancestors, ordered so every recipe comes after its sub-recipes. """
+    affected = set(recipe_ids)
+    for rid in recipe_ids: affected |= ancestors(rid, parents)
+    pending = {rid: sum(1 for child_id, _ in children.get(rid, ()) if child_id in affected) for rid in affected} # Affected sub-recipes not yet placed
+    ready = sorted(rid for rid, n in pending.items() if n == 0)
+    order = []
+    while ready:
+        rid = ready.pop()
+        order.append(rid)
+        for parent_id in parents.get(rid, ()):
+            if parent_id in pending:
+                pending[parent_id] -= 1
+                if pending[parent_id] == 0: ready.append(parent_id)
+    if len(order) != len(affected): raise RecipeCycleError('Recipe graph contains a cycle.')
+    return order
+
+
+def recompute_with_ancestors(*recipe_ids):
+    """ Recomputes the given recipes and every recipe that includes them, children first.
+    Returns the recomputed ids in the order they were evaluated. Caller commits. """
+    children, parents = load_edges()
+    order = affected_in_topological_order([rid for rid in recipe_ids if rid is not None], children, parents)
+    if not order: return []
+    affected = set(order)
+    recipes = {r.id: r for r in Recipe.query.filter(Recipe.id.in_(affected))}
+    untouched = {child_id for rid in order for child_id, _ in children.get(rid, ()) if child_id not in affected}
+    memo = {r.id: stored_recipe_totals(r) for r in Recipe.query.filter(Recipe.id.in_(untouched))} if untouched else {}
+    for rid in order:
+        recipe = recipes.get(rid)
+        if recipe is None: continue # Deleted in this transaction
+        db.session.expire(recipe, ['sub_recipes']) # Pick up links added/removed in this transaction (ingredient lines are queried)
+        apply_recipe_totals(recipe, calculate_recipe_nutrition(rid, memo))
+    return order
+
+
+def _lost_race(error):
+    """ Whether `error` means a concurrent transaction got there first: a recipe version moved on, the same line was
+    inserted, SQLite's write lock was taken, or PostgreSQL aborted a serialization failure or deadlock. """
+    if isinstance(error, (StaleDataError, IntegrityError)): return True
+    return 'locked' in str(error.orig) or getattr(error.orig, 'pgcode', None) in ('40001', '40P01')
+
+
+def edit_with_retry(operation, attempts=EDIT_ATTEMPTS):
+    """ Runs `operation()` and commits, returning its result. When a concurrent edit wins the race the transaction is
+    rolled back and the whole operation runs again on fresh rows (after a short random pause), up to `attempts` times. """
+    for attempt in range(1, attempts + 1):
+        try:
+            result = operation()
+            db.session.commit()
+            return result
+        except (StaleDataError, IntegrityError, OperationalError) as e:
+            db.session.rollback()
+            if attempt == attempts or not _lost_race(e): raise
+            logger.info('Recipe edit conflict, retrying', extra={'attempt': attempt, 'error': type(e).__name__})
+            time.sleep(random.uniform(0, 0.005 * 2 ** attempt))
+
+
+def add_ingredient(recipe_id, ingredient_id, quantity):
+    """ Adds an ingredient line and recomputes the affected totals; returns their ids, or None (nothing changed) if the
+    recipe already has that ingredient. Caller commits, normally through edit_with_retry. """
+    if RecipeIngredient.query.filter_by(recipe_id=recipe_id, ingredient_id=ingredient_id).first(): return None
+    db.session.add(RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id, quantity=quantity)); db.session.flush()
+    return recompute_with_ancestors(recipe_id)
+
+
+def remove_ingredient(recipe_ingredient_id):
+    """ Deletes an ingredient line and recomputes the affected totals; returns their ids, or None if the line is gone. Caller commits. """
+    line = db.session.get(RecipeIngredient, recipe_ingredient_id)
+    if line is None: return None
+    recipe_id = line.recipe_id
+    deleted = db.session.execute(db.delete(RecipeIngredient).where(RecipeIngredient.id == line.id)).rowcount
+    if not deleted: return None # A concurrent edit deleted it after we read it
+    return recompute_with_ancestors(recipe_id)
@@ -0,0 +1,220 @@
+""" "Paste a recipe": a whole ingredient list added to a recipe in one edit.
+
+Each non-empty line ("2 cups cooked rice", "1 1/2 tbsp olive oil, divided",
+"3 cloves garlic") is split into an amount, a unit and a name. Names are
+matched against existing ingredients first, all lines at once: one NameBucket
+query for every line's buckets and one query for the candidate rows, scored
+like name_index.find_similar. Lines that are still unmatched and given by mass
+are looked up in the local reference foods (or an earlier Nutritionix result).
+Everything else goes to Nutritionix in ONE natural-language call, with the
+lines joined by newlines (the endpoint splits a multi-food query itself). That
+call also gives the weight of "1 onion" or "2 cups", so lines in count or volume
+units can be added to ingredients kept per gram.
+
+The writes are a single edit (recipe_graph.edit_with_retry). The new
+ingredients are added together through the ORM, so the mapper events keeping
+the name and nutrient indexes current still run; on PostgreSQL that is one
+multi-row INSERT ... RETURNING, while SQLite (which cannot return the ids of a
+multi-row insert in order) gets one statement per new ingredient. All the
+recipe_ingredients rows follow in one executemany, and the recipe and the
+recipes using it are recomputed once. Lines naming the same ingredient are merged; ingredients the
+recipe already has are left alone, as with a single add.
+"""
+import logging
+import re
+from collections import namedtuple
+
+from . import quota
+from .extensions import db
+from .models import Ingredient, NameBucket, RecipeIngredient
+from .name_index import name_buckets, shingles, similarity
+from .nutrients import NUTRIENT_KEYS, column_names
+from .nutritionix import get_nutritionix_foods
+from .recipe_graph import edit_with_retry, recompute_with_ancestors
+from .reference_foods import lookup, tokens
+
+logger = logging.getLogger(__name__)
+
+MAX_LINES = 60
+MATCH_THRESHOLD = 0.75 # Stricter than the "similar name" warning: a match here is used without asking
+PAIR_THRESHOLD = 0.3 # Pairing Nutritionix foods to lines when it did not return exactly one food per line
+UNITS = {'g': ('g', 1.0), 'kg': ('g', 1000.0), 'mg': ('g', 0.001), 'oz': ('g', 28.3495), 'lb': ('g', 453.592), # unit -> (base, factor)
+         'ml': ('ml', 1.0), 'l': ('ml', 1000.0), 'tsp': ('ml', 4.92892), 'tbsp': ('ml', 14.7868), 'cup': ('ml', 236.588)}
+ALIASES = {'gram': 'g', 'gr': 'g', 'kilogram': 'kg', 'kilo': 'kg', 'milligram': 'mg', 'ounce': 'oz', 'pound': 'lb', 'lbs': 'lb',
+           'milliliter': 'ml', 'millilitre': 'ml', 'liter': 'l', 'litre': 'l', 'teaspoon': 'tsp', 'tablespoon': 'tbsp', 'tbs': 'tbsp', 'tbl': 'tbsp'}
+COUNT_UNITS = {'piece', 'pc', 'clove', 'slice', 'can', 'pinch', 'bunch', 'stalk', 'sprig', 'handful', 'head', 'fillet', 'scoop', 'serving'}
+UNITLESS = {'piece', 'pc', 'each', 'unit', 'item', 'whole', 'serving'} # An ingredient counted in these takes "2 eggs" as 2
+FRACTIONS = {'½': 0.5, '⅓': 1 / 3, '⅔': 2 / 3, '¼': 0.25, '¾': 0.75, '⅛': 0.125}
+_NUMBER = r'\d+\s*/\s*\d+|\d+(?:[.,]\d+)?|[½⅓⅔¼¾⅛]'
+_AMOUNT = re.compile(rf'^((?:{_NUMBER})(?:\s*(?:{_NUMBER}))?)(?:\s*(?:-|–|to)\s*((?:{_NUMBER})(?:\s*(?:{_NUMBER}))?))?\s*')
+
+Line = namedtuple('Line', 'text quantity unit name')
+
+
+def _number(text):
+    """ '1 1/2', '1½', '0,5', '¾' -> float. """
+    total = 0.0
+    for part in re.findall(_NUMBER, text):
+        if part in FRACTIONS: total += FRACTIONS[part]
+        elif '/' in part:
+            numerator, denominator = (float(p) for p in part.split('/'))
+            total += numerator / denominator if denominator else 0.0
+        else: total += float(part.replace(',', '.'))
+    return total
+
+
+def canonical_unit(word):
+    """ 'Tablespoons' -> 'tbsp', 'cloves' -> 'clove'; None if `word` is not a unit. """
+    word = (word or '').lower().rstrip('.')
+    if word in UNITS or word in COUNT_UNITS: return word
+    if word in ALIASES: return ALIASES[word]
+    singular = next(iter(tokens(word)), word)
+    singular = ALIASES.get(singular, singular)
+    return singular if singular in UNITS or singular in COUNT_UNITS else None
+
+
+def parse_line(text):
+    """ One pasted line as a Line, or None for blank lines and headings ("For the sauce:"). No amount reads as 1. """
+    text = text.strip().lstrip('-*•·').strip()
+    if not text or text.endswith(':'): return None
+    quantity, rest = 1.0, text
+    amount = _AMOUNT.match(text)
+    if amount:
+        quantity = _number(amount.group(1))
+        if amount.group(2): quantity = (quantity + _number(amount.group(2))) / 2 # "2-3 cloves": the middle of the range
+        rest = text[amount.end():]
+    unit, words = None, rest.split(None, 1)
+    if words and canonical_unit(words[0]):
+        unit, rest = canonical_unit(words[0]), words[1] if len(words) > 1 else ''
+    name = re.sub(r'\([^)]*\)', ' ', rest).split(',')[0] # Notes: "(about 200 g)", ", finely chopped"
+    name = re.sub(r'^of\s+', '', ' '.join(name.split()), flags=re.I)
+    return Line(text, quantity, unit, name[:150]) if name and quantity > 0 else None
+
+
+def parse(text):
+    """ ([Line], [(line text, reason)]) for the pasted `text`. """
+    lines, skipped = [], []
+    for raw in (text or '').splitlines():
+        line = parse_line(raw)
+        if line is None:
+            if raw.strip() and not raw.strip().endswith(':'): skipped.append((raw.strip(), 'no ingredient name'))
+        elif len(lines) >= MAX_LINES: skipped.append((line.text, f'more than {MAX_LINES} lines'))
+        else: lines.append(line)
+    return lines, skipped
+
+
+def convert(line, typical_unit, grams=None):
+    """ The line's amount in `typical_unit` (what RecipeIngredient.quantity counts), or None when it cannot be converted.
+    `grams` is the weight of the whole line where Nutritionix gave one. """
+    target_unit = canonical_unit(typical_unit) or (typical_unit or '').lower()
+    target, given = UNITS.get(target_unit), UNITS.get(line.unit)
+    if target and given and target[0] == given[0]: return line.quantity * given[1] / target[1]
+    if line.unit == target_unit or (line.unit is None and target_unit in UNITLESS): return line.quantity
+    if grams and target and target[0] == 'g': return grams / target[1]
+    return None
+
+
+def match_existing(lines):
+    """ {line index: Ingredient} for lines whose name matches an existing ingredient: equal ignoring case, or at least
+    MATCH_THRESHOLD similar. Two queries for all the lines together. """
+    keys = {i: name_buckets(line.name) for i, line in enumerate(lines)}
+    every_key = {key for line_keys in keys.values() for key in line_keys}
+    if not every_key: return {}
+    candidate_ids = db.session.query(NameBucket.item_id).filter(NameBucket.kind == 'ingredient', NameBucket.bucket.in_(every_key))
+    candidates = [(ingredient, shingles(ingredient.name), set(name_buckets(ingredient.name)))
+                  for ingredient in Ingredient.query.filter(Ingredient.id.in_(candidate_ids.scalar_subquery()))]
+    matches = {}
+    for i, line in enumerate(lines):
+        line_shingles, lowered, line_keys, best = shingles(line.name), line.name.lower(), set(keys[i]), (0.0, None)
+        for ingredient, ingredient_shingles, ingredient_keys in candidates:
+            if not line_keys & ingredient_keys: continue
+            score = 1.0 if ingredient.name.strip().lower() == lowered else similarity(line_shingles, ingredient_shingles)
+            if score > best[0]: best = (score, ingredient)
+        if best[1] is not None and best[0] >= MATCH_THRESHOLD: matches[i] = best[1]
+    return matches
+
+
+def _pair(lines, foods):
+    """ {position in `lines`: food} for the foods of one Nutritionix call. One food per line is taken in order;
+    otherwise ("salt and pepper" gives two) each line gets its most similar unclaimed food. """
+    if len(foods) == len(lines): return dict(enumerate(foods))
+    scored = sorted(((similarity(shingles(line.name), shingles(food['item'])), i, j) for i, line in enumerate(lines) for j, food in enumerate(foods)), reverse=True)
+    pairs, used = {}, set()
+    for score, i, j in scored:
+        if score >= PAIR_THRESHOLD and i not in pairs and j not in used: pairs[i] = foods[j]; used.add(j)
+    return pairs
+
+
+def _new_ingredient(name, data):
+    values = dict(zip(column_names(Ingredient), (data.get(key) for key in NUTRIENT_KEYS)))
+    return Ingredient(name=name, typical_unit=data.get('base_unit') or 'g', unit_quantity=data.get('unit_quantity') or 100.0,
+                      other_details=data.get('other_details'), data_source=data.get('source'), api_name=(data.get('name_from_api') or '')[:250] or None,
+                      api_info=(data.get('api_info_str') or '')[:100] or None, notes='Added from a pasted ingredient list', **values)
+
+
+def plan(recipe_id, lines, priority=quota.INTERACTIVE):
+    """ Resolves every line to an existing ingredient or the data of a new one, plus the quantity to add.
+    Returns ([(line, ingredient id or None, new ingredient data or None, quantity)], [(line text, reason)]). Reads only;
+    at most one Nutritionix call. """
+    present = {i for (i,) in db.session.query(RecipeIngredient.ingredient_id).filter_by(recipe_id=recipe_id)}
+    matches, resolved, skipped, pending = match_existing(lines), {}, [], []
+    for i, line in enumerate(lines):
+        ingredient = matches.get(i)
+        if ingredient is not None:
+            if ingredient.id in present: skipped.append((line.text, f'{ingredient.name} is already in the recipe')); continue
+            quantity = convert(line, ingredient.typical_unit)
+            if quantity is not None: resolved[i] = (line, ingredient.id, None, quantity); continue
+            if UNITS.get(canonical_unit(ingredient.typical_unit), ('',))[0] != 'g': # A weight from Nutritionix would not help either
+                skipped.append((line.text, f'cannot convert {line.unit or "a count"} to {ingredient.typical_unit}')); continue
+        elif line.unit in UNITS and UNITS[line.unit][0] == 'g': # By weight: no need to ask Nutritionix what it weighs
+            previous = quota.cached(line.name)
+            data = lookup(line.name) or (previous[0] if previous and previous[1] else None)
+            if data and convert(line, data.get('base_unit')) is not None: resolved[i] = (line, None, data, convert(line, data.get('base_unit'))); continue
+        pending.append(i)
+
+    foods = get_nutritionix_foods([lines[i].text for i in pending], priority) if pending else []
+    paired = _pair([lines[i] for i in pending], foods or [])
+    for position, i in enumerate(pending):
+        line, ingredient, food = lines[i], matches.get(i), paired.get(position)
+        if food is None: skipped.append((line.text, 'not recognised' if foods is not None else 'lookup unavailable')); continue
+        if ingredient is not None: quantity, data = convert(line, ingredient.typical_unit, food['serving_grams']), None
+        else: quantity, data = convert(line, food['data'].get('base_unit'), food['serving_grams']), food['data']
+        if quantity is None or quantity <= 0:
+            unit = ingredient.typical_unit if ingredient is not None else data.get('base_unit')
+            skipped.append((line.text, f'cannot convert {line.unit or "a count"} to {unit}')); continue
+        resolved[i] = (line, ingredient.id if ingredient is not None else None, data, quantity)
+    return [resolved[i] for i in sorted(resolved)], skipped
+
+
+def _apply(recipe_id, resolved):
+    """ Writes the resolved lines: new ingredients, then every line, then one recompute. Returns (changed recipe ids,
+    created ingredient names, {ingredient id: quantity} added). Runs inside edit_with_retry. """
+    new = {}
+    for line, ingredient_id, data, _ in resolved:
+        if ingredient_id is None: new.setdefault(line.name.lower(), (line.name, data))
+    existing = {name.lower(): i for i, name in db.session.query(Ingredient.id, Ingredient.name).filter(db.func.lower(Ingredient.name).in_(list(new)))} if new else {}
+    created = [_new_ingredient(name, data) for key, (name, data) in new.items() if key not in existing] # Others were added meanwhile
+    db.session.add_all(created); db.session.flush()
+    existing.update((ingredient.name.lower(), ingredient.id) for ingredient in created)
+
+    quantities = {}
+    for line, ingredient_id, _, quantity in resolved:
+        ingredient_id = ingredient_id if ingredient_id is not None else existing[line.name.lower()]
+        quantities[ingredient_id] = quantities.get(ingredient_id, 0.0) + quantity
+    present = {i for (i,) in db.session.query(RecipeIngredient.ingredient_id).filter_by(recipe_id=recipe_id)}
+    added = {i: quantity for i, quantity in quantities.items() if i not in present}
+    if not added: return [], [ingredient.name for ingredient in created], added
+    db.session.execute(db.insert(RecipeIngredient), [{'recipe_id': recipe_id, 'ingredient_id': i, 'quantity': q} for i, q in added.items()])
+    return recompute_with_ancestors(recipe_id), [ingredient.name for ingredient in created], added
+
+
+def add_pasted(recipe_id, text, priority=quota.INTERACTIVE):
+    """ Adds the pasted ingredient list to the recipe and commits. Returns {'changed': recomputed recipe ids, 'created':
+    names of new ingredients, 'added': number of lines written, 'skipped': [(line text, reason)]}. """
+    lines, skipped = parse(text)
+    resolved, unresolved = plan(recipe_id, lines, priority)
+    skipped += unresolved
+    changed, created, added = edit_with_retry(lambda: _apply(recipe_id, resolved)) if resolved else ([], [], {})
+    logger.info('Pasted ingredient list added', extra={'recipe_id': recipe_id, 'lines': len(lines), 'added': len(added),
+                                                       'new_ingredients': len(created), 'skipped': len(skipped)})
+    return {'changed': changed, 'created': created, 'added': len(added), 'skipped': skipped}
@@ -0,0 +1,141 @@
+""" Nutrient-gap recommender: "what should I eat to close the rest of today's targets?"
+
+Every Food, Ingredient and Recipe is held in memory as one row of a dense
+nutrient matrix (per base portion: Food.base_quantity, Ingredient.unit_quantity,
+one Recipe serving). Scoring is a handful of vectorized NumPy operations over
+that matrix, so a query over 100k items takes a few milliseconds. The matrix
+holds every user's private foods and recipes too; each query masks out the
+rows owned by someone else.
+
+For each item the best-fit portion p minimizes the relative squared shortfall
+sum_j (1 - p * d_j / gap_j)^2 over the goal nutrients, capped so the portion
+stays within the remaining calories and a sane maximum size. The score is the
+share of the gap that portion closes (overshooting a goal is not penalized).
+
+The matrix is rebuilt lazily: immediately after a local commit that touched the
+catalog (see tracker.signals), and otherwise once it is older than
+RECOMMENDER_MAX_AGE_S, so writes from other workers are picked up too.
+"""
+import threading
+import time
+
+import numpy as np
+from flask import current_app
+
+from .extensions import db
+from .models import Food, Ingredient, Recipe
+from .nutrients import NUTRIENT_KEYS, columns
+from .signals import catalog_changed
+
+KINDS = ('food', 'ingredient', 'recipe')
+MAX_PORTIONS = {'food': 3.0, 'ingredient': 3.0, 'recipe': 2.0} # Multiples of the base portion / servings
+_CAL = NUTRIENT_KEYS.index('calories')
+
+
+class CatalogSnapshot:
+    """ Immutable arrays describing the whole catalog at one point in time. """
+    __slots__ = ('matrix', 'kinds', 'ids', 'owners', 'names', 'units', 'unit_qty', 'max_portion', 'built_at')
+
+    def __init__(self, rows):
+        matrix = np.array([r[5] for r in rows], dtype=np.float64).reshape(len(rows), len(NUTRIENT_KEYS))
+        np.nan_to_num(matrix, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+        self.matrix = np.asfortranarray(matrix) # Column-major: scoring reads whole nutrient columns
+        self.kinds = np.array([KINDS.index(r[0]) for r in rows], dtype=np.int8)
+        self.ids = np.array([r[1] for r in rows], dtype=np.int64)
+        self.owners = np.array([-1 if r[4] is None else r[4] for r in rows], dtype=np.int64) # -1 = shared
+        self.names = [r[2] for r in rows]
+        self.units = [r[3][0] for r in rows]
+        self.unit_qty = np.array([r[3][1] for r in rows], dtype=np.float64)
+        self.max_portion = np.array([MAX_PORTIONS[kind] for kind in KINDS])[self.kinds]
+        self.built_at = time.monotonic()
+
+
+def _load_rows(only=None):
+    """ One column-only query per table; no ORM objects are materialized. `only` ({kind: ids}) limits the load to those rows. """
+    def scoped(kind, model, query):
+        if only is None: return query
+        return query.filter(model.id.in_(only[kind])) if only.get(kind) else ()
+    rows = []
+    for r in scoped('food', Food, db.session.query(Food.id, Food.name, Food.base_unit, Food.base_quantity, Food.owner_id, *columns(Food)).filter(Food.base_quantity > 0)):
+        rows.append(('food', r[0], r[1], (r[2], r[3]), r[4], [v or 0.0 for v in r[5:]]))
+    for r in scoped('ingredient', Ingredient, db.session.query(Ingredient.id, Ingredient.name, Ingredient.typical_unit, Ingredient.unit_quantity, *columns(Ingredient)).filter(Ingredient.unit_quantity > 0)):
+        rows.append(('ingredient', r[0], r[1], (r[2], r[3]), None, [v or 0.0 for v in r[4:]]))
+    for r in scoped('recipe', Recipe, db.session.query(Recipe.id, Recipe.name, Recipe.owner_id, *columns(Recipe)).filter(Recipe.total_calories.isnot(None))):
+        rows.append(('recipe', r[0], r[1], ('serving', 1.0), r[2], [v or 0.0 for v in r[3:]]))
+    return rows
+
+
+class NutrientMatrix:
+    """ Per-process holder of the current CatalogSnapshot, rebuilt under a lock once stale. """
+
+    def __init__(self):
+        self._snapshot = None
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def invalidate(self, *args, **kwargs): self._stale = True
+
+    def snapshot(self):
+        snap = self._snapshot
+        max_age = current_app.config.get('RECOMMENDER_MAX_AGE_S', 300)
+        if snap is not None and not self._stale and time.monotonic() - snap.built_at < max_age: return snap
+        with self._lock:
+            if self._snapshot is snap: # Nobody rebuilt while we waited
+                self._stale = False
+                self._snapshot = CatalogSnapshot(_load_rows())
+            return self._snapshot
+
+
+matrix = NutrientMatrix()
+catalog_changed.connect(matrix.invalidate, weak=False)
+
+
+def recommend(consumed, targets, k=10, kinds=KINDS, user_id=None):
+    """ Ranks catalog items by how well a best-fit portion closes `targets - consumed`.
+    `targets` maps nutrient keys to daily targets; 'calories' (if given) is a cap, not a goal.
+    Only shared items and those owned by `user_id` are returned. """
+    snap = matrix.snapshot()
+    if not len(snap.ids): return []
+
+    gap = np.zeros(len(NUTRIENT_KEYS))
+    for key, target in targets.items():
+        if key in NUTRIENT_KEYS and target is not None: gap[NUTRIENT_KEYS.index(key)] = float(target) - float(consumed.get(key) or 0.0)
+    goals = [j for j in range(len(NUTRIENT_KEYS)) if j != _CAL and gap[j] > 0]
+    if not goals: return []
+
+    D = snap.matrix
+    cols = [D[:, j] * (1.0 / gap[j]) for j in goals] # Share of each remaining gap covered by one base portion
+    num = np.add.reduce(cols)
+    den = np.add.reduce([c * c for c in cols])
+    cap = snap.max_portion
+    if targets.get('calories') is not None:
+        cal = D[:, _CAL]
+        cap = np.where(cal > 0, np.minimum(cap, max(gap[_CAL], 0.0) / np.where(cal > 0, cal, 1.0)), cap)
+    portion = np.clip(np.divide(num, den, out=np.zeros_like(num), where=den > 0), 0.0, cap)
+
+    shortfall = np.zeros_like(portion)
+    for c in cols:
+        miss = np.clip(1.0 - portion * c, 0.0, None)
+        shortfall += miss * miss
+    score = 1.0 - shortfall / len(goals)
+    score[portion <= 0] = -np.inf
+    allowed = [KINDS.index(kind) for kind in kinds if kind in KINDS]
+    if len(allowed) < len(KINDS): score[~np.isin(snap.kinds, allowed)] = -np.inf
+    score[(snap.owners >= 0) & (snap.owners != (-1 if user_id is None else user_id))] = -np.inf
+
+    k = max(0, min(int(k), len(score)))
+    if k == 0: return []
+    top = np.argpartition(-score, k - 1)[:k]
+    top = top[np.argsort(-score[top], kind='stable')]
+
+    results = []
+    for i in top:
+        if not np.isfinite(score[i]): break
+        p = float(portion[i])
+        kind = KINDS[snap.kinds[i]]
+        results.append({
+            'kind': kind, 'id': int(snap.ids[i]), 'name': snap.names[i], 'score': round(float(score[i]), 4),
+            'multiplier': round(p, 3), 'quantity': round(p * float(snap.unit_qty[i]), 1), 'unit': snap.units[i],
+            'nutrients': dict(zip(NUTRIENT_KEYS, (D[i] * p).tolist())),
+        })
+    return results
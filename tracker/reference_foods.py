@@ -0,0 +1,189 @@
+""" Offline nutrient dataset: loading a USDA FoodData Central CSV dump, and ranked name lookup.
+
+`flask load-nutrition-db PATH` streams food.csv and food_nutrient.csv out of an
+FDC download (the extracted directory or the .zip itself) into reference_foods,
+a batch of rows per statement and commit, so memory stays flat on multi-GB
+dumps. FDC amounts are per 100 g, the basis ingredient lookups normalize to;
+FDC nutrient numbers map onto NUTRIENT_KEYS, and a few extras onto the
+other_details keys the Nutritionix lookup produces.
+
+Names are indexed word by word in reference_food_tokens. A lookup must match
+every query word; the rarest word drives the scan (so "raw" or "cooked" never
+does) and matches are ranked by leading word, generic before branded, then name
+length, then data type.
+`add_ingredient` tries `lookup()` first and only calls Nutritionix on a miss.
+"""
+import csv
+import io
+import logging
+import os
+import re
+import zipfile
+from contextlib import contextmanager
+
+from .extensions import db
+from .models import ReferenceFood, ReferenceFoodToken
+from .nutrients import NUTRIENT_KEYS
+
+SOURCE = 'usda_fdc'
+# FDC nutrient id -> (field, priority); when a food reports several ids for a field the lowest priority wins
+FDC_NUTRIENTS = {
+    1008: ('calories', 0), 2047: ('calories', 1), 2048: ('calories', 2), # Energy (kcal), then Atwater general/specific
+    1003: ('protein', 0),
+    1005: ('carbs', 0), 1050: ('carbs', 1), # By difference, by summation
+    1004: ('fat', 0), 1085: ('fat', 1),
+    1079: ('fiber', 0),
+    2000: ('sugar', 0), 1063: ('sugar', 1),
+    1087: ('calcium', 0), 1089: ('iron', 0), 1092: ('potassium', 0), 1093: ('sodium', 0), # mg, as Nutritionix
+    1114: ('vit_d', 0), # mcg
+    1253: ('cholesterol', 0), 1258: ('saturated_fat', 0), 1090: ('magnesium', 0), 1091: ('p', 0), # other_details
+}
+DATA_TYPE_RANK = {'foundation_food': 0, 'sr_legacy_food': 1, 'survey_fndds_food': 2, 'branded_food': 3}
+DEFAULT_DATA_TYPES = ('foundation_food', 'sr_legacy_food', 'survey_fndds_food') # branded_food is millions of rows
+STOPWORDS = frozenset({'a', 'and', 'by', 'for', 'from', 'in', 'nfs', 'ns', 'of', 'or', 'the', 'to', 'with'})
+_WORD = re.compile(r'[a-z0-9]+')
+_OTHER_DETAILS = {field for field, _ in FDC_NUTRIENTS.values()} - set(NUTRIENT_KEYS)
+logger = logging.getLogger(__name__)
+
+
+def _singular(word):
+    if len(word) <= 3 or word.endswith('ss'): return word
+    if word.endswith('ies'): return word[:-3] + 'y'
+    if word.endswith('oes'): return word[:-2]
+    return word[:-1] if word.endswith('s') else word
+
+
+def tokens(text):
+    """ A name's distinct index words, in order: lowercase, singular, stopwords dropped. """
+    words = []
+    for word in _WORD.findall(text.lower()):
+        if word in STOPWORDS: continue
+        word = _singular(word)[:64]
+        if word not in words: words.append(word)
+    return words
+
+
+# --- Lookup --------------------------------------------------------------------------
+
+def search(name, limit=5):
+    """ Best ReferenceFood matches containing every word of `name`, best first. """
+    words = tokens(name)
+    if not words: return []
+    counts = dict(db.session.query(ReferenceFoodToken.token, db.func.count()).filter(ReferenceFoodToken.token.in_(words)).group_by(ReferenceFoodToken.token))
+    if len(counts) < len(words): return [] # Some word is in no name at all
+    rarest, *others = sorted(words, key=counts.get)
+    query = ReferenceFood.query.join(ReferenceFoodToken, db.and_(ReferenceFoodToken.food_id == ReferenceFood.id, ReferenceFoodToken.token == rarest))
+    for word in others:
+        other = db.aliased(ReferenceFoodToken)
+        query = query.filter(db.exists().where(other.food_id == ReferenceFood.id, other.token == word)) # Primary-key probe
+    branded = ReferenceFood.rank >= DATA_TYPE_RANK['branded_food'] # Products only when no generic food matches
+    return query.order_by((ReferenceFood.lead_token == words[0]).desc(), branded, ReferenceFood.token_count, ReferenceFood.rank, ReferenceFood.name).limit(limit).all()
+
+
+def lookup(name):
+    """ The best local match as the same dict `get_nutritionix_ingredient_data` returns, or None on a miss. """
+    matches = search(name, limit=1)
+    if not matches: return None
+    food = matches[0]
+    logger.debug('Local nutrition DB match', extra={'query': name, 'match': food.name, 'source': food.source, 'source_id': food.source_id})
+    data = {key: getattr(food, key) for key in NUTRIENT_KEYS}
+    data.update(source=food.source, base_unit='g', unit_quantity=100.0, other_details=food.other_details or None,
+                name_from_api=food.name, api_info_str=f'USDA FDC {food.source_id}, per 100 g')
+    return data
+
+
+# --- Loading -------------------------------------------------------------------------
+
+@contextmanager
+def _open_csv(path, filename):
+    """ Text stream of `filename` from an FDC download: a directory (searched recursively) or a .zip. """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            member = next((m for m in archive.namelist() if os.path.basename(m) == filename), None)
+            if member is None: raise FileNotFoundError(f'{filename} not found in {path}')
+            with archive.open(member) as raw: yield io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        return
+    for root, _, files in os.walk(path):
+        if filename in files:
+            with open(os.path.join(root, filename), encoding='utf-8', newline='') as f: yield f
+            return
+    raise FileNotFoundError(f'{filename} not found in {path}')
+
+
+def _columns(f, names):
+    """ Rows of a CSV stream reduced to the `names` columns, by header position. """
+    reader = csv.reader(f)
+    header = next(reader)
+    index = [header.index(name) for name in names]
+    for row in reader:
+        if len(row) > index[-1]: yield [row[i] for i in index]
+
+
+def clear(source=SOURCE):
+    ids = db.session.query(ReferenceFood.id).filter(ReferenceFood.source == source)
+    ReferenceFoodToken.query.filter(ReferenceFoodToken.food_id.in_(ids.scalar_subquery())).delete(synchronize_session=False)
+    ReferenceFood.query.filter(ReferenceFood.source == source).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _insert_foods(batch, loaded):
+    """ Inserts one batch of foods and their name tokens; records fdc_id -> row id in `loaded`. """
+    db.session.execute(ReferenceFood.__table__.insert(), batch)
+    ids = db.session.query(ReferenceFood.source_id, ReferenceFood.id).filter(ReferenceFood.source == SOURCE, ReferenceFood.source_id.in_([r['source_id'] for r in batch]))
+    for source_id, food_id in ids: loaded[source_id] = food_id
+    db.session.execute(ReferenceFoodToken.__table__.insert(), [{'token': token, 'food_id': loaded[r['source_id']]} for r in batch for token in tokens(r['name'])])
+    db.session.commit()
+
+
+_table = ReferenceFood.__table__
+_UPDATE_NUTRIENTS = _table.update().where(_table.c.id == db.bindparam('food_id')).values(
+    **{key: db.func.coalesce(db.bindparam(f'v_{key}'), _table.c[key]) for key in NUTRIENT_KEYS})
+_UPDATE_DETAILS = _table.update().where(_table.c.id == db.bindparam('food_id')).values(other_details=db.bindparam('v_other_details'))
+
+
+def _update_nutrients(pending):
+    """ Writes buffered {food id: {field: (priority, amount)}}; columns a food did not report keep their value. """
+    params, details = [], []
+    for food_id, fields in pending.items():
+        params.append({'food_id': food_id, **{f'v_{key}': fields[key][1] if key in fields else None for key in NUTRIENT_KEYS}})
+        extra = {key: fields[key][1] for key in _OTHER_DETAILS if key in fields}
+        if extra: details.append({'food_id': food_id, 'v_other_details': extra})
+    db.session.execute(_UPDATE_NUTRIENTS, params)
+    if details: db.session.execute(_UPDATE_DETAILS, details)
+    db.session.commit()
+
+
+def load_fdc(path, data_types=DEFAULT_DATA_TYPES, batch_size=5000, progress=None):
+    """ Replaces the FDC rows of reference_foods with the dump at `path`. Returns (foods, nutrient values) loaded.
+    `progress(stage, count)` is called after every batch. A food's nutrient rows are buffered until `batch_size`
+    foods are pending; FDC files are ordered by fdc_id, so each food is normally written once. """
+    clear(SOURCE)
+    loaded, batch = {}, []
+    with _open_csv(path, 'food.csv') as f:
+        for fdc_id, data_type, name in _columns(f, ('fdc_id', 'data_type', 'description')):
+            if data_types and data_type not in data_types: continue
+            words = tokens(name)
+            batch.append({'source': SOURCE, 'source_id': fdc_id, 'name': name[:300], 'data_type': data_type, 'rank': DATA_TYPE_RANK.get(data_type, 9),
+                          'lead_token': words[0] if words else None, 'token_count': len(words)})
+            if len(batch) >= batch_size:
+                _insert_foods(batch, loaded); batch = []
+                if progress: progress('foods', len(loaded))
+    if batch: _insert_foods(batch, loaded)
+    if progress: progress('foods', len(loaded))
+
+    pending, values = {}, 0
+    with _open_csv(path, 'food_nutrient.csv') as f:
+        for fdc_id, nutrient_id, amount in _columns(f, ('fdc_id', 'nutrient_id', 'amount')):
+            food_id = loaded.get(fdc_id)
+            field = FDC_NUTRIENTS.get(int(nutrient_id)) if food_id is not None and nutrient_id.isdigit() else None
+            if field is None or not amount: continue
+            key, priority = field
+            fields = pending.setdefault(food_id, {})
+            if key not in fields or priority < fields[key][0]: fields[key] = (priority, float(amount))
+            values += 1
+            if len(pending) >= batch_size:
+                _update_nutrients(pending); pending = {}
+                if progress: progress('nutrients', values)
+    if pending: _update_nutrients(pending)
+    if progress: progress('nutrients', values)
+    return len(loaded), values
@@ -0,0 +1,111 @@
+""" In-process scheduler for recurring background jobs, coordinated through the scheduled_jobs table.
+
+Every web worker may run a scheduler thread (started from gunicorn.conf.py's
+post_fork when SCHEDULER is on). It wakes every SCHEDULER_POLL_S and tries to
+claim each due job: an UPDATE that succeeds only while no other worker holds it
+and next_run_at has passed. The claim lapses after SCHEDULER_LEASE_S, so a
+worker that dies mid-run does not block the job for good. However many workers
+poll, each due run happens once. `flask run-jobs` runs due jobs from the
+command line (once, or with --loop as a dedicated worker process).
+
+JOBS maps a job name to its function ("module:function", imported when it
+first runs) and the config key of its interval in seconds. A job function
+takes the app and returns a short description of what it did.
+"""
+import importlib
+import logging
+import os
+import random
+import socket
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from .extensions import db
+from .models import ScheduledJob
+
+logger = logging.getLogger(__name__)
+
+JOBS = {'weekly-digests': ('tracker.digests:run_scheduled', 'DIGEST_INTERVAL_S')}
+_thread = {'pid': None}
+
+
+def _worker_id(): return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _ensure_rows(now):
+    """ Adds the scheduled_jobs rows of jobs that have never been scheduled, due at once. """
+    known = {name for (name,) in db.session.query(ScheduledJob.name)}
+    for name in JOBS.keys() - known:
+        try: db.session.add(ScheduledJob(name=name, next_run_at=now)); db.session.commit()
+        except IntegrityError: db.session.rollback() # Another worker added it first
+
+
+def claim(name, now, lease_s):
+    """ Whether this worker got `name`'s due run; if so, the job is locked for `lease_s` seconds. """
+    claimed = db.session.execute(db.update(ScheduledJob).where(
+        ScheduledJob.name == name, ScheduledJob.next_run_at <= now, db.or_(ScheduledJob.locked_until.is_(None), ScheduledJob.locked_until < now))
+        .values(locked_until=now + timedelta(seconds=lease_s), locked_by=_worker_id(), last_started_at=now)).rowcount
+    db.session.commit()
+    return claimed == 1
+
+
+def _finish(name, interval_s, status, result):
+    finished = datetime.utcnow()
+    db.session.execute(db.update(ScheduledJob).where(ScheduledJob.name == name).values(
+        next_run_at=finished + timedelta(seconds=interval_s), locked_until=None, locked_by=None,
+        last_finished_at=finished, last_status=status, last_result=(result or '')[:2000]))
+    db.session.commit()
+
+
+def run_job(app, name):
+    """ Runs job `name` now, in the caller's app context, and returns what it reported. """
+    module, _, function = JOBS[name][0].partition(':')
+    return getattr(importlib.import_module(module), function)(app)
+
+
+def run_due(app):
+    """ Runs every due job this worker can claim. Returns {name: status}. Needs an app context. """
+    config, now, ran = app.config, datetime.utcnow(), {}
+    _ensure_rows(now)
+    for name, (_, interval_key) in JOBS.items():
+        if not claim(name, now, config['SCHEDULER_LEASE_S']): continue
+        logger.info('Scheduled job started', extra={'job': name})
+        try: result, status = run_job(app, name), 'done'
+        except Exception as e:
+            db.session.rollback(); result, status = repr(e), 'failed'
+            logger.exception('Scheduled job failed', extra={'job': name})
+        _finish(name, config[interval_key], status, str(result))
+        logger.info('Scheduled job finished', extra={'job': name, 'status': status, 'result': str(result)})
+        ran[name] = status
+    return ran
+
+
+def _loop(app, stop):
+    poll = app.config['SCHEDULER_POLL_S']
+    stop.wait(random.uniform(0, min(poll, 10))) # Workers forked together should not all poll at the same instant
+    while not stop.is_set():
+        try:
+            with app.app_context(): run_due(app)
+        except Exception: logger.exception('Scheduler poll failed')
+        stop.wait(poll * random.uniform(0.9, 1.1))
+
+
+def run_forever(app):
+    """ Polls in the calling thread until interrupted (`flask run-jobs --loop`, a dedicated job worker). """
+    _loop(app, threading.Event())
+
+
+def start(app):
+    """ Starts this process's scheduler thread (once per process; call it after fork). Returns the stop event. """
+    if _thread['pid'] == os.getpid(): return _thread['stop']
+    stop = threading.Event()
+    threading.Thread(target=_loop, args=(app, stop), name='scheduler', daemon=True).start()
+    _thread.update(pid=os.getpid(), stop=stop)
+    return stop
+
+
+def jobs():
+    """ The scheduled_jobs rows, by name. """
+    return ScheduledJob.query.order_by(ScheduledJob.name).all()
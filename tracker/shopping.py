@@ -0,0 +1,68 @@
+""" Shopping lists: the ingredients a set of recipe servings needs, summed per ingredient and grouped by category.
+
+Servings come from a suggested meal plan (recipe id -> multiplier) or from the
+recipe entries a user logged over a date range (quantity_consumed). The list is
+one statement. A recursive CTE starts from the servings per recipe and walks
+recipe_subrecipes, a sub-recipe needing `multiplier` x its parent's servings.
+The result is joined to recipe_ingredients and ingredients and summed per
+ingredient, in the ingredient's typical unit. Entries in archived months
+(tracker.log_archive) join the same statement as literal servings.
+"""
+from collections import defaultdict
+
+from .extensions import db
+from .log_archive import any_archived, archived_entries
+from .models import Ingredient, MealLog, Recipe, RecipeIngredient, SubRecipe
+
+OTHER = 'Other' # Category of ingredients without one
+
+
+def _servings_select(servings, *criteria):
+    """ SELECT recipe_id, servings for a {recipe_id: servings} dict, as a CASE over the recipes table (no VALUES lists, which
+    SQLite cannot alias). """
+    return (db.select(Recipe.id.label('recipe_id'), db.case(servings, value=Recipe.id).label('servings'))
+            .where(Recipe.id.in_(servings), *criteria))
+
+
+def _logged_select(user_id, start, end):
+    live = (db.select(MealLog.recipe_id.label('recipe_id'), db.func.sum(MealLog.quantity_consumed).label('servings'))
+            .where(MealLog.user_id == user_id, MealLog.log_date.between(start, end), MealLog.recipe_id.isnot(None)).group_by(MealLog.recipe_id))
+    if not any_archived(start, end): return live
+    hot_ids = {i for (i,) in db.session.query(MealLog.id).filter(MealLog.user_id == user_id, MealLog.log_date.between(start, end))}
+    cold = defaultdict(float)
+    for entry in archived_entries(user_id, start, end, exclude_ids=hot_ids):
+        if entry.recipe_id is not None: cold[entry.recipe_id] += entry.quantity_consumed
+    if not cold: return live
+    both = db.union_all(live, _servings_select(dict(cold))).subquery() # A recursive CTE's anchor must be a plain SELECT
+    return db.select(both.c.recipe_id, both.c.servings)
+
+
+def _items(anchor):
+    """ [{id, name, category, unit, quantity, recipes}] needed for the servings `anchor` selects, by name. """
+    needs = anchor.cte('needs', recursive=True)
+    needs = needs.union_all(db.select(SubRecipe.sub_recipe_id, needs.c.servings * SubRecipe.multiplier).where(SubRecipe.recipe_id == needs.c.recipe_id))
+    query = (db.select(Ingredient.id, Ingredient.name, Ingredient.category, Ingredient.typical_unit,
+                       db.func.sum(RecipeIngredient.quantity * needs.c.servings).label('quantity'), db.func.count(db.distinct(needs.c.recipe_id)).label('recipes'))
+             .select_from(needs).join(RecipeIngredient, RecipeIngredient.recipe_id == needs.c.recipe_id).join(Ingredient, Ingredient.id == RecipeIngredient.ingredient_id)
+             .group_by(Ingredient.id, Ingredient.name, Ingredient.category, Ingredient.typical_unit).order_by(Ingredient.name))
+    return [{'id': row.id, 'name': row.name, 'category': (row.category or '').strip() or OTHER, 'unit': row.typical_unit,
+             'quantity': row.quantity, 'recipes': row.recipes} for row in db.session.execute(query)]
+
+
+def for_plan(servings, user_id):
+    """ Shopping list items for {recipe_id: servings}; recipes that do not exist or `user_id` cannot see are left out. """
+    servings = {int(recipe_id): float(n) for recipe_id, n in servings.items() if n and n > 0}
+    if not servings: return []
+    return _items(_servings_select(servings, db.or_(Recipe.owner_id.is_(None), Recipe.owner_id == user_id)))
+
+
+def for_logged(user_id, start, end):
+    """ Shopping list items for the recipe entries `user_id` logged with start <= log_date <= end. """
+    return _items(_logged_select(user_id, start, end))
+
+
+def by_category(items):
+    """ [(category, [items])], categories alphabetically with OTHER last, items in their given order. """
+    groups = {}
+    for item in items: groups.setdefault(item['category'], []).append(item)
+    return sorted(groups.items(), key=lambda group: (group[0] == OTHER, group[0].lower()))
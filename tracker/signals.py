@@ -0,0 +1,39 @@
+""" Blinker signals raised after commits that touched catalog rows or rewrote meal logs.
+
+`catalog_changed` is sent once per commit with `models`, the set of changed
+model names ('Food', 'Ingredient', 'Recipe'), and `keys`, the changed rows as
+(model name, id) pairs; in-memory indexes subscribe to it.
+`meal_logs_changed` is sent with `dates`, the log dates whose entries were
+rewritten in bulk (bypassing the ORM), and `days`, the same as (user_id, date)
+pairs, so per-day derived data can follow (tracker.adherence).
+"""
+from itertools import chain
+
+from blinker import Namespace
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+from .models import Food, Ingredient, Recipe
+
+_signals = Namespace()
+catalog_changed = _signals.signal('catalog-changed')
+meal_logs_changed = _signals.signal('meal-logs-changed')
+
+CATALOG_MODELS = (Food, Ingredient, Recipe)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_catalog_writes(session, flush_context):
+    changed = {(type(obj).__name__, obj.id) for obj in chain(session.new, session.dirty, session.deleted) if isinstance(obj, CATALOG_MODELS)}
+    if changed: session.info.setdefault('catalog_changed', set()).update(changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _send_catalog_changed(session):
+    changed = session.info.pop('catalog_changed', None)
+    if changed: catalog_changed.send(session, models={name for name, _ in changed}, keys=changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_catalog_writes(session):
+    session.info.pop('catalog_changed', None)
@@ -0,0 +1,262 @@
+""" Nutritional look-alikes: "something like this recipe, for when it is not available".
+
+Items are compared by the shape of their nutrient profile, not by amount. Every
+Food, Ingredient and Recipe with calories becomes its nutrients per 100 kcal
+(calories itself is then constant and dropped), each as log1p(amount / typical
+amount), where the typical amount is that nutrient's median over the catalog.
+Grams of protein and milligrams of sodium then weigh alike, and items in the
+same proportions are near each other whatever their portion size.
+
+Nearest neighbours are found with a KD-tree built in NumPy: points are split at
+the median of the widest dimension down to leaves of LEAF_SIZE, stored as
+contiguous runs with their bounding boxes. A query ranks the leaves by box
+distance and scans them in order, vectorized, until the next box is farther
+than the k-th best so far; filters (kinds, owner, meal type, exclusions) are
+one mask over the points. Over 100k items a query reads a few leaves.
+
+The tree follows catalog writes incrementally: catalog_changed carries the
+changed rows, whose old points are masked out and whose current versions go to
+a small unindexed tail that every query scans in full. The tree is rebuilt once
+the tail passes REBUILD_FRACTION of it, or once it is older than
+SIMILARITY_MAX_AGE_S, so writes from other workers are picked up too.
+"""
+import threading
+import time
+
+import numpy as np
+from flask import current_app
+
+from .extensions import db
+from .models import Recipe
+from .nutrients import NUTRIENT_KEYS
+from .recommender import KINDS, _load_rows
+from .signals import catalog_changed
+
+LEAF_SIZE = 64
+REBUILD_FRACTION, REBUILD_MIN = 0.05, 256 # Tail size that triggers a full rebuild: this share of the tree, at least this many rows
+MIN_CALORIES = 1.0 # Per portion; below it a per-100-kcal profile is mostly rounding noise
+MEALS = ('breakfast', 'lunch', 'dinner', 'snack')
+ANY_MEAL = (1 << len(MEALS)) - 1
+_CAL = NUTRIENT_KEYS.index('calories')
+_KIND_OF = {'Food': 'food', 'Ingredient': 'ingredient', 'Recipe': 'recipe'}
+
+
+def meal_bits(suitability):
+    """ 'Breakfast,Snacks' -> bitmask over MEALS; empty or 'Any' -> every meal. Unknown names add nothing. """
+    names = {part.strip().lower().removesuffix('s') for part in (suitability or 'Any').split(',') if part.strip()}
+    if not names or 'any' in names: return ANY_MEAL
+    return sum(1 << MEALS.index(name) for name in names if name in MEALS)
+
+
+def _load(only=None):
+    """ recommender rows of the indexable items (enough calories), each with its meal bits appended. """
+    recipes = db.session.query(Recipe.id, Recipe.meal_type_suitability)
+    if only is not None: recipes = recipes.filter(Recipe.id.in_(only.get('recipe') or ()))
+    meals = {recipe_id: meal_bits(suitability) for recipe_id, suitability in recipes}
+    return [(*row, meals.get(row[1], ANY_MEAL) if row[0] == 'recipe' else ANY_MEAL)
+            for row in _load_rows(only) if row[5][_CAL] >= MIN_CALORIES]
+
+
+def _matrix(rows):
+    nutrients = np.array([r[5] for r in rows], dtype=np.float64).reshape(len(rows), len(NUTRIENT_KEYS))
+    return np.nan_to_num(nutrients, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def _per_100_kcal(nutrients): return np.clip(np.delete(nutrients, _CAL, axis=1) * (100.0 / nutrients[:, _CAL:_CAL + 1]), 0.0, None)
+
+
+def typical_amounts(nutrients):
+    """ Per non-calorie nutrient, the median of its positive per-100-kcal amounts (1.0 if none). """
+    per_100 = _per_100_kcal(nutrients)
+    return np.array([np.median(column[column > 0]) if (column > 0).any() else 1.0 for column in per_100.T])
+
+
+class _Points:
+    """ Index rows in one order: profile vectors plus what filters and results read. """
+    __slots__ = ('vectors', 'nutrients', 'kinds', 'ids', 'owners', 'meals', 'names', 'units', 'unit_qty')
+
+    def __init__(self, rows, scale=None, nutrients=None):
+        if rows is None: return # take()
+        self.nutrients = _matrix(rows) if nutrients is None else nutrients
+        self.vectors = np.log1p(_per_100_kcal(self.nutrients) / scale)
+        self.kinds = np.array([KINDS.index(r[0]) for r in rows], dtype=np.int8)
+        self.ids = np.array([r[1] for r in rows], dtype=np.int64)
+        self.owners = np.array([-1 if r[4] is None else r[4] for r in rows], dtype=np.int64) # -1 = shared
+        self.meals = np.array([r[6] for r in rows], dtype=np.int8)
+        self.names = [r[2] for r in rows]
+        self.units = [r[3][0] for r in rows]
+        self.unit_qty = np.array([r[3][1] for r in rows], dtype=np.float64)
+
+    def __len__(self): return len(self.ids)
+
+    def take(self, order):
+        points = _Points(None)
+        for name in self.__slots__:
+            value = getattr(self, name)
+            setattr(points, name, value[order] if isinstance(value, np.ndarray) else [value[i] for i in order])
+        return points
+
+    def allowed(self, kinds, meal_bit, user_id):
+        mask = (self.owners < 0) | (self.owners == (-1 if user_id is None else user_id))
+        if len(set(kinds) & set(KINDS)) < len(KINDS): mask &= np.isin(self.kinds, [KINDS.index(kind) for kind in kinds if kind in KINDS])
+        if meal_bit: mask &= (self.meals & meal_bit) != 0
+        return mask
+
+
+def _partition(vectors, leaf_size=LEAF_SIZE):
+    """ KD-tree leaves: (order, starts, ends), each leaf a contiguous run of `order`, split at the median of the widest dimension. """
+    order, leaves, stack = np.arange(len(vectors)), [], [(0, len(vectors))] if len(vectors) else []
+    while stack:
+        start, end = stack.pop()
+        if end - start <= leaf_size: leaves.append((start, end)); continue
+        idx = order[start:end]
+        block = vectors[idx]
+        dim, mid = int(np.argmax(block.max(axis=0) - block.min(axis=0))), (end - start) // 2
+        order[start:end] = idx[np.argpartition(block[:, dim], mid)]
+        stack += [(start, start + mid), (start + mid, end)]
+    leaves.sort()
+    return order, np.array([s for s, _ in leaves], dtype=np.int64), np.array([e for _, e in leaves], dtype=np.int64)
+
+
+def _closest(best_d, best_i, d, i, k):
+    """ Merges candidates (d, i) into the k best (best_d, best_i); infinite distances are dropped. """
+    keep = np.isfinite(d)
+    best_d, best_i = np.concatenate([best_d, d[keep]]), np.concatenate([best_i, i[keep]])
+    if len(best_d) > k:
+        top = np.argpartition(best_d, k - 1)[:k]
+        best_d, best_i = best_d[top], best_i[top]
+    return best_d, best_i
+
+
+class SimilaritySnapshot:
+    """ One built tree plus the rows changed since (the tail). Immutable; updates return a new snapshot. """
+    __slots__ = ('scale', 'tree', 'positions', 'starts', 'ends', 'lo', 'hi', 'dead', 'tail_rows', 'tail', 'tail_positions', 'built_at')
+
+    def __init__(self, rows):
+        nutrients = _matrix(rows)
+        self.scale = typical_amounts(nutrients) if rows else np.ones(len(NUTRIENT_KEYS) - 1)
+        points = _Points(rows, self.scale, nutrients)
+        order, self.starts, self.ends = _partition(points.vectors)
+        self.tree = points.take(order)
+        self.positions = {(KINDS[kind], item_id): i for i, (kind, item_id) in enumerate(zip(self.tree.kinds.tolist(), self.tree.ids.tolist()))}
+        if len(self.starts):
+            self.lo, self.hi = np.minimum.reduceat(self.tree.vectors, self.starts), np.maximum.reduceat(self.tree.vectors, self.starts)
+        else: self.lo = self.hi = np.empty((0, len(self.scale)))
+        self.dead = np.zeros(len(self.tree), dtype=bool)
+        self._set_tail({})
+        self.built_at = time.monotonic()
+
+    def _set_tail(self, tail_rows):
+        self.tail_rows = tail_rows
+        self.tail = _Points(list(tail_rows.values()), self.scale)
+        self.tail_positions = {key: i for i, key in enumerate(tail_rows)}
+
+    def updated(self, keys, rows):
+        """ A copy where the items under `keys` are replaced by `rows`, their current versions (deleted items have none). """
+        snap = object.__new__(SimilaritySnapshot)
+        for name in ('scale', 'tree', 'positions', 'starts', 'ends', 'lo', 'hi', 'built_at'): setattr(snap, name, getattr(self, name))
+        snap.dead = self.dead.copy()
+        snap.dead[[self.positions[key] for key in keys if key in self.positions]] = True
+        tail_rows = {key: row for key, row in self.tail_rows.items() if key not in keys}
+        tail_rows.update(((row[0], row[1]), row) for row in rows)
+        snap._set_tail(tail_rows)
+        return snap
+
+    def __len__(self): return len(self.tree) - int(self.dead.sum()) + len(self.tail)
+
+    def locate(self, key):
+        """ (points, index) holding the current version of item `key`, or None. """
+        if key in self.tail_positions: return self.tail, self.tail_positions[key]
+        i = self.positions.get(key)
+        return (self.tree, i) if i is not None and not self.dead[i] else None
+
+    def nearest(self, vector, k, tree_mask, tail_mask):
+        """ [(squared distance, points, index)] of the k allowed points nearest `vector`, nearest first. """
+        if k <= 0: return []
+        best_d, best_i = np.empty(0), np.empty(0, dtype=np.int64) # Tail points are stored as -1 - index
+        if len(self.tail):
+            d = np.square(self.tail.vectors - vector).sum(axis=1)
+            d[~tail_mask] = np.inf
+            best_d, best_i = _closest(best_d, best_i, d, -1 - np.arange(len(d)), k)
+        if len(self.starts):
+            bounds = np.square(np.maximum(self.lo - vector, 0.0) + np.maximum(vector - self.hi, 0.0)).sum(axis=1)
+            bounds[~np.logical_or.reduceat(tree_mask, self.starts)] = np.inf # Leaves with nothing allowed
+            vectors = self.tree.vectors
+            for leaf in np.argsort(bounds):
+                if not bounds[leaf] < (best_d.max() if len(best_d) == k else np.inf): break
+                start, end = self.starts[leaf], self.ends[leaf]
+                d = np.square(vectors[start:end] - vector).sum(axis=1)
+                d[~tree_mask[start:end]] = np.inf
+                best_d, best_i = _closest(best_d, best_i, d, np.arange(start, end), k)
+        ranked = np.lexsort((best_i, best_d))
+        return [(float(best_d[j]), self.tail, -1 - int(best_i[j])) if best_i[j] < 0 else (float(best_d[j]), self.tree, int(best_i[j])) for j in ranked]
+
+    def masks(self, kinds=KINDS, meal_bit=0, exclude=(), user_id=None):
+        """ Allowed-point masks (tree, tail) for a query; `exclude` holds (kind, id) keys. """
+        tree_mask, tail_mask = self.tree.allowed(kinds, meal_bit, user_id) & ~self.dead, self.tail.allowed(kinds, meal_bit, user_id)
+        for key in exclude:
+            if key in self.positions: tree_mask[self.positions[key]] = False
+            if key in self.tail_positions: tail_mask[self.tail_positions[key]] = False
+        return tree_mask, tail_mask
+
+
+class SimilarityIndex:
+    """ Per-process holder of the current SimilaritySnapshot; changed rows are applied on the next query. """
+
+    def __init__(self):
+        self._snapshot, self._pending, self._stale = None, set(), True
+        self._lock, self._build_lock = threading.Lock(), threading.Lock()
+
+    def changed(self, sender, keys=None, **kwargs):
+        with self._lock:
+            if keys is None: self._stale = True
+            else: self._pending |= {(_KIND_OF[name], item_id) for name, item_id in keys}
+
+    def snapshot(self):
+        snap = self._snapshot
+        max_age = current_app.config.get('SIMILARITY_MAX_AGE_S', 300)
+        if snap is not None and not self._stale and not self._pending and time.monotonic() - snap.built_at < max_age: return snap
+        with self._build_lock:
+            if self._snapshot is not snap: return self._snapshot # Someone else caught up while we waited
+            with self._lock: pending, stale, self._pending, self._stale = self._pending, self._stale, set(), False
+            try:
+                if snap is None or stale or time.monotonic() - snap.built_at >= max_age or \
+                        len(snap.tail) + len(pending) > max(REBUILD_MIN, REBUILD_FRACTION * len(snap.tree)):
+                    self._snapshot = SimilaritySnapshot(_load())
+                else:
+                    only = {}
+                    for kind, item_id in pending: only.setdefault(kind, []).append(item_id)
+                    self._snapshot = snap.updated(pending, _load(only))
+            except BaseException:
+                self._stale = True
+                raise
+            return self._snapshot
+
+
+index = SimilarityIndex()
+catalog_changed.connect(index.changed, weak=False)
+
+
+def similar(kind, item_id, k=10, kinds=KINDS, meal_type=None, exclude=(), user_id=None):
+    """ Items whose nutrient profile is nearest that of item (`kind`, `item_id`), nearest first; only shared items
+    and those owned by `user_id`. Each comes with the portion matching the calories of the item's base portion.
+    Returns None if the item is unknown, not visible to `user_id` or has no calories. Raises ValueError for an
+    unknown `meal_type`. """
+    meal_bit = meal_bits(meal_type) if meal_type else 0
+    if meal_type and not meal_bit: raise ValueError(f'Unknown meal type "{meal_type}".')
+    snap = index.snapshot()
+    found = snap.locate((kind, item_id))
+    if found is None: return None
+    points, i = found
+    if points.owners[i] >= 0 and points.owners[i] != user_id: return None
+    source_calories = points.nutrients[i, _CAL]
+    tree_mask, tail_mask = snap.masks(kinds, meal_bit, {*exclude, (kind, item_id)}, user_id)
+    results = []
+    for distance, hit, j in snap.nearest(points.vectors[i], max(0, int(k)), tree_mask, tail_mask):
+        multiplier = source_calories / hit.nutrients[j, _CAL]
+        results.append({
+            'kind': KINDS[hit.kinds[j]], 'id': int(hit.ids[j]), 'name': hit.names[j], 'distance': round(distance ** 0.5, 4),
+            'multiplier': round(multiplier, 3), 'quantity': round(multiplier * float(hit.unit_qty[j]), 1), 'unit': hit.units[j],
+            'nutrients': dict(zip(NUTRIENT_KEYS, (hit.nutrients[j] * multiplier).tolist())),
+        })
+    return results
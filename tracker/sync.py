@@ -0,0 +1,159 @@
+""" Change feed for offline clients: what changed in foods, ingredients, recipes and meal logs since a cursor.
+
+sync_changes holds one row per synced item with the sequence number of its
+latest change. Inserting, updating or deleting a row through the ORM replaces
+the item's sync_changes row in the same flush, under a new seq; a deletion
+leaves a tombstone (`deleted`). Entries written in bulk (tracker.bulk_log,
+tracker.recalc, tracker.dedupe) bypass the ORM and are recorded after their commit from
+meal_logs_changed. A client keeps the cursor of its last page and asks only
+for seq > cursor: an indexed range read of sync_changes, then one query per
+kind for the current columns of that page's items. Catalog rows the user may
+not (or no longer) see come back as tombstones. Meal logs outside the last
+SYNC_LOG_DAYS, or moved to the log archive, are left out without one.
+
+A cursor must never skip a change that commits later under a lower seq. On
+SQLite the database write lock already orders writers; on PostgreSQL a
+transaction-level advisory lock is taken before sync_changes is written, so
+writers of synced rows commit in seq order. `flask rebuild-sync` records every
+live row again (to repair; the migration creating the table fills it the same
+way); tombstones are kept.
+"""
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from itertools import chain
+
+from flask import current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, inspect
+
+from .extensions import db
+from .models import Food, Ingredient, MealLog, Recipe, SyncChange
+from .nutrients import NUTRIENT_KEYS, columns
+from .signals import meal_logs_changed
+
+logger = logging.getLogger(__name__)
+
+KINDS = {'food': Food, 'ingredient': Ingredient, 'recipe': Recipe, 'meal_log': MealLog}
+_KIND_OF = {model: kind for kind, model in KINDS.items()}
+OWNERS = {Food: 'owner_id', Recipe: 'owner_id', MealLog: 'user_id'} # Ingredients are always shared
+FIELDS = {Food: ('name', 'owner_id', 'base_unit', 'base_quantity', 'notes', 'updated_at'), # Sent besides id and the nutrients
+          Ingredient: ('name', 'category', 'typical_unit', 'unit_quantity', 'updated_at'),
+          Recipe: ('name', 'owner_id', 'description', 'instructions', 'meal_type_suitability', 'updated_at'),
+          MealLog: ('log_date', 'meal_type', 'food_id', 'recipe_id', 'quantity_consumed', 'created_at')}
+ADVISORY_LOCK = 0x73796e63 # 'sync'
+_table = SyncChange.__table__
+
+
+def _ordered(connection):
+    """ Holds PostgreSQL writers of sync_changes to commit order until this transaction ends (SQLite's write lock does it already). """
+    if connection.dialect.name == 'postgresql': connection.execute(db.text('SELECT pg_advisory_xact_lock(:key)'), {'key': ADVISORY_LOCK})
+
+
+def record(connection, changes):
+    """ Gives each of `changes`, {(kind, item_id): (owner_id, deleted)}, a new seq. """
+    if not changes: return
+    _ordered(connection)
+    by_kind, now = defaultdict(list), datetime.utcnow()
+    for kind, item_id in changes: by_kind[kind].append(item_id)
+    for kind, ids in by_kind.items():
+        connection.execute(_table.delete().where(_table.c.kind == kind, _table.c.item_id.in_(ids)))
+    connection.execute(_table.insert(), [{'kind': kind, 'item_id': item_id, 'owner_id': owner_id, 'deleted': deleted, 'changed_at': now}
+                                         for (kind, item_id), (owner_id, deleted) in changes.items()])
+
+
+def _record_select(connection, kind, model, *filters):
+    """ Records every `model` row matching `filters` as changed, with two statements. Returns the number of rows. """
+    ids = db.select(model.id).where(*filters)
+    owner = getattr(model, OWNERS[model]) if model in OWNERS else db.null()
+    _ordered(connection)
+    connection.execute(_table.delete().where(_table.c.kind == kind, _table.c.item_id.in_(ids)))
+    select = db.select(db.literal(kind), model.id, owner, db.false(), db.literal(datetime.utcnow())).where(*filters)
+    return connection.execute(_table.insert().from_select(['kind', 'item_id', 'owner_id', 'deleted', 'changed_at'], select)).rowcount
+
+
+def rebuild(connection):
+    """ Records every live row as changed (tombstones stay). Returns {kind: rows}. """
+    counts = {}
+    for kind, model in KINDS.items(): counts[kind] = _record_select(connection, kind, model)
+    return counts
+
+
+def last_seq():
+    return db.session.query(db.func.max(SyncChange.seq)).scalar() or 0
+
+
+def parse_cursor(raw):
+    """ The seq a client cursor stands for; no cursor means from the beginning. Raises ValueError. """
+    if raw in (None, ''): return 0
+    seq = int(raw)
+    if seq < 0: raise ValueError('Bad cursor')
+    return seq
+
+
+def _value(v):
+    if isinstance(v, (date, datetime)): return v.isoformat()
+    if isinstance(v, float) and v - v != 0: return None # NaN and infinities are not JSON
+    return v
+
+
+def _documents(user_id, model, ids):
+    """ {id: document} of the rows among `ids` the user can see now. One query. """
+    fields = FIELDS[model]
+    query = db.session.query(model.id, *[getattr(model, name) for name in fields], *columns(model)).filter(model.id.in_(ids))
+    if model is MealLog:
+        query = query.filter(MealLog.user_id == user_id, MealLog.log_date >= date.today() - timedelta(days=current_app.config['SYNC_LOG_DAYS']))
+    elif model in OWNERS: query = query.filter(db.or_(getattr(model, OWNERS[model]).is_(None), getattr(model, OWNERS[model]) == user_id))
+    names = ('id', *fields, *NUTRIENT_KEYS)
+    return {row[0]: {name: _value(v) for name, v in zip(names, row)} for row in query}
+
+
+def changes(user_id, since, limit):
+    """ {'changes': [...], 'cursor': str, 'more': bool}: up to `limit` items the user can see that changed after seq `since`,
+    oldest change first. A change is {'kind', 'id', 'seq'} plus 'data' (the row now) or 'deleted': true. """
+    c = _table.c
+    rows = db.session.execute(db.select(c.seq, c.kind, c.item_id, c.deleted).where(c.seq > since, db.or_(c.owner_id.is_(None), c.owner_id == user_id))
+                              .order_by(c.seq).limit(limit + 1)).all()
+    more, rows = len(rows) > limit, rows[:limit]
+    wanted = defaultdict(list)
+    for seq, kind, item_id, deleted in rows:
+        if not deleted and kind in KINDS: wanted[kind].append(item_id)
+    documents = {kind: _documents(user_id, KINDS[kind], ids) for kind, ids in wanted.items()}
+    feed = []
+    for seq, kind, item_id, deleted in rows:
+        document = None if deleted else documents.get(kind, {}).get(item_id)
+        if document is not None: feed.append({'kind': kind, 'id': item_id, 'seq': seq, 'data': document})
+        elif kind != 'meal_log' or deleted: feed.append({'kind': kind, 'id': item_id, 'seq': seq, 'deleted': True})
+    return {'changes': feed, 'cursor': str(rows[-1][0] if rows else since), 'more': more}
+
+
+# --- Incremental maintenance -----------------------------------------------------------
+
+@event.listens_for(Session, 'after_flush')
+def _record_flushed(session, flush_context):
+    pending = {}
+    for obj in chain(session.new, session.dirty):
+        model = type(obj)
+        if model in _KIND_OF and (obj in session.new or session.is_modified(obj, include_collections=False)):
+            pending[(_KIND_OF[model], obj.id)] = (getattr(obj, OWNERS[model]) if model in OWNERS else None, False)
+    for obj in session.deleted:
+        model, state = type(obj), inspect(obj)
+        if model in _KIND_OF and state.identity: # Read from the state: the row is gone, nothing may be loaded now
+            pending[(_KIND_OF[model], state.identity[0])] = (state.dict.get(OWNERS[model]) if model in OWNERS else None, True)
+    if pending: record(session.connection(), pending)
+
+
+def _record_bulk(sender, days=None, **kwargs):
+    """ meal_logs_changed: entries written in bulk (already committed) on (user_id, date) `days`. """
+    if not days: return
+    by_user = defaultdict(set)
+    for user_id, day in days: by_user[user_id].add(day)
+    try:
+        connection = db.session.connection()
+        for user_id, dates in by_user.items(): _record_select(connection, 'meal_log', MealLog, MealLog.user_id == user_id, MealLog.log_date.in_(dates))
+        db.session.commit()
+    except Exception:
+        db.session.rollback(); logger.exception('Recording bulk log changes for sync failed; `flask rebuild-sync` repairs it', extra={'days': len(days)})
+
+
+meal_logs_changed.connect(_record_bulk, weak=False)
@@ -0,0 +1,357 @@
+""" Structured logging and request tracing.
+
+Records from the `tracker.*` loggers go through a QueueHandler: the request
+thread only attaches the current trace id and puts the record on a bounded
+queue; a QueueListener thread formats it (one JSON object per line, or text
+with LOG_FORMAT=text) and writes it to stderr. Records below WARNING are
+sampled per trace (LOG_SAMPLE_RATE), so a kept request keeps all its lines.
+LOG_LEVEL=OFF silences the package entirely.
+
+With TRACING=file or TRACING=otlp each request is a trace (an incoming W3C
+`traceparent` is continued; the id is echoed in X-Trace-Id) with spans for the
+request, every SQL statement, Nutritionix calls and template rendering.
+TRACE_SAMPLE_RATE picks the traces that are recorded. Finished spans are
+batched by an exporter thread into OTLP/JSON export requests, appended to
+TRACE_FILE one per line or POSTed to TRACE_OTLP_ENDPOINT (`flask
+trace-collector` stands in for a collector locally). With TRACING=off, the
+default, no hook is installed and `span()` returns a shared no-op.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextvars import ContextVar
+
+from flask import before_render_template, g, request, template_rendered
+from sqlalchemy import event
+
+from .extensions import db
+
+logger = logging.getLogger(__name__)
+_package_log = logging.getLogger('tracker') # Also Flask's app.logger, the app being named after the package
+_current = ContextVar('tracker_span', default=None)
+_state = {'listener': None, 'handler': None, 'exporter': None, 'log_sample_rate': 1.0, 'trace_sample_rate': 1.0}
+
+INTERNAL, SERVER, CLIENT = 1, 2, 3 # OTLP span kinds
+
+
+# --- Spans -----------------------------------------------------------------------------
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'attributes', 'start_ns', 'end_ns', 'error', 'sampled', '_token')
+
+    def __init__(self, name, trace_id, parent_id=None, kind=INTERNAL, sampled=True, **attributes):
+        self.trace_id, self.span_id, self.parent_id = trace_id, f'{random.getrandbits(64):016x}', parent_id
+        self.name, self.kind, self.attributes, self.sampled = name, kind, attributes, sampled
+        self.start_ns, self.end_ns, self.error, self._token = time.time_ns(), None, None, None
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None: self.error = repr(exc)
+        _current.reset(self._token)
+        self.end()
+        return False
+
+    def set(self, **attributes): self.attributes.update(attributes)
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        exporter = _state['exporter']
+        if self.sampled and exporter is not None: exporter.submit(self)
+
+
+class _NoopSpan:
+    """ What span() returns outside a recorded trace: every method does nothing. """
+    __slots__ = ()
+    trace_id = span_id = None
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc, tb): return False
+    def set(self, **attributes): pass
+    def end(self): pass
+
+
+NOOP = _NoopSpan()
+
+
+def span(name, kind=INTERNAL, **attributes):
+    """ A child of the current span, used as a context manager (or ended with .end()); NOOP when not tracing. """
+    parent = _current.get()
+    if parent is None or not parent.sampled: return NOOP
+    return Span(name, parent.trace_id, parent.span_id, kind, **attributes)
+
+
+def start_trace(name, traceparent=None, kind=SERVER, **attributes):
+    """ A root span, continuing `traceparent` ('00-<trace id>-<span id>-<flags>') when it is well formed. """
+    parts = traceparent.split('-') if traceparent else ()
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        trace_id, parent_id, sampled = parts[1], parts[2], parts[3] == '01' # The caller already decided on sampling
+    else:
+        trace_id, parent_id, sampled = f'{random.getrandbits(128):032x}', None, random.random() < _state['trace_sample_rate']
+    return Span(name, trace_id, parent_id, kind, sampled, **attributes)
+
+
+def current_trace_id():
+    current = _current.get()
+    return current.trace_id if current is not None else None
+
+
+# --- Request, SQL and template hooks ---------------------------------------------------
+
+def _start_request():
+    rule = request.url_rule.rule if request.url_rule is not None else request.path
+    root = start_trace(f'{request.method} {rule}', request.headers.get('traceparent'),
+                       **{'http.method': request.method, 'http.route': rule, 'http.target': request.path})
+    g._trace_span = root.__enter__()
+
+
+def _tag_response(response):
+    root = g.get('_trace_span')
+    if root is not None:
+        root.set(**{'http.status_code': response.status_code})
+        response.headers['X-Trace-Id'] = root.trace_id
+    return response
+
+
+def _end_request(exc):
+    root = g.pop('_trace_span', None)
+    if root is None: return
+    try: root.__exit__(type(exc) if exc else None, exc, None)
+    except ValueError: _current.set(None); root.end() # Torn down in another context than it started in
+
+
+def _start_template(sender, template, context, **extra):
+    child = span('render', **{'template': template.name or '<string>'})
+    if child is not NOOP: g.setdefault('_template_spans', []).append(child.__enter__())
+
+
+def _end_template(sender, template, context, **extra):
+    stack = g.get('_template_spans')
+    if stack: stack.pop().__exit__(None, None, None)
+
+
+def _start_sql(conn, cursor, statement, parameters, context, executemany):
+    child = span('sql', CLIENT, **{'db.system': conn.dialect.name, 'db.statement': statement[:500]})
+    if child is not NOOP: context._trace_span = child
+
+
+def _end_sql(conn, cursor, statement, parameters, context, executemany):
+    child = getattr(context, '_trace_span', None)
+    if child is not None: context._trace_span = None; child.end()
+
+
+def _fail_sql(exception_context):
+    child = getattr(exception_context.execution_context, '_trace_span', None)
+    if child is not None: child.error = repr(exception_context.original_exception); child.end()
+
+
+# --- Logging ---------------------------------------------------------------------------
+
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """ One JSON object per record: time, level, logger, message, any `extra=` fields, and the traceback. """
+
+    def format(self, record):
+        doc = {'ts': round(record.created, 6), 'level': record.levelname, 'logger': record.name, 'msg': record.getMessage()}
+        doc.update((key, value) for key, value in vars(record).items() if key not in _RECORD_FIELDS)
+        if record.exc_info: doc['exc'] = self.formatException(record.exc_info)
+        return json.dumps(doc, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """ Hands records over unformatted (the listener formats them) and drops them when the queue is full. """
+    dropped = 0
+
+    def prepare(self, record): return record
+
+    def enqueue(self, record):
+        try: self.queue.put_nowait(record)
+        except queue.Full: _QueueHandler.dropped += 1
+
+
+def _tag_and_sample(record):
+    """ Handler filter, run in the logging thread: attaches trace ids and samples records below WARNING per trace. """
+    current = _current.get()
+    if current is not None: record.trace_id, record.span_id = current.trace_id, current.span_id
+    rate = _state['log_sample_rate']
+    if record.levelno >= logging.WARNING or rate >= 1.0: return True
+    return (int(current.trace_id[:8], 16) / 0xffffffff if current is not None else random.random()) < rate
+
+
+def _configure_logging(config):
+    _stop_logging()
+    level = str(config['LOG_LEVEL']).upper()
+    _package_log.propagate = False
+    if level == 'OFF': _package_log.setLevel(logging.CRITICAL + 1); return
+    _package_log.setLevel(level)
+    _state['log_sample_rate'] = config['LOG_SAMPLE_RATE']
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if config['LOG_FORMAT'] == 'json' else logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    handler = _QueueHandler(queue.Queue(maxsize=10000))
+    handler.addFilter(_tag_and_sample)
+    listener = logging.handlers.QueueListener(handler.queue, output)
+    listener.start()
+    _package_log.addHandler(handler)
+    _state.update(listener=listener, handler=handler)
+
+
+def _stop_logging():
+    if _state['handler'] is not None: _package_log.removeHandler(_state['handler'])
+    if _state['listener'] is not None: _state['listener'].stop() # Drains what is queued
+    _state.update(listener=None, handler=None)
+
+
+# --- Export ----------------------------------------------------------------------------
+
+def _attribute(key, value):
+    if isinstance(value, bool): typed = {'boolValue': value}
+    elif isinstance(value, int): typed = {'intValue': str(value)}
+    elif isinstance(value, float): typed = {'doubleValue': value}
+    else: typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
+
+
+def otlp_payload(spans, service='tracker'):
+    """ An OTLP/JSON ExportTraceServiceRequest for finished spans. """
+    out = []
+    for s in spans:
+        doc = {'traceId': s.trace_id, 'spanId': s.span_id, 'name': s.name, 'kind': s.kind,
+               'startTimeUnixNano': str(s.start_ns), 'endTimeUnixNano': str(s.end_ns),
+               'attributes': [_attribute(k, v) for k, v in s.attributes.items()],
+               'status': {'code': 2, 'message': s.error} if s.error else {}}
+        if s.parent_id: doc['parentSpanId'] = s.parent_id
+        out.append(doc)
+    return {'resourceSpans': [{'resource': {'attributes': [_attribute('service.name', service)]},
+                               'scopeSpans': [{'scope': {'name': 'tracker'}, 'spans': out}]}]}
+
+
+class _Exporter(threading.Thread):
+    """ Batches finished spans off a bounded queue and writes them out, so request threads never do I/O for tracing. """
+    BATCH = 512
+
+    def __init__(self, mode, path, endpoint, service):
+        super().__init__(name='trace-exporter', daemon=True)
+        self.mode, self.path, self.endpoint, self.service = mode, path, endpoint, service
+        self.queue, self.dropped = queue.Queue(maxsize=20000), 0
+
+    def submit(self, finished):
+        try: self.queue.put_nowait(finished)
+        except queue.Full: self.dropped += 1
+
+    def run(self):
+        while True:
+            batch, stop = [self.queue.get()], False
+            while len(batch) < self.BATCH:
+                try: batch.append(self.queue.get(timeout=0.05))
+                except queue.Empty: break
+            if None in batch: batch, stop = [s for s in batch if s is not None], True
+            if batch: self._write(batch)
+            if stop: return
+
+    def _write(self, batch):
+        body = json.dumps(otlp_payload(batch, self.service))
+        try:
+            if self.mode == 'file':
+                with open(self.path, 'a', encoding='utf-8') as f: f.write(body + '\n')
+            else:
+                from urllib.request import Request, urlopen
+                urlopen(Request(self.endpoint, body.encode(), {'Content-Type': 'application/json'}), timeout=2).close()
+        except Exception as e:
+            logger.warning('Trace export failed', extra={'spans': len(batch), 'error': str(e)})
+
+    def stop(self):
+        self.queue.put(None)
+        self.join(timeout=5)
+
+
+def _stop_exporter():
+    if _state['exporter'] is not None: _state['exporter'].stop()
+    _state['exporter'] = None
+
+
+def _restart_after_fork():
+    """ Threads do not survive fork (gunicorn preload_app): give the child its own listener and exporter. """
+    if _state['listener'] is not None:
+        handler = _state['handler']
+        handler.queue = queue.Queue(maxsize=10000)
+        _state['listener'] = logging.handlers.QueueListener(handler.queue, *_state['listener'].handlers)
+        _state['listener'].start()
+    if _state['exporter'] is not None:
+        old = _state['exporter']
+        _state['exporter'] = _Exporter(old.mode, old.path, old.endpoint, old.service)
+        _state['exporter'].start()
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def _shutdown():
+    _stop_exporter()
+    _stop_logging()
+
+
+atexit.register(_shutdown)
+
+
+# --- Setup -----------------------------------------------------------------------------
+
+def init_app(app):
+    """ Configures package logging, and with TRACING on, the exporter and the request/SQL/template hooks. """
+    config = app.config
+    _configure_logging(config)
+    _stop_exporter()
+    mode = str(config['TRACING']).lower()
+    if mode in ('', 'off', '0', 'false'): return
+    if mode not in ('file', 'otlp'): raise ValueError(f"TRACING must be off, file or otlp, not {config['TRACING']!r}")
+    _state['trace_sample_rate'] = config['TRACE_SAMPLE_RATE']
+    _state['exporter'] = _Exporter(mode, config['TRACE_FILE'], config['TRACE_OTLP_ENDPOINT'], config['TRACE_SERVICE_NAME'])
+    _state['exporter'].start()
+    app.before_request_funcs.setdefault(None, []).insert(0, _start_request) # First, so the other hooks are inside the trace
+    app.after_request(_tag_response)
+    app.teardown_request(_end_request)
+    before_render_template.connect(_start_template, app)
+    template_rendered.connect(_end_template, app)
+    with app.app_context():
+        for engine in db.engines.values():
+            if not event.contains(engine, 'before_cursor_execute', _start_sql):
+                event.listen(engine, 'before_cursor_execute', _start_sql)
+                event.listen(engine, 'after_cursor_execute', _end_sql)
+                event.listen(engine, 'handle_error', _fail_sql)
+
+
+# --- Local collector -------------------------------------------------------------------
+
+def serve_collector(host, port, out_path, echo=print):
+    """ A minimal OTLP/HTTP JSON receiver: appends each POSTed export request to `out_path` as one line. """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != '/v1/traces': self.send_error(404); return
+            try: payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            except ValueError: self.send_error(400, 'Expected OTLP/JSON'); return
+            with lock, open(out_path, 'a', encoding='utf-8') as f: f.write(json.dumps(payload) + '\n')
+            spans = sum(len(scope.get('spans', [])) for rs in payload.get('resourceSpans', []) for scope in rs.get('scopeSpans', []))
+            echo(f'received {spans} spans')
+            body = b'{}'
+            self.send_response(200); self.send_header('Content-Type', 'application/json'); self.send_header('Content-Length', str(len(body))); self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args): pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    echo(f'Collecting OTLP/JSON traces on http://{host}:{port}/v1/traces into {out_path}')
+    try: server.serve_forever()
+    except KeyboardInterrupt: pass
+    finally: server.server_close()
@@ -0,0 +1,104 @@
+""" Warm-up before serving, so the first requests after a deploy do not pay for cold caches.
+
+`warm_up()` configures the SQLAlchemy mappers, compiles every template,
+imports the modules that views load lazily (WTForms, requests) and loads the
+catalog rows logged most over the last WARMUP_LOG_DAYS into the shared
+catalog row cache (tracker.catalog_cache). Under gunicorn with preload_app it
+runs once in the master, from gunicorn.conf.py's `when_ready`, before any
+worker is forked. Workers then inherit the warm state copy-on-write. The
+connections it used are closed before it returns, and post_fork gives every
+worker its own pool.
+
+A failing step is logged and skipped; a cold cache only makes requests slower.
+/api/ready answers 503 until warm-up has finished in the process. When nothing
+ran it (another server, preload_app off), the first probe starts it in a
+background thread.
+"""
+import importlib
+import logging
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy.orm import configure_mappers
+
+from . import catalog_cache
+from .extensions import db
+from .models import Food, Ingredient, MealLog, Recipe, RecipeIngredient
+
+logger = logging.getLogger(__name__)
+_lock = threading.Lock()
+
+DEFERRED_IMPORTS = ('tracker.forms', 'requests') # Imported by the first form view / Nutritionix lookup otherwise
+
+
+def _mappers(app):
+    configure_mappers()
+    return len(db.Model.registry.mappers)
+
+
+def _templates(app):
+    env, compiled = app.jinja_env, 0
+    for name in env.list_templates(filter_func=lambda name: name.endswith('.html')):
+        try: env.get_template(name); compiled += 1
+        except Exception: logger.exception('Template does not compile', extra={'template': name})
+    return compiled
+
+
+def _imports(app):
+    for module in DEFERRED_IMPORTS: importlib.import_module(module)
+    return len(DEFERRED_IMPORTS)
+
+
+def _catalog(app):
+    """ Loads the foods and recipes logged most recently (and the recipes' ingredients) into the catalog row cache. """
+    config = app.config
+    since, limit = date.today() - timedelta(days=config['WARMUP_LOG_DAYS']), min(config['WARMUP_CATALOG_ROWS'], config['CATALOG_CACHE_SIZE'])
+    loaded = 0
+    for model, column in ((Food, MealLog.food_id), (Recipe, MealLog.recipe_id)):
+        ids = [i for i, in db.session.query(column).filter(column.isnot(None), MealLog.log_date >= since)
+               .group_by(column).order_by(db.func.count().desc()).limit(limit)]
+        loaded += len(catalog_cache.get_many(model, ids))
+        if model is Recipe and ids:
+            ingredient_ids = [i for i, in db.session.query(RecipeIngredient.ingredient_id).filter(RecipeIngredient.recipe_id.in_(ids)).distinct()]
+            loaded += len(catalog_cache.get_many(Ingredient, ingredient_ids))
+    return loaded
+
+
+STEPS = (('mappers', _mappers), ('templates', _templates), ('imports', _imports), ('catalog', _catalog))
+
+
+def state(app):
+    """ {'status': 'cold' | 'warming' | 'ready', ...}; once ready, also the total and per-step times. """
+    return app.extensions.setdefault('warmup', {'status': 'cold'})
+
+
+def warm_up(app, before_fork=False):
+    """ Runs every step once per process (later calls return at once). With `before_fork`, also closes every pooled
+    connection, so that forked workers inherit none. Returns state(app). """
+    current = state(app)
+    with _lock:
+        if current['status'] != 'cold': return current
+        current['status'] = 'warming'
+    started, steps = time.perf_counter(), {}
+    with app.app_context():
+        for name, step in STEPS:
+            t0 = time.perf_counter()
+            try: steps[name] = {'count': step(app)}
+            except Exception as e:
+                logger.exception('Warm-up step failed', extra={'step': name}); steps[name] = {'error': repr(e)}
+                db.session.rollback()
+            steps[name]['ms'] = round((time.perf_counter() - t0) * 1000, 1)
+        db.session.remove()
+        if before_fork:
+            for engine in db.engines.values(): engine.dispose()
+    current.update(status='ready', ms=round((time.perf_counter() - started) * 1000, 1), steps=steps)
+    logger.info('Warm-up finished', extra={'ms': current['ms'], 'steps': steps})
+    return current
+
+
+def ensure_started(app):
+    """ state(app), after starting warm-up in a background thread if nothing has run it yet. """
+    current = state(app)
+    if current['status'] == 'cold': threading.Thread(target=warm_up, args=(app,), name='warm-up', daemon=True).start()
+    return current